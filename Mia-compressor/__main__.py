@@ -14,7 +14,20 @@ from pyrogram.errors import ApiIdInvalid, ApiIdPublishedFlood, AccessTokenInvali
 
 # Import bot components
 from bot.config import Config
-from bot.database import Database
+from bot.database import create_database
+from bot.context import AppContext, set_context
+from utils.compressor import VideoCompressor
+from utils.compression_handler import CompressionHandler
+from utils.scheduler import TaskScheduler
+from utils.progress import ProgressRegistry
+from utils.probe import ProbeService
+from utils.delivery import DeliveryService
+from utils.result_cache import ResultCache
+from utils.message_resolver import MessageResolver
+from utils.status_reporter import StatusReporter
+from utils.api_gateway import ApiGateway
+from utils.cancellation import CancellationRegistry
+from utils.recovery import CheckpointStore
 from utils.helpers import check_ffmpeg
 
 # Configure logging
@@ -34,6 +47,7 @@ class VideoCompressorBot:
         """Initialize the Video Compressor Bot"""
         self.app = None
         self.db = None
+        self.context = None
         self.is_running = False
         
     async def initialize(self):
@@ -57,9 +71,37 @@ class VideoCompressorBot:
                 return False
             
             # Initialize database
-            self.db = Database()
+            self.db = create_database()
             await self.db.connect()
             
+            # ffprobe results cached across restarts
+            probe = ProbeService(self.db)
+            await probe.load()
+            
+            # Delivered outputs, replayed for repeated requests
+            results = ResultCache(self.db)
+            await results.load()
+            
+            # Shared components injected into every handler
+            api = ApiGateway()
+            delivery = DeliveryService(self.db, probe, api)
+            await delivery.load()
+            scheduler = TaskScheduler(self.db)
+            self.context = AppContext(
+                db=self.db,
+                compressor=VideoCompressor(probe),
+                scheduler=scheduler,
+                progress=ProgressRegistry(),
+                api=api,
+                delivery=delivery,
+                results=results,
+                messages=MessageResolver(),
+                cancellation=CancellationRegistry(scheduler, self.db),
+                checkpoints=CheckpointStore(self.db, probe)
+            )
+            self.context.compression_handler = CompressionHandler(self.context)
+            set_context(self.context)
+            
             # Initialize Pyrogram client with proper plugin configuration
             self.app = Client(
                 name="VideoCompressorBot",
@@ -67,8 +109,16 @@ class VideoCompressorBot:
                 api_hash=Config.API_HASH,
                 bot_token=Config.BOT_TOKEN,
                 plugins=dict(root="plugins"),
-                workdir=str(project_root)
+                workdir=str(project_root),
+                # Pyrogram serializes get_file/stream_media behind this (default 1); leave room
+                # for every part of every download plus one stream or info fetch
+                max_concurrent_transmissions=max(
+                    Config.DOWNLOAD_CONNECTIONS * Config.DOWNLOAD_WORKERS, Config.UPLOAD_WINDOW
+                ) + 1
             )
+            self.context.client = self.app
+            self.context.api.client = self.app
+            self.context.status = StatusReporter(self.context.api)
             
             # Register handlers manually if plugins don't load automatically
             await self.register_handlers()
@@ -84,17 +134,21 @@ class VideoCompressorBot:
         """Register handlers manually"""
         try:
             # Import and register handlers from plugins
-            from plugins.start import start_command, help_command
+            from plugins.start import start_command, help_command, cancel_command
             from plugins.video import handle_video, handle_document
-            from plugins.callbacks import handle_callback
+            from plugins.callbacks import handle_callback, run_compression_task
             
             # Register the handlers
             self.app.add_handler(start_command)
             self.app.add_handler(help_command)
+            self.app.add_handler(cancel_command)
             self.app.add_handler(handle_video)
             self.app.add_handler(handle_document)
             self.app.add_handler(handle_callback)
             
+            # Job runners the scheduler can rebuild from a stored task
+            self.context.scheduler.register('compress', run_compression_task)
+            
             logger.info("✅ Handlers registered successfully")
             
         except ImportError as e:
@@ -111,6 +165,15 @@ class VideoCompressorBot:
             await self.app.start()
             self.is_running = True
             
+            # Jobs a crash interrupted go back in the queue and resume from their checkpoints
+            recovered = await self.context.scheduler.recover()
+            if recovered:
+                logger.info(f"♻️ Recovered {recovered} interrupted job(s)")
+            
+            # Start encode workers (picks up jobs still queued from the last run)
+            self.context.status.start()
+            await self.context.scheduler.start()
+            
             # Get bot info
             bot_info = await self.app.get_me()
             logger.info(f"🤖 Bot started successfully: @{bot_info.username}")
@@ -135,7 +198,7 @@ class VideoCompressorBot:
 
 Ready to compress videos! Send /start to begin.
 """
-                await self.app.send_message(Config.USER_ID, startup_msg)
+                await self.context.api.send_message(Config.USER_ID, startup_msg)
             except Exception as e:
                 logger.warning(f"Could not send startup notification: {e}")
             
@@ -162,7 +225,7 @@ Ready to compress videos! Send /start to begin.
                 
                 # Send shutdown notification
                 try:
-                    await self.app.send_message(
+                    await self.context.api.send_message(
                         Config.USER_ID, 
                         "🛑 **Video Compressor Bot Stopped**\n\nBot is now offline."
                     )
@@ -173,6 +236,12 @@ Ready to compress videos! Send /start to begin.
                 if self.app:
                     await self.app.stop()
                 
+                # Cancel running jobs
+                if self.context:
+                    await self.context.scheduler.shutdown()
+                    await self.context.status.stop()
+                    await self.context.api.stop()
+                
                 # Disconnect database
                 if self.db:
                     await self.db.disconnect()
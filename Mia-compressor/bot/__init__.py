@@ -4,9 +4,10 @@ Video Compressor Bot - Bot Module
 """
 
 from .config import Config
-from .database import Database
+from .database import Database, create_database
+from .context import AppContext, get_context
 
 __version__ = "2.0.0"
 __author__ = "Video Compressor Bot"
 
-__all__ = ["Config", "Database"]
\ No newline at end of file
+__all__ = ["Config", "Database", "create_database", "AppContext", "get_context"]
\ No newline at end of file
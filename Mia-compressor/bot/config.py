@@ -25,13 +25,58 @@ class Config:
     # Bot Settings
     MAX_FILE_SIZE: int = 2000 * 1024 * 1024  # 2GB
     MAX_QUEUE_SIZE: int = 5
+    MAX_CONCURRENT_JOBS: int = config_data.get("MAX_CONCURRENT_JOBS", 1)  # jobs encoding at once
+    DOWNLOAD_WORKERS: int = config_data.get("DOWNLOAD_WORKERS", 2)  # jobs downloading at once
+    DOWNLOAD_CONNECTIONS: int = config_data.get("DOWNLOAD_CONNECTIONS", 4)  # parallel ranges per download
+    DOWNLOAD_PART_CHUNKS: int = 8  # 1 MiB chunks per download part (resume granularity)
+    DOWNLOAD_PART_RETRIES: int = 3  # retries of a failed part before the download fails
+    UPLOAD_WORKERS: int = config_data.get("UPLOAD_WORKERS", 1)  # jobs uploading at once
+    UPLOAD_WINDOW: int = config_data.get("UPLOAD_WINDOW", 8)  # file parts in flight per upload
+    UPLOAD_PART_RETRIES: int = 3  # retries of a failed part before the upload fails
+    PRIORITY_FILE_SIZE: int = 100 * 1024 * 1024  # smaller files jump ahead of long jobs
+    RESULT_CACHE_SIZE: int = 1000  # delivered results remembered per (file, settings)
+    RESULT_CACHE_TTL: int = 30 * 24 * 3600  # seconds before a cached result is re-encoded
+    UPLOAD_CACHE_SIZE: int = 200  # uploaded outputs remembered by fingerprint (LRU)
+    MESSAGE_CACHE_SIZE: int = 500  # received video messages kept for callback lookups
     COMPRESSION_TIMEOUT: int = 3600  # 1 hour
+    ENCODE_STALL_TIMEOUT: int = 120  # seconds without ffmpeg progress before the encode is killed
+    ENCODE_FALLBACK: str = config_data.get("ENCODE_FALLBACK", "preset")  # retry after a kill: "preset", "copy" or "none"
+    FALLBACK_PRESET: str = "ultrafast"  # x264 preset of the "preset" fallback
+    RECOVERY_MAX_ATTEMPTS: int = 3  # restarts a running job survives before it is marked failed
+    CANCEL_GRACE: float = 5.0  # seconds ffmpeg gets after SIGTERM before SIGKILL
+    STATUS_EDIT_INTERVAL: float = 3.0  # seconds between status message edits per chat
+    API_GLOBAL_RATE: float = 25.0  # outbound Bot API calls per second overall
+    API_CHAT_RATE: float = 1.0  # calls per second to one chat
+    API_CHAT_BURST: int = 3  # calls one chat may receive back to back
+    API_FLOOD_RETRIES: int = 3  # FloodWait sleeps before a call gives up
+    FFMPEG_STDERR_TAIL_KB: int = 32  # ffmpeg log kept for error reports
+    STREAM_COPY: bool = config_data.get("STREAM_COPY", True)  # remux streams that already meet the target
+    FIRST_PASS_PRESET: str = "veryfast"  # x264 preset for the statistics pass of target-size encodes
+    TARGET_SIZE_OVERHEAD: float = 0.02  # share of the target size reserved for the container
+    TARGET_SIZE_MIN_VIDEO_BITRATE: int = 64000  # bit/s, below this a target size is rejected
+    TARGET_SIZE_RETRIES: int = 2  # second-pass retries after an overshoot
+    STREAM_INGEST: bool = config_data.get("STREAM_INGEST", True)  # encode streamable inputs while downloading
+    PARALLEL_ENCODE: bool = config_data.get("PARALLEL_ENCODE", True)  # split long videos at keyframes
+    ENCODE_WORKERS: int = config_data.get("ENCODE_WORKERS", 0)  # concurrent segment encoders (0 = CPU count)
+    SEGMENT_MIN_DURATION: int = 30  # seconds, shortest segment worth its own encoder
+    SEGMENT_MAX_DURATION: int = 300  # seconds, longest segment (work lost when an encode is interrupted)
+    CHECKPOINT_ENCODE: bool = config_data.get("CHECKPOINT_ENCODE", True)  # segment long encodes so restarts resume them
+    CHECKPOINT_MIN_DURATION: int = 600  # seconds, shortest video encoded with checkpoints
     
     # Paths
     DOWNLOAD_PATH: str = "/content/downloads"
     COMPRESSED_PATH: str = "/content/compressed"
     THUMBNAIL_PATH: str = "/content/thumbnails"
     
+    # Database
+    DATABASE_BACKEND: str = config_data.get("DATABASE_BACKEND", "json")  # "json" or "sqlite"
+    SQLITE_PATH: str = "/content/Video-Compressor-Bot/database.sqlite3"
+    DATABASE_PATH: str = "/content/Video-Compressor-Bot/database.json"
+    JOURNAL_COMPACT_THRESHOLD: int = 1000  # journal records before a snapshot is written
+    DB_FLUSH_INTERVAL_MS: int = 500  # write-behind flush period
+    DB_FLUSH_MAX_PENDING: int = 100  # flush early after this many changes
+    PROBE_CACHE_SIZE: int = 256  # ffprobe results kept (LRU)
+    
     # FFmpeg presets
     COMPRESSION_PRESETS = {
         "ultra_fast": {
@@ -91,6 +136,18 @@ class Config:
         "8000k": "8000k"
     }
     
+    # Target output sizes (MB, 0 = off)
+    TARGET_SIZES = {
+        "off": 0,
+        "25MB": 25,
+        "50MB": 50,
+        "100MB": 100,
+        "250MB": 250,
+        "500MB": 500,
+        "1GB": 1024,
+        "2GB": 1990
+    }
+    
     # Messages
     START_MSG = """
 🎬 **Welcome to Video Compressor Bot!**
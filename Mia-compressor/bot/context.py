@@ -0,0 +1,39 @@
+# context.py
+from typing import Optional
+
+class AppContext:
+    """Process-wide components shared by every plugin.
+    
+    Built once by ``VideoCompressorBot.initialize()`` so all handlers read and
+    write the same loaded store instead of each keeping its own copy.
+    """
+    
+    def __init__(self, db, compressor, scheduler, progress, api=None, delivery=None, results=None,
+                 messages=None, cancellation=None, checkpoints=None):
+        self.db = db
+        self.compressor = compressor
+        self.probe = compressor.probe
+        self.scheduler = scheduler
+        self.progress = progress
+        self.api = api
+        self.delivery = delivery
+        self.results = results
+        self.messages = messages
+        self.cancellation = cancellation
+        self.checkpoints = checkpoints
+        self.compression_handler = None
+        self.client = None
+        self.status = None
+
+_context: Optional[AppContext] = None
+
+def set_context(context: AppContext):
+    """Install the shared application context"""
+    global _context
+    _context = context
+
+def get_context() -> AppContext:
+    """Get the shared application context"""
+    if _context is None:
+        raise RuntimeError("Application context is not initialized")
+    return _context
@@ -4,13 +4,44 @@ import os
 import aiofiles
 from typing import Dict, Any, Optional
 import asyncio
+from bot.config import Config
 
 class Database:
+    """JSON snapshot plus an append-only journal of record changes.
+    
+    Mutations only mark records dirty. A background flusher appends the
+    latest value of every dirty record to the journal at most every
+    ``Config.DB_FLUSH_INTERVAL_MS`` (or sooner after
+    ``Config.DB_FLUSH_MAX_PENDING`` changes), so bursts of updates to the same
+    record collapse into one line. Once the journal grows past
+    ``Config.JOURNAL_COMPACT_THRESHOLD`` records it is folded into a fresh
+    snapshot in the background.
+    """
+    
+    TABLES = ('users', 'queue', 'cache', 'counters')
+    
     def __init__(self):
-        self.db_path = "/content/Video-Compressor-Bot/database.json"
+        self.db_path = Config.DATABASE_PATH
+        self.journal_path = f"{self.db_path}.journal"
+        self.rotated_journal_path = f"{self.journal_path}.1"
         self.users_data = {}
         self.queue_data = {}
+        self.cache_data = {}
+        self.counters_data = {}
         self.lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._compact_task = None
+        self._flusher_task = None
+        self._flush_event = asyncio.Event()
+        self._journal = None
+        self._journal_records = 0
+        self._dirty = {}
+        self._pending_changes = 0
+        
+        # Write-behind counters
+        self.mutations = 0
+        self.records_written = 0
+        self.coalesced_writes = 0
     
     async def connect(self):
         """Initialize database"""
@@ -20,24 +51,158 @@ class Database:
                 data = json.loads(content) if content else {}
                 self.users_data = data.get('users', {})
                 self.queue_data = data.get('queue', {})
+                self.cache_data = data.get('cache', {})
+                self.counters_data = data.get('counters', {})
+        
+        # A rotated journal only survives if we died mid-compaction
+        leftover = os.path.exists(self.rotated_journal_path)
+        for path in (self.rotated_journal_path, self.journal_path):
+            self._journal_records += await self._replay_journal(path)
+        
+        self._journal = await aiofiles.open(self.journal_path, 'a')
         
-        print("🗄️ Database connected")
+        if leftover:
+            await self.save_data()
+        
+        self._flusher_task = asyncio.create_task(self._flusher())
+        
+        print(f"🗄️ Database connected ({self._journal_records} journal records replayed)")
     
     async def disconnect(self):
         """Save and close database"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        if self._compact_task:
+            await self._compact_task
+        await self.flush()
         await self.save_data()
-        print("🗄️ Database disconnected")
+        if self._journal:
+            await self._journal.close()
+            self._journal = None
+        print(f"🗄️ Database disconnected ({self.coalesced_writes} of {self.mutations} writes coalesced)")
     
     async def save_data(self):
-        """Save data to file"""
-        async with self.lock:
-            data = {
-                'users': self.users_data,
-                'queue': self.queue_data
-            }
+        """Write a full snapshot and start a new journal"""
+        async with self._write_lock:
+            async with self.lock:
+                snapshot = json.dumps({table: self._table(table) for table in self.TABLES}, indent=4)
+                self._take_dirty()
+                await self._rotate_journal()
+            
+            tmp_path = f"{self.db_path}.tmp"
+            async with aiofiles.open(tmp_path, 'w') as f:
+                await f.write(snapshot)
+            os.replace(tmp_path, self.db_path)
+            
+            if os.path.exists(self.rotated_journal_path):
+                os.remove(self.rotated_journal_path)
+    
+    async def flush(self):
+        """Append every dirty record to the journal in one write"""
+        async with self._write_lock:
+            # Without an open journal the records stay dirty for the next flush
+            if not self._journal:
+                return
+            async with self.lock:
+                lines = [self._record(table, key) for table, key in self._take_dirty()]
             
-            async with aiofiles.open(self.db_path, 'w') as f:
-                await f.write(json.dumps(data, indent=4))
+            if lines:
+                await self._journal.write(''.join(lines))
+                await self._journal.flush()
+                self._journal_records += len(lines)
+                self.records_written += len(lines)
+        
+        self._maybe_compact()
+    
+    # Journal
+    def _table(self, table: str) -> Dict[str, Any]:
+        return getattr(self, f"{table}_data")
+    
+    def _apply(self, record: Dict[str, Any]):
+        """Apply one journal record to the in-memory tables"""
+        table = self._table(record['table'])
+        if record['op'] == 'set':
+            table[record['key']] = record['value']
+        else:
+            table.pop(record['key'], None)
+    
+    async def _replay_journal(self, path: str) -> int:
+        """Replay a journal file, stopping at a torn trailing write"""
+        if not os.path.exists(path):
+            return 0
+        
+        count = 0
+        async with aiofiles.open(path, 'r') as f:
+            async for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ Ignoring truncated journal record in {path}")
+                    break
+                self._apply(record)
+                count += 1
+        return count
+    
+    async def _rotate_journal(self):
+        """Move the live journal aside so new records start a fresh file (lock held)"""
+        if self._journal:
+            await self._journal.close()
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.rotated_journal_path)
+        self._journal = await aiofiles.open(self.journal_path, 'a')
+        self._journal_records = 0
+    
+    def _record(self, table: str, key: str) -> str:
+        """Serialize the current value of a record as one journal line"""
+        value = self._table(table).get(key)
+        if value is None:
+            record = {'op': 'del', 'table': table, 'key': key}
+        else:
+            record = {'op': 'set', 'table': table, 'key': key, 'value': value}
+        return json.dumps(record, separators=(',', ':')) + '\n'
+    
+    def _mark_dirty(self, table: str, key: str):
+        """Queue a record for the next flush (lock held)"""
+        self._dirty[(table, key)] = None
+        self._pending_changes += 1
+        self.mutations += 1
+        if self._pending_changes >= Config.DB_FLUSH_MAX_PENDING:
+            self._flush_event.set()
+    
+    def _take_dirty(self) -> list:
+        """Hand over the dirty set and account for collapsed changes (lock held)"""
+        dirty = list(self._dirty)
+        self.coalesced_writes += self._pending_changes - len(dirty)
+        self._dirty.clear()
+        self._pending_changes = 0
+        return dirty
+    
+    async def _flusher(self):
+        """Flush dirty records every interval, or early once enough pile up"""
+        interval = Config.DB_FLUSH_INTERVAL_MS / 1000
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Database flush error: {e}")
+    
+    def _maybe_compact(self):
+        """Fold the journal into a snapshot in the background once it grows large"""
+        if self._journal_records < Config.JOURNAL_COMPACT_THRESHOLD:
+            return
+        if self._compact_task and not self._compact_task.done():
+            return
+        self._compact_task = asyncio.create_task(self.save_data())
     
     # User management
     async def add_user(self, user_id: int, user_data: Dict[str, Any]):
@@ -52,7 +217,7 @@ class Database:
                 'total_compressed': 0,
                 'total_size_saved': 0
             }
-        await self.save_data()
+            self._mark_dirty('users', str(user_id))
     
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user data"""
@@ -63,7 +228,11 @@ class Database:
         async with self.lock:
             if str(user_id) in self.users_data:
                 self.users_data[str(user_id)]['settings'].update(settings)
-        await self.save_data()
+                self._mark_dirty('users', str(user_id))
+    
+    async def update_user_setting(self, user_id: int, key: str, value: Any):
+        """Update a single user setting"""
+        await self.update_user_settings(user_id, {key: value})
     
     async def increment_user_stats(self, user_id: int, size_saved: int):
         """Increment user compression stats"""
@@ -71,13 +240,21 @@ class Database:
             if str(user_id) in self.users_data:
                 self.users_data[str(user_id)]['total_compressed'] += 1
                 self.users_data[str(user_id)]['total_size_saved'] += size_saved
-        await self.save_data()
+                self._mark_dirty('users', str(user_id))
+    
+    async def update_user_stats(self, user_id: int, size_saved: int):
+        """Alias of increment_user_stats used by the callback handlers"""
+        await self.increment_user_stats(user_id, size_saved)
     
     # Queue management
     async def add_to_queue(self, user_id: int, task_data: Dict[str, Any]):
         """Add task to queue"""
         async with self.lock:
-            task_id = f"{user_id}_{len(self.queue_data)}"
+            # Ids are never reused, other state (checkpoints, scheduler) is keyed by them
+            seq = self.counters_data.get('queue_seq', self._last_queue_seq()) + 1
+            self.counters_data['queue_seq'] = seq
+            self._mark_dirty('counters', 'queue_seq')
+            task_id = f"{user_id}_{seq}"
             self.queue_data[task_id] = {
                 'user_id': user_id,
                 'status': 'queued',
@@ -86,23 +263,47 @@ class Database:
                 'file_size': task_data.get('file_size'),
                 'settings': task_data.get('settings', {})
             }
-        await self.save_data()
+            self._mark_dirty('queue', task_id)
         return task_id
     
+    def _last_queue_seq(self) -> int:
+        """Highest sequence number among ids issued before the counter was persisted"""
+        numbers = [int(number) for number in
+                   (task_id.rpartition('_')[2] for task_id in self.queue_data) if number.isdigit()]
+        return max(numbers, default=0)
+    
+    async def add_compression_task(self, task_id: str, task_data: Dict[str, Any]):
+        """Add a task under a caller-chosen id"""
+        async with self.lock:
+            self.queue_data[task_id] = dict(task_data)
+            self._mark_dirty('queue', task_id)
+    
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single queued task"""
+        return self.queue_data.get(task_id)
+    
     async def update_queue_status(self, task_id: str, status: str, progress: int = 0):
-        """Update queue task status"""
+        """Update queue task status (only lifecycle transitions are persisted)"""
+        async with self.lock:
+            task = self.queue_data.get(task_id)
+            if task is not None and task.get('status') != status:
+                task['status'] = status
+                task['progress'] = progress
+                self._mark_dirty('queue', task_id)
+    
+    async def update_compression_task(self, task_id: str, updates: Dict[str, Any]):
+        """Merge fields into a queued task"""
         async with self.lock:
             if task_id in self.queue_data:
-                self.queue_data[task_id]['status'] = status
-                self.queue_data[task_id]['progress'] = progress
-        await self.save_data()
+                self.queue_data[task_id].update(updates)
+                self._mark_dirty('queue', task_id)
     
     async def remove_from_queue(self, task_id: str):
         """Remove task from queue"""
         async with self.lock:
             if task_id in self.queue_data:
                 del self.queue_data[task_id]
-        await self.save_data()
+                self._mark_dirty('queue', task_id)
     
     async def get_user_queue(self, user_id: int) -> Dict[str, Any]:
         """Get user's queue tasks"""
@@ -112,15 +313,45 @@ class Database:
                 user_tasks[task_id] = task_data
         return user_tasks
     
+    async def get_tasks(self, status: Optional[str] = None) -> Dict[str, Any]:
+        """Get all tasks, optionally only those with the given status"""
+        return {task_id: task for task_id, task in self.queue_data.items()
+                if status is None or task.get('status') == status}
+    
     async def get_queue_position(self, task_id: str) -> int:
-        """Get task position in queue"""
-        queued_tasks = [tid for tid, task in self.queue_data.items() 
-                       if task['status'] == 'queued']
+        """Get task position in queue (higher priority first, then FIFO)"""
+        queued_tasks = sorted(
+            (tid for tid, task in self.queue_data.items() if task['status'] == 'queued'),
+            key=lambda tid: (-self.queue_data[tid].get('priority', 0), self.queue_data[tid].get('queued_at', 0))
+        )
         try:
             return queued_tasks.index(task_id) + 1
         except ValueError:
             return 0
     
+    # Cache entries (probe results, file ids, ...)
+    async def get_cache(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value"""
+        return self.cache_data.get(f"{namespace}:{key}")
+    
+    async def get_cache_entries(self, namespace: str) -> Dict[str, Any]:
+        """Get every cached value of a namespace"""
+        prefix = f"{namespace}:"
+        return {key[len(prefix):]: value for key, value in self.cache_data.items()
+                if key.startswith(prefix)}
+    
+    async def set_cache(self, namespace: str, key: str, value: Any):
+        """Store a cached value"""
+        async with self.lock:
+            self.cache_data[f"{namespace}:{key}"] = value
+            self._mark_dirty('cache', f"{namespace}:{key}")
+    
+    async def delete_cache(self, namespace: str, key: str):
+        """Drop a cached value"""
+        async with self.lock:
+            if self.cache_data.pop(f"{namespace}:{key}", None) is not None:
+                self._mark_dirty('cache', f"{namespace}:{key}")
+    
     # Statistics
     async def get_total_users(self) -> int:
         """Get total users count"""
@@ -137,7 +368,15 @@ class Database:
             'resolution': 'keep',
             'audio_bitrate': '128k',
             'video_bitrate': '2000k',
+            'target_size': 0,
             'remove_audio': False,
             'custom_name': '',
             'thumbnail': True
-        }
\ No newline at end of file
+        }
+
+def create_database():
+    """Build the storage backend selected by Config.DATABASE_BACKEND"""
+    if Config.DATABASE_BACKEND == "sqlite":
+        from bot.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase()
+    return Database()
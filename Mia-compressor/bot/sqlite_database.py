@@ -0,0 +1,367 @@
+# sqlite_database.py
+import json
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from bot.config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    queued_at REAL NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('total_users', 0);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('total_compressions', 0);
+INSERT OR IGNORE INTO counters (name, value)
+    SELECT 'queue_seq', COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'queue'), 0);
+"""
+
+# Created after the migration, which adds the run-order columns to older files
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_queue_user_status ON queue (user_id, status);
+CREATE INDEX IF NOT EXISTS idx_queue_status_seq ON queue (status, seq);
+CREATE INDEX IF NOT EXISTS idx_queue_run_order ON queue (status, priority, queued_at, seq);
+"""
+
+class SQLiteDatabase:
+    """Drop-in replacement for ``Database`` backed by an indexed SQLite file.
+    
+    All queries run on one dedicated thread so the event loop never blocks
+    on disk I/O, and global stats come from counters maintained in the same
+    transaction as the mutation that changes them.
+    """
+    
+    def __init__(self):
+        self.db_path = Config.SQLITE_PATH
+        self.conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+    
+    async def connect(self):
+        """Initialize database"""
+        await self._run(self._connect)
+        print("🗄️ Database connected (sqlite)")
+    
+    def _connect(self):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            self._migrate()
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+    
+    def _migrate(self):
+        """Give a queue table from before the run-order columns its priority and queued_at"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(queue)")}
+        if 'priority' in columns:
+            return
+        self.conn.execute("ALTER TABLE queue ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("ALTER TABLE queue ADD COLUMN queued_at REAL NOT NULL DEFAULT 0")
+        self.conn.execute(
+            "UPDATE queue SET priority = COALESCE(json_extract(data, '$.priority'), 0), "
+            "queued_at = COALESCE(json_extract(data, '$.queued_at'), 0)"
+        )
+    
+    async def disconnect(self):
+        """Close database"""
+        if self.conn:
+            await self._run(self.conn.close)
+            self.conn = None
+        self._executor.shutdown(wait=True)
+        print("🗄️ Database disconnected")
+    
+    async def save_data(self):
+        """Checkpoint the WAL into the main database file"""
+        await self._run(self.conn.execute, "PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    async def flush(self):
+        """Every statement commits on its own, so there is nothing to flush"""
+    
+    # User management
+    async def add_user(self, user_id: int, user_data: Dict[str, Any]):
+        """Add or update user"""
+        user = {
+            'id': user_id,
+            'first_name': user_data.get('first_name', ''),
+            'username': user_data.get('username', ''),
+            'join_date': user_data.get('join_date', ''),
+            'settings': self.get_default_settings(),
+            'total_compressed': 0,
+            'total_size_saved': 0
+        }
+        await self._run(self._add_user, user_id, user)
+    
+    def _add_user(self, user_id: int, user: Dict[str, Any]):
+        with self.conn:
+            previous = self._load_user(user_id)
+            if previous is None:
+                self._bump('total_users', 1)
+            else:
+                self._bump('total_compressions', -previous.get('total_compressed', 0))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+                (user_id, json.dumps(user))
+            )
+    
+    async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user data"""
+        return await self._run(self._load_user, user_id)
+    
+    def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _store_user(self, user_id: int, user: Dict[str, Any]):
+        self.conn.execute("UPDATE users SET data = ? WHERE id = ?", (json.dumps(user), user_id))
+    
+    async def update_user_settings(self, user_id: int, settings: Dict[str, Any]):
+        """Update user settings"""
+        await self._run(self._update_user_settings, user_id, settings)
+    
+    def _update_user_settings(self, user_id: int, settings: Dict[str, Any]):
+        with self.conn:
+            user = self._load_user(user_id)
+            if user is not None:
+                user['settings'].update(settings)
+                self._store_user(user_id, user)
+    
+    async def update_user_setting(self, user_id: int, key: str, value: Any):
+        """Update a single user setting"""
+        await self.update_user_settings(user_id, {key: value})
+    
+    async def increment_user_stats(self, user_id: int, size_saved: int):
+        """Increment user compression stats"""
+        await self._run(self._increment_user_stats, user_id, size_saved)
+    
+    def _increment_user_stats(self, user_id: int, size_saved: int):
+        with self.conn:
+            user = self._load_user(user_id)
+            if user is not None:
+                user['total_compressed'] += 1
+                user['total_size_saved'] += size_saved
+                self._store_user(user_id, user)
+                self._bump('total_compressions', 1)
+    
+    async def update_user_stats(self, user_id: int, size_saved: int):
+        """Alias of increment_user_stats used by the callback handlers"""
+        await self.increment_user_stats(user_id, size_saved)
+    
+    # Queue management
+    async def add_to_queue(self, user_id: int, task_data: Dict[str, Any]):
+        """Add task to queue"""
+        task = {
+            'user_id': user_id,
+            'status': 'queued',
+            'created_at': task_data.get('created_at'),
+            'file_name': task_data.get('file_name'),
+            'file_size': task_data.get('file_size'),
+            'settings': task_data.get('settings', {})
+        }
+        return await self._run(self._add_to_queue, user_id, task)
+    
+    def _add_to_queue(self, user_id: int, task: Dict[str, Any]) -> str:
+        with self.conn:
+            # MAX(seq) + 1 comes back after the newest task is removed; the counter never does
+            self._bump('queue_seq', 1)
+            task_id = f"{user_id}_{self._counter('queue_seq')}"
+            self._insert_task(task_id, task)
+        return task_id
+    
+    async def add_compression_task(self, task_id: str, task_data: Dict[str, Any]):
+        """Add a task under a caller-chosen id"""
+        await self._run(self._add_compression_task, task_id, dict(task_data))
+    
+    def _add_compression_task(self, task_id: str, task: Dict[str, Any]):
+        with self.conn:
+            self._insert_task(task_id, task)
+    
+    def _insert_task(self, task_id: str, task: Dict[str, Any]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO queue (task_id, user_id, status, priority, queued_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (task_id, task['user_id'], task.get('status', 'queued'), task.get('priority') or 0,
+             task.get('queued_at') or 0.0, json.dumps(task))
+        )
+    
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single queued task"""
+        return await self._run(self._load_task, task_id)
+    
+    def _load_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT data FROM queue WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    async def update_queue_status(self, task_id: str, status: str, progress: int = 0):
+        """Update queue task status (only lifecycle transitions are persisted)"""
+        await self._run(self._update_queue_status, task_id, status, progress)
+    
+    def _update_queue_status(self, task_id: str, status: str, progress: int):
+        with self.conn:
+            task = self._load_task(task_id)
+            if task is None or task.get('status') == status:
+                return
+            task.update({'status': status, 'progress': progress})
+            self.conn.execute(
+                "UPDATE queue SET status = ?, data = ? WHERE task_id = ?",
+                (status, json.dumps(task), task_id)
+            )
+    
+    async def update_compression_task(self, task_id: str, updates: Dict[str, Any]):
+        """Merge fields into a queued task"""
+        await self._run(self._update_task, task_id, updates)
+    
+    def _update_task(self, task_id: str, updates: Dict[str, Any]):
+        with self.conn:
+            task = self._load_task(task_id)
+            if task is None:
+                return
+            task.update(updates)
+            self.conn.execute(
+                "UPDATE queue SET status = ?, priority = ?, queued_at = ?, data = ? WHERE task_id = ?",
+                (task.get('status', 'queued'), task.get('priority') or 0, task.get('queued_at') or 0.0,
+                 json.dumps(task), task_id)
+            )
+    
+    async def remove_from_queue(self, task_id: str):
+        """Remove task from queue"""
+        await self._run(self._remove_from_queue, task_id)
+    
+    def _remove_from_queue(self, task_id: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM queue WHERE task_id = ?", (task_id,))
+    
+    async def get_user_queue(self, user_id: int) -> Dict[str, Any]:
+        """Get user's queue tasks"""
+        return await self._run(self._get_user_queue, user_id)
+    
+    def _get_user_queue(self, user_id: int) -> Dict[str, Any]:
+        rows = self.conn.execute(
+            "SELECT task_id, data FROM queue WHERE user_id = ? ORDER BY seq", (user_id,)
+        ).fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+    
+    async def get_tasks(self, status: Optional[str] = None) -> Dict[str, Any]:
+        """Get all tasks, optionally only those with the given status"""
+        return await self._run(self._get_tasks, status)
+    
+    def _get_tasks(self, status: Optional[str]) -> Dict[str, Any]:
+        if status is None:
+            rows = self.conn.execute("SELECT task_id, data FROM queue ORDER BY seq").fetchall()
+        else:
+            rows = self.conn.execute(
+                "SELECT task_id, data FROM queue WHERE status = ? ORDER BY seq", (status,)
+            ).fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+    
+    async def get_queue_position(self, task_id: str) -> int:
+        """Get task position in queue (higher priority first, then FIFO)"""
+        return await self._run(self._get_queue_position, task_id)
+    
+    def _get_queue_position(self, task_id: str) -> int:
+        row = self.conn.execute(
+            "SELECT priority, queued_at, seq FROM queue WHERE task_id = ? AND status = 'queued'", (task_id,)
+        ).fetchone()
+        if not row:
+            return 0
+        priority, queued_at, seq = row
+        # Two range scans of idx_queue_run_order: higher priorities, then older jobs of the same one
+        return self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM queue WHERE status = 'queued' AND priority > ?) + "
+            "(SELECT COUNT(*) FROM queue WHERE status = 'queued' AND priority = ? "
+            "AND (queued_at, seq) <= (?, ?))",
+            (priority, priority, queued_at, seq)
+        ).fetchone()[0]
+    
+    # Cache entries (probe results, file ids, ...)
+    async def get_cache(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value"""
+        return await self._run(self._get_cache, namespace, key)
+    
+    def _get_cache(self, namespace: str, key: str) -> Optional[Any]:
+        row = self.conn.execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    async def get_cache_entries(self, namespace: str) -> Dict[str, Any]:
+        """Get every cached value of a namespace"""
+        return await self._run(self._get_cache_entries, namespace)
+    
+    def _get_cache_entries(self, namespace: str) -> Dict[str, Any]:
+        rows = self.conn.execute(
+            "SELECT key, value FROM cache WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+    
+    async def set_cache(self, namespace: str, key: str, value: Any):
+        """Store a cached value"""
+        await self._run(self._set_cache, namespace, key, json.dumps(value))
+    
+    def _set_cache(self, namespace: str, key: str, value: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, value)
+            )
+    
+    async def delete_cache(self, namespace: str, key: str):
+        """Drop a cached value"""
+        await self._run(self._delete_cache, namespace, key)
+    
+    def _delete_cache(self, namespace: str, key: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+    
+    # Statistics
+    def _bump(self, name: str, delta: int):
+        self.conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (delta, name))
+    
+    def _counter(self, name: str) -> int:
+        row = self.conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+    
+    async def get_total_users(self) -> int:
+        """Get total users count"""
+        return await self._run(self._counter, 'total_users')
+    
+    async def get_total_compressions(self) -> int:
+        """Get total compressions count"""
+        return await self._run(self._counter, 'total_compressions')
+    
+    def get_default_settings(self) -> Dict[str, str]:
+        """Get default user settings"""
+        return {
+            'preset': 'medium',
+            'resolution': 'keep',
+            'audio_bitrate': '128k',
+            'video_bitrate': '2000k',
+            'target_size': 0,
+            'remove_audio': False,
+            'custom_name': '',
+            'thumbnail': True
+        }
@@ -5,13 +5,12 @@ from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.handlers import CallbackQueryHandler
 from bot.config import Config
-from bot.database import Database
-from utils.helpers import format_bytes
-from utils.compressor import VideoCompressor
-
-# Initialize components
-db = Database()
-compressor = VideoCompressor()
+from bot.context import get_context
+from utils.scheduler import TaskScheduler
+from utils.pipeline import fetch_and_compress
+from utils.helpers import format_bytes, describe_encode_path
+from utils.result_cache import settings_hash
+from utils.cancellation import track_paths
 
 # User authentication filter
 def auth_filter(_, __, callback_query):
@@ -34,6 +33,10 @@ async def handle_callback(client: Client, callback_query: CallbackQuery):
             await show_stats_menu(callback_query)
         elif data == "queue":
             await show_queue_menu(callback_query)
+        elif data == "cancel_all":
+            await handle_cancel_all(callback_query)
+        elif data.startswith("cancel_"):
+            await handle_cancel(callback_query, data)
         elif data.startswith("set_"):
             await handle_setting_change(callback_query, data)
         elif data.startswith("compress_"):
@@ -48,11 +51,13 @@ async def handle_callback(client: Client, callback_query: CallbackQuery):
             await handle_audio_selection(callback_query, data)
         elif data.startswith("video_bitrate_"):
             await handle_video_selection(callback_query, data)
+        elif data.startswith("target_size_"):
+            await handle_target_size_selection(callback_query, data)
         else:
-            await callback_query.answer("Unknown action")
+            await get_context().api.answer(callback_query, "Unknown action")
     except Exception as e:
         print(f"Callback error: {e}")
-        await callback_query.answer("An error occurred")
+        await get_context().api.answer(callback_query, "An error occurred")
 
 async def show_start_menu(callback_query: CallbackQuery):
     """Show start menu"""
@@ -63,7 +68,7 @@ async def show_start_menu(callback_query: CallbackQuery):
          InlineKeyboardButton("📋 Queue", callback_data="queue")]
     ])
     
-    await callback_query.edit_message_text(Config.START_MSG, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, Config.START_MSG, reply_markup=keyboard)
 
 async def show_help_menu(callback_query: CallbackQuery):
     """Show help menu"""
@@ -71,10 +76,11 @@ async def show_help_menu(callback_query: CallbackQuery):
         [InlineKeyboardButton("🔙 Back", callback_data="start")]
     ])
     
-    await callback_query.edit_message_text(Config.HELP_MSG, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, Config.HELP_MSG, reply_markup=keyboard)
 
 async def show_settings_menu(callback_query: CallbackQuery):
     """Show settings menu"""
+    db = get_context().db
     user = await db.get_user(callback_query.from_user.id)
     settings = user.get('settings', {}) if user else {}
     
@@ -85,6 +91,7 @@ async def show_settings_menu(callback_query: CallbackQuery):
 **Resolution:** `{settings.get('resolution', 'keep')}`
 **Audio Bitrate:** `{settings.get('audio_bitrate', '128k')}`
 **Video Bitrate:** `{settings.get('video_bitrate', '2000k')}`
+**Target Size:** `{f"{settings['target_size']} MB" if settings.get('target_size') else 'Off'}`
 **Remove Audio:** `{'Yes' if settings.get('remove_audio') else 'No'}`
 **Generate Thumbnail:** `{'Yes' if settings.get('thumbnail') else 'No'}`
 """
@@ -94,18 +101,23 @@ async def show_settings_menu(callback_query: CallbackQuery):
          InlineKeyboardButton("📺 Resolution", callback_data="set_resolution")],
         [InlineKeyboardButton("🔊 Audio", callback_data="set_audio"),
          InlineKeyboardButton("🎬 Video", callback_data="set_video")],
+        [InlineKeyboardButton("📦 Target Size", callback_data="set_target")],
         [InlineKeyboardButton("🖼️ Thumbnail", callback_data="toggle_thumbnail"),
          InlineKeyboardButton("🔇 Remove Audio", callback_data="toggle_audio")],
         [InlineKeyboardButton("🔙 Back", callback_data="start")]
     ])
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 async def show_stats_menu(callback_query: CallbackQuery):
     """Show user statistics"""
+    db = get_context().db
     user = await db.get_user(callback_query.from_user.id)
     total_users = await db.get_total_users()
     total_compressions = await db.get_total_compressions()
+    pipeline = get_context().scheduler.stats()
+    results = get_context().results
+    api = get_context().api.stats()
     
     text = f"""
 📊 **Your Statistics:**
@@ -117,16 +129,27 @@ async def show_stats_menu(callback_query: CallbackQuery):
 **Global Stats:**
 **Total Users:** `{total_users}`
 **Total Compressions:** `{total_compressions}`
+
+**Pipeline:** `{pipeline['queue']['waiting']} queued, {pipeline['queue']['running']} in flight`
+**Result Cache:** `{results.hits}/{results.hits + results.misses} hits ({results.hit_rate():.0%})`
+**API Calls:** `{api['calls']} sent, {api['queued']} queued, {api['flood_waits']} FloodWaits ({api['throttled_seconds']:.0f}s throttled)`
 """
+    for stage in ('download', 'encode', 'upload'):
+        stats = pipeline[stage]
+        text += (f"**{stage.title()}:** `{stats['active']}/{stats['size']} busy, "
+                 f"{stats['waiting']} waiting, {stats['utilization']:.0%} utilized`\n")
     
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔙 Back", callback_data="start")]
     ])
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 async def show_queue_menu(callback_query: CallbackQuery):
     """Show queue menu"""
+    db = get_context().db
+    progress_registry = get_context().progress
+    scheduler = get_context().scheduler
     user_queue = await db.get_user_queue(callback_query.from_user.id)
     
     if not user_queue:
@@ -143,24 +166,58 @@ async def show_queue_menu(callback_query: CallbackQuery):
                 'processing': '🔄',
                 'completed': '✅',
                 'failed': '❌',
-                'cancelled': '🚫'
+                'cancelled': '🚫',
+                'attached': '🔗'
             }.get(task['status'], '❓')
             
-            progress = task.get('progress', 0)
+            progress = int(progress_registry.get_progress(task_id, task.get('progress', 0)))
             text += f"{i}. {status_emoji} `{task['file_name']}`\n"
             text += f"   Status: {task['status'].title()}"
             
-            if task['status'] == 'processing':
+            waiting = scheduler.waiting_for(task_id)
+            if waiting:
+                text += f" (waiting for a {waiting[0]} slot, position {waiting[1]})"
+            elif task['status'] in ('processing', 'attached'):
                 text += f" ({progress}%)"
+            elif task['status'] == 'queued':
+                text += f" (position {scheduler.position(task_id) or await db.get_queue_position(task_id)})"
             
             text += "\n\n"
         
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔄 Refresh", callback_data="queue"),
-             InlineKeyboardButton("🔙 Back", callback_data="start")]
-        ])
+        buttons = [[InlineKeyboardButton("🔄 Refresh", callback_data="queue"),
+                    InlineKeyboardButton("🔙 Back", callback_data="start")]]
+        if any(task['status'] in ('queued', 'processing', 'attached') for task in user_queue.values()):
+            buttons.insert(0, [InlineKeyboardButton("🚫 Cancel All", callback_data="cancel_all")])
+        keyboard = InlineKeyboardMarkup(buttons)
+    
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
+
+async def handle_cancel(callback_query: CallbackQuery, data: str):
+    """Cancel one queued or running task"""
+    task_id = data.replace("cancel_", "", 1)
+    task = await get_context().db.get_task(task_id)
+    if not task or task.get('user_id') != callback_query.from_user.id:
+        await get_context().api.answer(callback_query, "Task not found")
+        return
+    
+    if not await get_context().cancellation.cancel(task_id):
+        await get_context().api.answer(callback_query, f"Task is already {task.get('status', 'finished')}")
+        return
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    # Through the status reporter so no pending progress edit overwrites it
+    await get_context().status.send(
+        callback_query.message.chat.id, callback_query.message.id,
+        f"🚫 **Compression Cancelled**\n\n"
+        f"**File:** `{task.get('file_name', 'video.mp4')}`\n"
+        f"**Task ID:** `{task_id}`"
+    )
+    await get_context().api.answer(callback_query, "Cancelled")
+
+async def handle_cancel_all(callback_query: CallbackQuery):
+    """Cancel every queued and running task of the user"""
+    cancelled = await get_context().cancellation.cancel_all(callback_query.from_user.id)
+    await get_context().api.answer(callback_query, f"Cancelled {cancelled} task(s)")
+    await show_queue_menu(callback_query)
 
 async def handle_setting_change(callback_query: CallbackQuery, data: str):
     """Handle setting changes"""
@@ -174,6 +231,8 @@ async def handle_setting_change(callback_query: CallbackQuery, data: str):
         await show_audio_options(callback_query)
     elif setting_type == "video":
         await show_video_options(callback_query)
+    elif setting_type == "target":
+        await show_target_size_options(callback_query)
     elif data == "toggle_thumbnail":
         await toggle_thumbnail_setting(callback_query)
     elif data == "toggle_audio":
@@ -209,7 +268,7 @@ async def show_preset_options(callback_query: CallbackQuery):
 **Very Slow** - Best quality, slowest compression
 """
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 async def show_resolution_options(callback_query: CallbackQuery):
     """Show resolution options"""
@@ -233,7 +292,7 @@ async def show_resolution_options(callback_query: CallbackQuery):
     
     text = "📺 **Choose Output Resolution:**"
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 async def show_audio_options(callback_query: CallbackQuery):
     """Show audio bitrate options"""
@@ -256,7 +315,7 @@ async def show_audio_options(callback_query: CallbackQuery):
     
     text = "🔊 **Choose Audio Bitrate:**"
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 async def show_video_options(callback_query: CallbackQuery):
     """Show video bitrate options"""
@@ -279,66 +338,103 @@ async def show_video_options(callback_query: CallbackQuery):
     
     text = "🎬 **Choose Video Bitrate:**"
     
-    await callback_query.edit_message_text(text, reply_markup=keyboard)
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
+
+async def show_target_size_options(callback_query: CallbackQuery):
+    """Show target file size options"""
+    buttons = []
+    for size_key in Config.TARGET_SIZES.keys():
+        buttons.append([InlineKeyboardButton(
+            size_key if size_key != "off" else "Off (use video bitrate)", 
+            callback_data=f"target_size_{size_key}"
+        )])
+    
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data="settings")])
+    keyboard = InlineKeyboardMarkup(buttons)
+    
+    text = """
+📦 **Choose Target File Size:**
+
+The video bitrate is calculated from the duration so the output fits the
+chosen size (two-pass encode). Overrides the video bitrate setting.
+"""
+    
+    await get_context().api.edit(callback_query, text, reply_markup=keyboard)
 
 # Handler functions for selections
 async def handle_preset_selection(callback_query: CallbackQuery, data: str):
+    db = get_context().db
     preset = data.replace("preset_", "")
     await db.update_user_setting(callback_query.from_user.id, 'preset', preset)
-    await callback_query.answer(f"✅ Preset set to {preset}")
+    await get_context().api.answer(callback_query, f"✅ Preset set to {preset}")
     await show_settings_menu(callback_query)
 
 async def handle_resolution_selection(callback_query: CallbackQuery, data: str):
+    db = get_context().db
     resolution = data.replace("resolution_", "")
     await db.update_user_setting(callback_query.from_user.id, 'resolution', resolution)
-    await callback_query.answer(f"✅ Resolution set to {resolution}")
+    await get_context().api.answer(callback_query, f"✅ Resolution set to {resolution}")
     await show_settings_menu(callback_query)
 
 async def handle_audio_selection(callback_query: CallbackQuery, data: str):
+    db = get_context().db
     bitrate = data.replace("audio_bitrate_", "")
     await db.update_user_setting(callback_query.from_user.id, 'audio_bitrate', bitrate)
-    await callback_query.answer(f"✅ Audio bitrate set to {bitrate}")
+    await get_context().api.answer(callback_query, f"✅ Audio bitrate set to {bitrate}")
     await show_settings_menu(callback_query)
 
 async def handle_video_selection(callback_query: CallbackQuery, data: str):
+    db = get_context().db
     bitrate = data.replace("video_bitrate_", "")
     await db.update_user_setting(callback_query.from_user.id, 'video_bitrate', bitrate)
-    await callback_query.answer(f"✅ Video bitrate set to {bitrate}")
+    await get_context().api.answer(callback_query, f"✅ Video bitrate set to {bitrate}")
+    await show_settings_menu(callback_query)
+
+async def handle_target_size_selection(callback_query: CallbackQuery, data: str):
+    db = get_context().db
+    size_key = data.replace("target_size_", "")
+    target_size = Config.TARGET_SIZES.get(size_key, 0)
+    await db.update_user_setting(callback_query.from_user.id, 'target_size', target_size)
+    await get_context().api.answer(callback_query, f"✅ Target size set to {size_key}")
     await show_settings_menu(callback_query)
 
 async def toggle_thumbnail_setting(callback_query: CallbackQuery):
+    db = get_context().db
     user = await db.get_user(callback_query.from_user.id)
     current = user.get('settings', {}).get('thumbnail', False) if user else False
     new_value = not current
     await db.update_user_setting(callback_query.from_user.id, 'thumbnail', new_value)
-    await callback_query.answer(f"✅ Thumbnail {'enabled' if new_value else 'disabled'}")
+    await get_context().api.answer(callback_query, f"✅ Thumbnail {'enabled' if new_value else 'disabled'}")
     await show_settings_menu(callback_query)
 
 async def toggle_audio_setting(callback_query: CallbackQuery):
+    db = get_context().db
     user = await db.get_user(callback_query.from_user.id)
     current = user.get('settings', {}).get('remove_audio', False) if user else False
     new_value = not current
     await db.update_user_setting(callback_query.from_user.id, 'remove_audio', new_value)
-    await callback_query.answer(f"✅ Remove audio {'enabled' if new_value else 'disabled'}")
+    await get_context().api.answer(callback_query, f"✅ Remove audio {'enabled' if new_value else 'disabled'}")
     await show_settings_menu(callback_query)
 
 async def handle_compression_request(client: Client, callback_query: CallbackQuery, data: str):
     """Handle compression requests"""
+    db = get_context().db
     try:
         parts = data.split("_")
         compression_type = parts[1]  # quick or custom
         message_id = int(parts[2])
         
-        await callback_query.answer("🔄 Starting compression...")
+        await get_context().api.answer(callback_query, "🔄 Starting compression...")
         
         # Get the original message
         try:
-            original_message = await client.get_messages(
-                callback_query.message.chat.id, 
-                message_id
+            original_message = await get_context().messages.resolve(
+                client, callback_query.message.chat.id, message_id
             )
         except:
-            await callback_query.edit_message_text("❌ Original message not found.")
+            original_message = None
+        if not original_message:
+            await get_context().api.edit(callback_query, "❌ Original message not found.")
             return
         
         # Get file info
@@ -349,54 +445,116 @@ async def handle_compression_request(client: Client, callback_query: CallbackQue
             file_obj = original_message.document
             file_name = file_obj.file_name
         else:
-            await callback_query.edit_message_text("❌ No video found in the message.")
+            await get_context().api.edit(callback_query, "❌ No video found in the message.")
             return
         
         # Get user settings
         user = await db.get_user(callback_query.from_user.id)
         settings = user.get('settings', {}) if user else {}
+        if compression_type != 'custom':
+            settings = {'preset': 'medium'}
+        
+        # Same file with the same settings was compressed before
+        cached = await get_context().results.get(file_obj.file_unique_id, settings)
+        if cached and await get_context().results.send(
+            get_context().api, callback_query.from_user.id, cached,
+            caption=f"✅ **Video Compressed Successfully!**\n\n"
+                    f"**Original Size:** `{format_bytes(cached['original_size'])}`\n"
+                    f"**Compressed Size:** `{format_bytes(cached['compressed_size'])}`\n"
+                    f"**Size Saved:** `{format_bytes(cached['size_reduction'])}` "
+                    f"({cached['compression_ratio']:.1f}%)"
+        ):
+            await get_context().api.edit(
+                callback_query,
+                f"⚡ **Already Compressed!**\n\n"
+                f"**File:** `{file_name}`\n"
+                f"Sent the earlier result for these settings."
+            )
+            return
         
         # Create compression task
         task_id = f"{callback_query.from_user.id}_{message_id}_{int(asyncio.get_event_loop().time())}"
         
         task_data = {
             'user_id': callback_query.from_user.id,
+            'chat_id': callback_query.message.chat.id,
             'message_id': message_id,
             'file_name': file_name,
             'file_size': file_obj.file_size,
             'status': 'queued',
             'progress': 0,
-            'settings': settings if compression_type == 'custom' else {'preset': 'medium'},
+            'settings': settings,
             'created_at': asyncio.get_event_loop().time()
         }
         
         # Add to queue
         await db.add_compression_task(task_id, task_data)
         
-        # Start compression
-        asyncio.create_task(start_compression(client, task_id, original_message, task_data))
+        # Hand over to the encode workers (identical requests share one job)
+        scheduler = get_context().scheduler
+        position = await scheduler.submit(
+            task_id, 'compress', TaskScheduler.priority_for(file_obj.file_size),
+            key=f"{file_obj.file_unique_id}:{settings_hash(settings)}"
+        )
+        
+        leader = scheduler.leader_of(task_id)
+        if leader:
+            get_context().progress.link(task_id, leader)
+            await get_context().api.edit(
+                callback_query,
+                f"🔗 **Already Compressing!**\n\n"
+                f"**File:** `{file_name}`\n"
+                f"**Task ID:** `{task_id}`\n"
+                f"**Status:** Sharing task `{leader}`"
+                + (f" (position {position})" if position else "") + "\n\n"
+                f"You'll get the same result. You can check progress in /queue",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{task_id}")]
+                ])
+            )
+            return
         
         # Update message
-        await callback_query.edit_message_text(
-            f"✅ **Compression Started!**\n\n"
+        await get_context().api.edit(
+            callback_query,
+            f"✅ **Compression Queued!**\n\n"
             f"**File:** `{file_name}`\n"
             f"**Task ID:** `{task_id}`\n"
-            f"**Status:** Queued\n\n"
-            f"You can check progress in /queue"
+            f"**Status:** Queued (position {position})\n\n"
+            f"You can check progress in /queue",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{task_id}")]
+            ])
         )
         
     except Exception as e:
         print(f"Compression request error: {e}")
-        await callback_query.edit_message_text(f"❌ Error starting compression: {str(e)}")
+        await get_context().api.edit(callback_query, f"❌ Error starting compression: {str(e)}")
+
+async def finish_task(task_id: str, updates: dict):
+    """Update a task and the identical requests coalesced into it"""
+    db = get_context().db
+    for task in [task_id] + get_context().scheduler.followers_of(task_id):
+        await db.update_compression_task(task, updates)
+
+async def run_compression_task(task_id: str, task_data: dict):
+    """Scheduler runner: fetch the source message again and compress it"""
+    client = get_context().client
+    message = await client.get_messages(task_data['chat_id'], task_data['message_id'])
+    await start_compression(client, task_id, message, task_data)
 
 async def start_compression(client: Client, task_id: str, message, task_data: dict):
     """Start video compression"""
+    db = get_context().db
+    compressor = get_context().compressor
+    progress = get_context().progress
+    scheduler = get_context().scheduler
     try:
         # Update status to processing
-        await db.update_compression_task(task_id, {'status': 'processing', 'progress': 0})
+        await db.update_compression_task(task_id, {'status': 'processing'})
         
         # Download the file
-        await db.update_compression_task(task_id, {'progress': 10})
+        progress.update(task_id, 10, 'downloading')
         
         # Get file
         if message.video:
@@ -405,43 +563,44 @@ async def start_compression(client: Client, task_id: str, message, task_data: di
             file_obj = message.document
         
         # Create downloads directory
-        download_dir = Config.DOWNLOAD_DIR
+        download_dir = Config.DOWNLOAD_PATH
         os.makedirs(download_dir, exist_ok=True)
         
-        # Download file
         input_path = os.path.join(download_dir, f"input_{task_id}_{task_data['file_name']}")
-        await message.download(input_path)
+        output_path = os.path.join(download_dir, f"compressed_{task_id}_{task_data['file_name']}")
+        track_paths(input_path, output_path)
         
-        await db.update_compression_task(task_id, {'progress': 30})
+        async def on_encode(streaming):
+            progress.update(task_id, 30, 'compressing')
         
         # Compress video
-        output_path = os.path.join(download_dir, f"compressed_{task_id}_{task_data['file_name']}")
-        
-        success = await compressor.compress_video(
-            input_path=input_path,
-            output_path=output_path,
-            settings=task_data['settings'],
-            progress_callback=lambda p: asyncio.create_task(
-                db.update_compression_task(task_id, {'progress': 30 + int(p * 0.6)})
-            )
+        result = await fetch_and_compress(
+            client, task_id, task_data, message, input_path, output_path, task_data['settings'],
+            progress_callback=lambda p, stats: progress.update(task_id, 30 + int(p * 0.6)),
+            on_encode=on_encode
         )
         
-        if not success:
-            await db.update_compression_task(task_id, {'status': 'failed'})
-            await client.send_message(
+        if result.get('killed'):
+            await finish_task(task_id, {'kill_reason': result['killed'], 'fallback': result.get('fallback')})
+        
+        if not result['success']:
+            compressor.segment_encoder.discard(output_path)
+            await finish_task(task_id, {'status': 'failed'})
+            await get_context().api.send_message(
                 task_data['user_id'],
-                f"❌ **Compression Failed!**\n\nTask ID: `{task_id}`"
+                f"❌ **Compression Failed!**\n\nTask ID: `{task_id}`\n"
+                f"```\n{result['error'][-500:]}\n```"
             )
             return
         
-        await db.update_compression_task(task_id, {'progress': 90})
+        progress.update(task_id, 90, 'uploading')
         
         # Upload compressed video
         try:
             # Get file sizes
-            original_size = os.path.getsize(input_path)
-            compressed_size = os.path.getsize(output_path)
-            size_saved = original_size - compressed_size
+            original_size = result['original_size']
+            compressed_size = result['compressed_size']
+            size_saved = result['size_reduction']
             
             # Send compressed video
             caption = f"""
@@ -454,29 +613,41 @@ async def start_compression(client: Client, task_id: str, message, task_data: di
 **Settings Used:**
 **Preset:** `{task_data['settings'].get('preset', 'medium')}`
 **Resolution:** `{task_data['settings'].get('resolution', 'keep')}`
+**Path:** `{describe_encode_path(result['streams'], result.get('fallback'))}`
 """
             
-            await client.send_video(
-                chat_id=task_data['user_id'],
-                video=output_path,
-                caption=caption,
-                supports_streaming=True
-            )
-            
-            # Upload to dump channel if configured
+            # Uploaded once to the user, coalesced requesters and the dump channel get copies
+            destinations = [task_data['user_id']]
+            for follower in scheduler.followers_of(task_id):
+                follower_task = await db.get_task(follower) or {}
+                if follower_task.get('user_id') and follower_task['user_id'] not in destinations:
+                    destinations.append(follower_task['user_id'])
             if hasattr(Config, 'DUMP_ID') and Config.DUMP_ID:
-                try:
-                    await client.send_video(
-                        chat_id=Config.DUMP_ID,
-                        video=output_path,
-                        caption=f"Compressed by User {task_data['user_id']}\n{caption}"
-                    )
-                except:
-                    pass
+                destinations.append(Config.DUMP_ID)
+            
+            async with scheduler.stage('upload'):
+                sent = await get_context().delivery.deliver(
+                    client,
+                    output_path,
+                    destinations,
+                    caption=caption,
+                    captions={Config.DUMP_ID: f"Compressed by User {task_data['user_id']}\n{caption}"},
+                    info=await compressor.get_video_info(output_path)
+                )
             
             # Update database
-            await db.update_compression_task(task_id, {'status': 'completed', 'progress': 100})
+            output_file_id = sent[task_data['user_id']].video.file_id
+            await finish_task(task_id, {
+                'status': 'completed',
+                'progress': 100,
+                'output_file_id': output_file_id
+            })
+            # A fallback result is not what these settings ask for
+            if not result.get('fallback'):
+                await get_context().results.put(file_obj.file_unique_id, task_data['settings'],
+                                                result, output_file_id)
             await db.update_user_stats(task_data['user_id'], size_saved)
+            await db.flush()
             
             # Clean up files
             try:
@@ -487,16 +658,16 @@ async def start_compression(client: Client, task_id: str, message, task_data: di
                 
         except Exception as e:
             print(f"Upload error: {e}")
-            await db.update_compression_task(task_id, {'status': 'failed'})
-            await client.send_message(
+            await finish_task(task_id, {'status': 'failed'})
+            await get_context().api.send_message(
                 task_data['user_id'],
                 f"❌ **Upload Failed!**\n\nTask ID: `{task_id}`\nError: {str(e)}"
             )
             
     except Exception as e:
         print(f"Compression error: {e}")
-        await db.update_compression_task(task_id, {'status': 'failed'})
-        await client.send_message(
+        await finish_task(task_id, {'status': 'failed'})
+        await get_context().api.send_message(
             task_data['user_id'],
             f"❌ **Compression Failed!**\n\nTask ID: `{task_id}`\nError: {str(e)}"
         )
@@ -509,6 +680,8 @@ async def start_compression(client: Client, task_id: str, message, task_data: di
                 os.remove(output_path)
         except:
             pass
+    finally:
+        progress.remove(task_id)
 
 async def show_video_info(client: Client, callback_query: CallbackQuery, data: str):
     """Show video information"""
@@ -516,10 +689,12 @@ async def show_video_info(client: Client, callback_query: CallbackQuery, data: s
         message_id = int(data.replace("video_info_", ""))
         
         # Get the original message
-        original_message = await client.get_messages(
-            callback_query.message.chat.id, 
-            message_id
+        original_message = await get_context().messages.resolve(
+            client, callback_query.message.chat.id, message_id
         )
+        if not original_message:
+            await get_context().api.answer(callback_query, "❌ Original message not found")
+            return
         
         if original_message.video:
             file_obj = original_message.video
@@ -528,7 +703,7 @@ async def show_video_info(client: Client, callback_query: CallbackQuery, data: s
             file_obj = original_message.document
             file_type = "Document"
         else:
-            await callback_query.answer("❌ File not found")
+            await get_context().api.answer(callback_query, "❌ File not found")
             return
         
         info_text = f"""
@@ -553,11 +728,11 @@ async def show_video_info(client: Client, callback_query: CallbackQuery, data: s
             [InlineKeyboardButton("🔙 Back", callback_data="start")]
         ])
         
-        await callback_query.edit_message_text(info_text, reply_markup=keyboard)
+        await get_context().api.edit(callback_query, info_text, reply_markup=keyboard)
         
     except Exception as e:
         print(f"Video info error: {e}")
-        await callback_query.answer("❌ Error getting video info")
+        await get_context().api.answer(callback_query, "❌ Error getting video info")
 
 # Create the handler
 handle_callback = CallbackQueryHandler(handle_callback, auth_user)
@@ -4,10 +4,7 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.handlers import MessageHandler
 from bot.config import Config
-from bot.database import Database
-
-# Initialize components
-db = Database()
+from bot.context import get_context
 
 # User authentication filter
 def auth_filter(_, __, message):
@@ -17,6 +14,7 @@ auth_user = filters.create(auth_filter)
 
 async def start_command_handler(client: Client, message: Message):
     """Handle /start command"""
+    db = get_context().db
     user_data = {
         'first_name': message.from_user.first_name,
         'username': message.from_user.username,
@@ -32,7 +30,7 @@ async def start_command_handler(client: Client, message: Message):
          InlineKeyboardButton("📋 Queue", callback_data="queue")]
     ])
     
-    await message.reply_text(Config.START_MSG, reply_markup=keyboard)
+    await get_context().api.reply(message, Config.START_MSG, reply_markup=keyboard)
 
 async def help_command_handler(client: Client, message: Message):
     """Handle /help command"""
@@ -40,8 +38,17 @@ async def help_command_handler(client: Client, message: Message):
         [InlineKeyboardButton("🔙 Back", callback_data="start")]
     ])
     
-    await message.reply_text(Config.HELP_MSG, reply_markup=keyboard)
+    await get_context().api.reply(message, Config.HELP_MSG, reply_markup=keyboard)
+
+async def cancel_command_handler(client: Client, message: Message):
+    """Handle /cancel command"""
+    cancelled = await get_context().cancellation.cancel_all(message.from_user.id)
+    if cancelled:
+        await get_context().api.reply(message, f"🚫 **Cancelled {cancelled} task(s)**")
+    else:
+        await get_context().api.reply(message, "📋 Nothing to cancel.")
 
 # Create handlers
 start_command = MessageHandler(start_command_handler, filters.command("start") & auth_user)
 help_command = MessageHandler(help_command_handler, filters.command("help") & auth_user)
+cancel_command = MessageHandler(cancel_command_handler, filters.command("cancel") & auth_user)
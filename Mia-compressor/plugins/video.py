@@ -4,12 +4,9 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.handlers import MessageHandler
 from bot.config import Config
-from bot.database import Database
+from bot.context import get_context
 from utils.helpers import format_bytes, format_duration
 
-# Initialize components
-db = Database()
-
 # User authentication filter
 def auth_filter(_, __, message):
     return message.from_user.id == Config.USER_ID
@@ -18,17 +15,22 @@ auth_user = filters.create(auth_filter)
 
 async def handle_video_handler(client: Client, message: Message):
     """Handle video files"""
+    db = get_context().db
+    get_context().messages.remember(message)
     # Check file size
     if message.video.file_size > Config.MAX_FILE_SIZE:
-        await message.reply_text(
+        await get_context().api.reply(
+            message,
             f"❌ File too large! Maximum size: {format_bytes(Config.MAX_FILE_SIZE)}"
         )
         return
     
     # Check queue size
     user_queue = await db.get_user_queue(message.from_user.id)
-    if len(user_queue) >= Config.MAX_QUEUE_SIZE:
-        await message.reply_text(
+    active = [task for task in user_queue.values() if task['status'] in ('queued', 'processing')]
+    if len(active) >= Config.MAX_QUEUE_SIZE:
+        await get_context().api.reply(
+            message,
             f"❌ Queue full! Maximum {Config.MAX_QUEUE_SIZE} files allowed."
         )
         return
@@ -36,7 +38,7 @@ async def handle_video_handler(client: Client, message: Message):
     # Get user settings
     user = await db.get_user(message.from_user.id)
     if not user:
-        await message.reply_text("❌ User not found. Please /start first.")
+        await get_context().api.reply(message, "❌ User not found. Please /start first.")
         return
     
     # Show compression options
@@ -60,10 +62,11 @@ async def handle_video_handler(client: Client, message: Message):
 Choose compression option:
     """
     
-    await message.reply_text(file_info, reply_markup=keyboard)
+    await get_context().api.reply(message, file_info, reply_markup=keyboard)
 
 async def handle_document_handler(client: Client, message: Message):
     """Handle video documents"""
+    db = get_context().db
     if not message.document.file_name:
         return
     
@@ -73,18 +76,22 @@ async def handle_document_handler(client: Client, message: Message):
     
     if file_ext not in video_extensions:
         return
+    get_context().messages.remember(message)
     
     # Check file size
     if message.document.file_size > Config.MAX_FILE_SIZE:
-        await message.reply_text(
+        await get_context().api.reply(
+            message,
             f"❌ File too large! Maximum size: {format_bytes(Config.MAX_FILE_SIZE)}"
         )
         return
     
     # Check queue size
     user_queue = await db.get_user_queue(message.from_user.id)
-    if len(user_queue) >= Config.MAX_QUEUE_SIZE:
-        await message.reply_text(
+    active = [task for task in user_queue.values() if task['status'] in ('queued', 'processing')]
+    if len(active) >= Config.MAX_QUEUE_SIZE:
+        await get_context().api.reply(
+            message,
             f"❌ Queue full! Maximum {Config.MAX_QUEUE_SIZE} files allowed."
         )
         return
@@ -109,7 +116,7 @@ async def handle_document_handler(client: Client, message: Message):
 Choose compression option:
     """
     
-    await message.reply_text(file_info, reply_markup=keyboard)
+    await get_context().api.reply(message, file_info, reply_markup=keyboard)
 
 # Create handlers
 handle_video = MessageHandler(handle_video_handler, filters.video & auth_user)
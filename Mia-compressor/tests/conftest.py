@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Import the bot packages (bot, utils) the same way __main__.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
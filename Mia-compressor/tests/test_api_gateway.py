@@ -0,0 +1,93 @@
+# tests/test_api_gateway.py
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from pyrogram.errors import FloodWait
+from bot.config import Config
+from utils.api_gateway import DELIVERY, PROGRESS, ApiGateway
+
+class FakeClient:
+    """Records the calls that reach it; ``floods`` FloodWaits are raised first"""
+    
+    def __init__(self, floods: int = 0):
+        self.floods = floods
+        self.sent = []
+    
+    async def send_message(self, chat_id, text):
+        if self.floods:
+            self.floods -= 1
+            raise FloodWait(value=1)
+        self.sent.append((chat_id, text, time.monotonic()))
+
+def test_deliveries_go_before_progress_edits():
+    async def run():
+        client = FakeClient()
+        gateway = ApiGateway(client, global_rate=100, chat_rate=100)
+        gateway.global_bucket.tokens = 0
+        calls = [gateway.send_message(1, "progress", priority=PROGRESS),
+                 gateway.send_message(2, "progress", priority=PROGRESS),
+                 gateway.send_message(3, "delivery", priority=DELIVERY)]
+        await asyncio.gather(*calls)
+        await gateway.stop()
+        assert [text for _, text, _ in client.sent] == ["delivery", "progress", "progress"]
+    
+    asyncio.run(run())
+
+def test_flood_wait_sleeps_and_retries():
+    async def run():
+        client = FakeClient(floods=1)
+        gateway = ApiGateway(client, global_rate=100, chat_rate=100)
+        started = time.monotonic()
+        await gateway.send_message(1, "hello")
+        await gateway.stop()
+        assert [text for _, text, _ in client.sent] == ["hello"]
+        assert client.sent[0][2] - started >= 1
+        assert gateway.flood_waits == 1
+    
+    asyncio.run(run())
+
+def test_flood_wait_gives_up_on_progress_edits():
+    async def run():
+        gateway = ApiGateway(FakeClient(floods=1), global_rate=100, chat_rate=100)
+        with pytest.raises(FloodWait):
+            await gateway.send_message(1, "progress", priority=PROGRESS)
+        await gateway.stop()
+    
+    asyncio.run(run())
+
+def test_chat_budgets_are_separate(monkeypatch):
+    """A chat past its burst waits for its own budget without holding back other chats"""
+    monkeypatch.setattr(Config, 'API_CHAT_BURST', 2)
+    
+    async def run():
+        client = FakeClient()
+        gateway = ApiGateway(client, global_rate=100, chat_rate=10)
+        started = time.monotonic()
+        await asyncio.gather(*(gateway.send_message(1, f"one {index}") for index in range(4)),
+                             gateway.send_message(2, "two"))
+        await gateway.stop()
+        
+        done = {text: at - started for _, text, at in client.sent}
+        assert done["two"] < 0.05
+        assert done["one 3"] >= 0.15
+    
+    asyncio.run(run())
+
+def test_flooded_answer_does_not_block_chats(monkeypatch):
+    """A FloodWait on a callback answer only holds back other answers"""
+    monkeypatch.setattr(Config, 'API_FLOOD_RETRIES', 0)
+    
+    async def run():
+        client = FakeClient()
+        gateway = ApiGateway(client, global_rate=100, chat_rate=100)
+        
+        async def answer():
+            raise FloodWait(value=30)
+        
+        with pytest.raises(FloodWait):
+            await gateway.answer(SimpleNamespace(answer=answer))
+        await asyncio.wait_for(gateway.send_message(1, "delivery"), 1)
+        await gateway.stop()
+    
+    asyncio.run(run())
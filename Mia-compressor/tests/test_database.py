@@ -0,0 +1,76 @@
+# tests/test_database.py
+import asyncio
+import json
+from bot.config import Config
+from bot.database import Database
+
+def test_journal_is_compacted_past_threshold(tmp_path, monkeypatch):
+    """Flushing past JOURNAL_COMPACT_THRESHOLD folds the journal into the snapshot"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    monkeypatch.setattr(Config, 'JOURNAL_COMPACT_THRESHOLD', 10)
+    
+    async def run():
+        db = Database()
+        await db.connect()
+        try:
+            for index in range(100):
+                await db.add_compression_task(f"task_{index}", {'user_id': 1, 'status': 'queued'})
+                await db.flush()
+            if db._compact_task:
+                await db._compact_task
+            
+            assert db._journal_records < Config.JOURNAL_COMPACT_THRESHOLD
+            with open(Config.DATABASE_PATH) as f:
+                snapshot = json.load(f)
+            assert len(snapshot['queue']) >= 100 - Config.JOURNAL_COMPACT_THRESHOLD
+        finally:
+            await db.disconnect()
+        
+        # Snapshot plus journal still hold every record
+        db = Database()
+        await db.connect()
+        assert len(db.queue_data) == 100
+        await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_queue_ids_are_not_reused(tmp_path, monkeypatch):
+    """A removed task's id is never handed out again, also across restarts"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    
+    async def run():
+        db = Database()
+        await db.connect()
+        first = await db.add_to_queue(1, {'file_name': 'a.mp4'})
+        second = await db.add_to_queue(1, {'file_name': 'b.mp4'})
+        await db.remove_from_queue(second)
+        third = await db.add_to_queue(1, {'file_name': 'c.mp4'})
+        assert len({first, second, third}) == 3
+        assert (await db.get_task(first))['file_name'] == 'a.mp4'
+        await db.disconnect()
+        
+        db = Database()
+        await db.connect()
+        await db.remove_from_queue(third)
+        assert await db.add_to_queue(1, {'file_name': 'd.mp4'}) not in (first, second, third)
+        await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_flush_without_journal_keeps_changes(tmp_path, monkeypatch):
+    """Changes flushed before the journal is open are journaled by a later flush"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    
+    async def run():
+        db = Database()
+        await db.add_compression_task("early", {'user_id': 1, 'status': 'queued'})
+        await db.flush()
+        await db.connect()
+        await db.flush()
+        try:
+            with open(db.journal_path) as f:
+                assert '"early"' in f.read()
+        finally:
+            await db.disconnect()
+    
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+# tests/test_delivery.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bot.config import Config
+from bot.database import Database
+from utils import delivery as delivery_module
+from utils.delivery import DeliveryService
+
+class PathProbe:
+    async def fingerprint(self, path):
+        return f"fp:{path}"
+
+def uploaded(chat_id, path, **kwargs):
+    video = SimpleNamespace(file_id=f"id:{path}", file_unique_id=f"unique:{path}")
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), id=1, video=video)
+
+def test_upload_records_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    
+    async def send_video_file(client, chat_id, path, **kwargs):
+        return uploaded(chat_id, path)
+    
+    monkeypatch.setattr(delivery_module, 'send_video_file', send_video_file)
+    
+    async def run():
+        db = Database()
+        await db.connect()
+        service = DeliveryService(db, PathProbe(), api=None, max_entries=3)
+        for index in range(5):
+            await service.deliver(None, f"out_{index}.mp4", [1])
+        assert list(service._cache) == [f"fp:out_{index}.mp4" for index in (2, 3, 4)]
+        assert len(await db.get_cache_entries(DeliveryService.NAMESPACE)) == 3
+        
+        reloaded = DeliveryService(db, PathProbe(), api=None, max_entries=2)
+        await reloaded.load()
+        assert list(reloaded._cache) == ["fp:out_3.mp4", "fp:out_4.mp4"]
+        assert len(await db.get_cache_entries(DeliveryService.NAMESPACE)) == 2
+        await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_upload_without_message_fails_clearly(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    
+    async def send_video_file(client, chat_id, path, **kwargs):
+        return None
+    
+    monkeypatch.setattr(delivery_module, 'send_video_file', send_video_file)
+    
+    async def run():
+        db = Database()
+        await db.connect()
+        with pytest.raises(RuntimeError, match="no message"):
+            await DeliveryService(db, PathProbe(), api=None).deliver(None, "out.mp4", [1])
+        await db.disconnect()
+    
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+# tests/test_downloader.py
+import asyncio
+import os
+import pytest
+from bot.config import Config
+from utils.downloader import CHUNK_SIZE, LocalFileSource, ParallelDownloader
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(os.urandom(10 * CHUNK_SIZE + 1234))
+    return path
+
+def test_parallel_download_matches_source(source_file, tmp_path):
+    """Many small parts on many connections (and their state saves) don't race"""
+    for attempt in range(10):
+        target = tmp_path / f"target_{attempt}.bin"
+        downloader = ParallelDownloader(LocalFileSource(str(source_file)), str(target),
+                                        part_chunks=1, connections=8)
+        asyncio.run(downloader.download())
+        assert target.read_bytes() == source_file.read_bytes()
+        assert not os.path.exists(f"{target}.parts")
+
+def test_failed_part_is_retried(source_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DOWNLOAD_PART_RETRIES', 1)
+    target = tmp_path / "target.bin"
+    downloader = ParallelDownloader(LocalFileSource(str(source_file), fail_at=4), str(target),
+                                    part_chunks=2, connections=3)
+    asyncio.run(downloader.download())
+    assert target.read_bytes() == source_file.read_bytes()
+    assert downloader.received == os.path.getsize(source_file)
+
+def test_download_resumes_from_bitmap(source_file, tmp_path, monkeypatch):
+    """A rerun only fetches the parts the .parts bitmap doesn't list as done"""
+    monkeypatch.setattr(Config, 'DOWNLOAD_PART_RETRIES', 0)
+    target = tmp_path / "target.bin"
+    first = ParallelDownloader(LocalFileSource(str(source_file), fail_at=6), str(target),
+                               part_chunks=2, connections=1)
+    with pytest.raises(ConnectionError):
+        asyncio.run(first.download())
+    assert os.path.exists(f"{target}.parts")
+    
+    source = LocalFileSource(str(source_file))
+    requested = []
+    stream = source.stream
+    
+    def recording_stream(offset, limit):
+        requested.append(offset)
+        return stream(offset, limit)
+    
+    source.stream = recording_stream
+    asyncio.run(ParallelDownloader(source, str(target), part_chunks=2, connections=1).download())
+    assert requested == [6, 8, 10]
+    assert target.read_bytes() == source_file.read_bytes()
+
+def test_cancel_waits_for_writes_in_flight(source_file, tmp_path):
+    """The file is only closed once no pwrite of a cancelled worker is left running"""
+    async def run():
+        downloader = ParallelDownloader(LocalFileSource(str(source_file), delay=0.01),
+                                        str(tmp_path / "target.bin"), part_chunks=1, connections=4)
+        task = asyncio.create_task(downloader.download())
+        await asyncio.sleep(0.03)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not downloader._writes
+    
+    asyncio.run(run())
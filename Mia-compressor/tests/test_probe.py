@@ -0,0 +1,27 @@
+# tests/test_probe.py
+import asyncio
+from utils.probe import ProbeService
+
+def test_waiter_survives_cancelled_probe(monkeypatch):
+    """Cancelling the job that runs a shared probe doesn't leave the others waiting"""
+    async def run():
+        probe = ProbeService()
+        runs = []
+        
+        async def run_probe(path):
+            runs.append(path)
+            await asyncio.sleep(0.05)
+            return {'duration': 1.0}
+        
+        monkeypatch.setattr(probe, '_run_probe', run_probe)
+        leader = asyncio.create_task(probe.probe('video.mp4', 'abc'))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(probe.probe('video.mp4', 'abc'))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        
+        assert await asyncio.wait_for(waiter, 1) == {'duration': 1.0}
+        assert len(runs) == 2
+        assert not probe._pending
+    
+    asyncio.run(run())
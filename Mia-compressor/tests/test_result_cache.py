@@ -0,0 +1,37 @@
+# tests/test_result_cache.py
+import asyncio
+import pytest
+from pyrogram.errors import FileReferenceExpired, FloodWait
+from utils.result_cache import ResultCache
+
+RESULT = {'original_size': 10, 'compressed_size': 5, 'size_reduction': 5,
+          'compression_ratio': 50.0, 'compression_time': 1.0}
+
+class RejectingApi:
+    def __init__(self, error):
+        self.error = error
+    
+    async def send_video(self, chat_id, file_id, caption=""):
+        raise self.error
+
+def test_send_keeps_entry_on_flood_wait():
+    """A FloodWait is raised and leaves the cached result in place"""
+    async def run():
+        cache = ResultCache()
+        await cache.put('file', {}, RESULT, 'F1')
+        entry = await cache.get('file', {})
+        with pytest.raises(FloodWait):
+            await cache.send(RejectingApi(FloodWait(value=30)), 1, entry)
+        assert await cache.get('file', {}) is not None
+    
+    asyncio.run(run())
+
+def test_send_drops_entry_with_stale_file():
+    async def run():
+        cache = ResultCache()
+        await cache.put('file', {}, RESULT, 'F1')
+        entry = await cache.get('file', {})
+        assert await cache.send(RejectingApi(FileReferenceExpired()), 1, entry) is None
+        assert await cache.get('file', {}) is None
+    
+    asyncio.run(run())
@@ -0,0 +1,120 @@
+# tests/test_scheduler.py
+import asyncio
+from bot.config import Config
+from bot.database import Database
+from utils.cancellation import CancellationRegistry, JobHandle, current_job
+from utils.scheduler import StagePool, TaskScheduler
+
+def test_stage_slots_go_out_in_run_order():
+    """A freed slot goes to the highest-priority waiter, not the first one to ask"""
+    async def run():
+        pool = StagePool('encode', 1)
+        order = []
+        
+        async def job(task_id, priority, queued_at):
+            handle = JobHandle(task_id)
+            handle.order = (-priority, queued_at, task_id)
+            current_job.set(handle)
+            async with pool.slot():
+                order.append(task_id)
+                await asyncio.sleep(0.01)
+        
+        first = asyncio.create_task(job('first', 0, 1.0))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(job('late', 0, 3.0)),
+                   asyncio.create_task(job('early', 0, 2.0)),
+                   asyncio.create_task(job('small', 1, 4.0))]
+        await asyncio.sleep(0)
+        assert pool.waiting == 3
+        assert [pool.position(task_id) for task_id in ('small', 'early', 'late')] == [1, 2, 3]
+        
+        await asyncio.gather(first, *waiters)
+        assert order == ['first', 'small', 'early', 'late']
+        assert pool.waiting == 0 and pool.active == 0
+    
+    asyncio.run(run())
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        pool = StagePool('upload', 1)
+        
+        async def hold(seconds):
+            async with pool.slot():
+                await asyncio.sleep(seconds)
+        
+        holder = asyncio.create_task(hold(0.01))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        
+        await asyncio.wait_for(hold(0), 1)
+        assert pool._free == 1
+    
+    asyncio.run(run())
+
+async def open_scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / "database.json"))
+    db = Database()
+    await db.connect()
+    return db, TaskScheduler(db)
+
+async def add_tasks(db, *tasks):
+    for task_id, user_id in tasks:
+        await db.add_compression_task(task_id, {'user_id': user_id, 'status': 'queued'})
+
+def test_identical_jobs_are_attached_and_withdrawn(tmp_path, monkeypatch):
+    async def run():
+        db, scheduler = await open_scheduler(tmp_path, monkeypatch)
+        await add_tasks(db, ('a', 1), ('b', 2))
+        assert await scheduler.submit('a', 'compress', key='file') == 1
+        assert await scheduler.submit('b', 'compress', key='file') == 1
+        assert scheduler.leader_of('b') == 'a'
+        assert scheduler.followers_of('a') == ['b']
+        assert (await db.get_task('b'))['status'] == 'attached'
+        
+        assert await scheduler.withdraw('b')
+        assert scheduler.leader_of('b') is None and scheduler.followers_of('a') == []
+        assert scheduler.position('a') == 1
+        await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_cancelling_a_leader(tmp_path, monkeypatch):
+    """Other users' requests run on their own, the same user's double tap is cancelled too"""
+    async def run():
+        db, scheduler = await open_scheduler(tmp_path, monkeypatch)
+        await add_tasks(db, ('a', 1), ('b', 1), ('c', 2))
+        for task_id in 'abc':
+            await scheduler.submit(task_id, 'compress', key='file')
+        
+        assert await CancellationRegistry(scheduler, db).cancel('a')
+        assert (await db.get_task('a'))['status'] == 'cancelled'
+        assert (await db.get_task('b'))['status'] == 'cancelled'
+        assert (await db.get_task('c'))['status'] == 'queued'
+        assert scheduler.position('b') == 0 and scheduler.position('c') == 1
+        await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_orphaned_followers_coalesce_again_after_restart(tmp_path, monkeypatch):
+    async def run():
+        db, scheduler = await open_scheduler(tmp_path, monkeypatch)
+        await add_tasks(db, ('a', 1), ('b', 2), ('c', 3))
+        for task_id in 'abc':
+            await scheduler.submit(task_id, 'compress', key='file')
+        # The leader is gone when the bot comes back
+        await db.remove_from_queue('a')
+        
+        restarted = TaskScheduler(db)
+        restarted.register('compress', lambda task_id, task: asyncio.Event().wait())
+        await restarted.start()
+        try:
+            assert restarted.leader_of('c') == 'b'
+            assert restarted.leader_of('b') is None
+        finally:
+            await restarted.shutdown()
+            await db.disconnect()
+    
+    asyncio.run(run())
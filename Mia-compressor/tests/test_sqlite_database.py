@@ -0,0 +1,52 @@
+# tests/test_sqlite_database.py
+import asyncio
+import json
+import sqlite3
+from bot.config import Config
+from bot.sqlite_database import SQLiteDatabase
+
+def test_queue_position_follows_run_order(tmp_path, monkeypatch):
+    """Higher priority first, then the oldest submission"""
+    monkeypatch.setattr(Config, 'SQLITE_PATH', str(tmp_path / "database.sqlite"))
+    
+    async def run():
+        db = SQLiteDatabase()
+        await db.connect()
+        try:
+            for task_id, priority, queued_at in [('a', 0, 1.0), ('b', 0, 2.0), ('c', 1, 3.0), ('d', 0, 0.5)]:
+                await db.add_compression_task(task_id, {'user_id': 1, 'status': 'queued'})
+                await db.update_compression_task(task_id, {'priority': priority, 'queued_at': queued_at})
+            await db.update_queue_status('d', 'processing')
+            
+            positions = [await db.get_queue_position(task_id) for task_id in 'abcd']
+            assert positions == [2, 3, 1, 0]
+        finally:
+            await db.disconnect()
+    
+    asyncio.run(run())
+
+def test_old_queue_table_gets_run_order_columns(tmp_path, monkeypatch):
+    path = tmp_path / "database.sqlite"
+    monkeypatch.setattr(Config, 'SQLITE_PATH', str(path))
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE queue (seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL UNIQUE, "
+        "user_id INTEGER NOT NULL, status TEXT NOT NULL, data TEXT NOT NULL)"
+    )
+    for task_id, priority in [('a', 0), ('b', 1)]:
+        task = {'user_id': 1, 'status': 'queued', 'priority': priority, 'queued_at': 1.0}
+        conn.execute("INSERT INTO queue (task_id, user_id, status, data) VALUES (?, 1, 'queued', ?)",
+                     (task_id, json.dumps(task)))
+    conn.commit()
+    conn.close()
+    
+    async def run():
+        db = SQLiteDatabase()
+        await db.connect()
+        try:
+            assert await db.get_queue_position('b') == 1
+            assert await db.get_queue_position('a') == 2
+        finally:
+            await db.disconnect()
+    
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+# tests/test_stream_ingest.py
+import asyncio
+import os
+import pytest
+from bot.config import Config
+from utils.stream_ingest import StreamIngest
+
+class FlakyClient:
+    """Serves numbered chunks; offsets in ``failures`` break off once before that chunk"""
+    
+    def __init__(self, count: int, failures=()):
+        self.count = count
+        self.failures = set(failures)
+        self.offsets = []
+    
+    async def stream_media(self, message, offset: int = 0, limit: int = 0):
+        self.offsets.append(offset)
+        end = offset + limit if limit else self.count
+        for index in range(offset, end):
+            if index in self.failures:
+                self.failures.discard(index)
+                raise ConnectionError(f"lost at chunk {index}")
+            yield bytes([index]) * 4
+
+async def collect(ingest):
+    return b''.join([chunk async for chunk in ingest.chunks()])
+
+def test_broken_stream_resumes_where_it_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DOWNLOAD_PART_RETRIES', 2)
+    client = FlakyClient(6, failures=[3])
+    ingest = StreamIngest(client, message=None)
+    asyncio.run(ingest.probe_header(str(tmp_path / "input.mp4")))
+    
+    data = asyncio.run(collect(ingest))
+    assert data == b''.join(bytes([index]) * 4 for index in range(6))
+    assert client.offsets == [0, 1, 3]
+    assert ingest.error is None
+
+def test_stream_gives_up_after_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DOWNLOAD_PART_RETRIES', 0)
+    ingest = StreamIngest(FlakyClient(6, failures=[2]), message=None)
+    asyncio.run(ingest.probe_header(str(tmp_path / "input.mp4")))
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(ingest))
+    assert isinstance(ingest.error, ConnectionError)
+
+def test_failed_header_falls_back(tmp_path):
+    """A header that can't be fetched means no streaming and no partial file left behind"""
+    path = tmp_path / "input.mp4"
+    ingest = StreamIngest(FlakyClient(6, failures=[0]), message=None)
+    assert asyncio.run(ingest.probe_header(str(path))) is False
+    assert ingest.error is not None
+    assert not os.path.exists(path)
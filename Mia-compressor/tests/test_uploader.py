@@ -0,0 +1,66 @@
+# tests/test_uploader.py
+import asyncio
+import hashlib
+import os
+import pytest
+from bot.config import Config
+from utils.uploader import BIG_FILE_SIZE, PART_SIZE, LocalTransport, ParallelUploader
+
+class CountingTransport(LocalTransport):
+    """Records how many parts were in flight at once"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def save_part(self, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await super().save_part(*args)
+        finally:
+            self.in_flight -= 1
+
+def write_file(tmp_path, size):
+    path = tmp_path / "output.mp4"
+    path.write_bytes(os.urandom(size))
+    return path
+
+def test_upload_keeps_window_parts_in_flight(tmp_path):
+    path = write_file(tmp_path, 12 * PART_SIZE + 100)
+    transport = CountingTransport(delay=0.01)
+    uploader = ParallelUploader(transport, str(path), window=4)
+    input_file = asyncio.run(uploader.upload())
+    
+    assert transport.max_in_flight == 4
+    assert input_file['parts'] == 13
+    assert input_file['md5'] == hashlib.md5(path.read_bytes()).hexdigest()
+    assert transport.assemble(uploader.file_id) == path.read_bytes()
+
+def test_failed_part_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'UPLOAD_PART_RETRIES', 1)
+    path = write_file(tmp_path, 5 * PART_SIZE)
+    transport = LocalTransport(fail_at=2)
+    uploader = ParallelUploader(transport, str(path), window=3)
+    asyncio.run(uploader.upload())
+    
+    assert transport.fail_at is None
+    assert uploader.sent == path.stat().st_size
+    assert transport.assemble(uploader.file_id) == path.read_bytes()
+
+def test_upload_fails_after_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'UPLOAD_PART_RETRIES', 0)
+    path = write_file(tmp_path, 3 * PART_SIZE)
+    uploader = ParallelUploader(LocalTransport(fail_at=1), str(path), window=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(uploader.upload())
+
+def test_big_file_is_reassembled_without_md5(tmp_path):
+    path = write_file(tmp_path, BIG_FILE_SIZE + PART_SIZE // 2)
+    transport = LocalTransport()
+    uploader = ParallelUploader(transport, str(path), window=8)
+    input_file = asyncio.run(uploader.upload())
+    
+    assert uploader.big and input_file['md5'] is None
+    assert transport.assemble(uploader.file_id) == path.read_bytes()
@@ -4,35 +4,33 @@ Video Compressor Bot - Utilities Module
 """
 
 from .compressor import VideoCompressor
+from .segment_encoder import SegmentEncoder
 from .helpers import (
     format_bytes, 
     format_duration, 
-    get_progress_bar,
+    create_progress_bar,
     estimate_compression_time,
-    get_file_type,
-    clean_filename,
-    calculate_bitrate,
-    get_optimal_settings,
-    validate_settings,
-    get_compression_stats,
+    sanitize_filename,
+    is_video_file,
     check_ffmpeg,
-    get_system_info
+    describe_encode_path
 )
 from .compression_handler import CompressionHandler
+from .scheduler import TaskScheduler
+from .progress import ProgressRegistry
 
 __all__ = [
     "VideoCompressor",
+    "SegmentEncoder",
     "CompressionHandler", 
+    "TaskScheduler",
+    "ProgressRegistry",
     "format_bytes",
     "format_duration",
-    "get_progress_bar",
+    "create_progress_bar",
     "estimate_compression_time",
-    "get_file_type",
-    "clean_filename",
-    "calculate_bitrate",
-    "get_optimal_settings",
-    "validate_settings",
-    "get_compression_stats",
+    "sanitize_filename",
+    "is_video_file",
     "check_ffmpeg",
-    "get_system_info"
+    "describe_encode_path"
 ]
@@ -0,0 +1,198 @@
+# utils/api_gateway.py
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pyrogram.errors import FloodWait
+from bot.config import Config
+
+# Priority classes, lower values are served first
+DELIVERY = 0
+INTERACTIVE = 1
+PROGRESS = 2
+
+class TokenBucket:
+    """Allows ``rate`` calls per second with bursts of up to ``capacity``"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def delay(self, now: float) -> float:
+        """Seconds until a call may go out (0 when it may go now)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+    
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+    
+    def block(self, seconds: float):
+        """Hold every call back for ``seconds`` (after a FloodWait)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class ApiGateway:
+    """Single exit for outbound Bot API calls.
+    
+    Every call waits for a token of the global bucket and of its chat's
+    bucket; waiting calls are released by one dispatcher in priority order
+    (deliveries, then interactive replies, then progress edits). Calls not
+    bound to a chat (callback answers) share a bucket of their own. A
+    FloodWait blocks the affected chat's (or that shared) bucket for the
+    requested time and the call is retried, except progress edits, which
+    are superseded by newer ones anyway. ``client`` may be any object with the used methods, so the
+    gateway can be exercised against a fake client.
+    """
+    
+    def __init__(self, client=None, global_rate: float = None, chat_rate: float = None):
+        self.client = client
+        self.global_bucket = TokenBucket(global_rate or Config.API_GLOBAL_RATE,
+                                         global_rate or Config.API_GLOBAL_RATE)
+        self.chat_rate = chat_rate or Config.API_CHAT_RATE
+        # A flooded callback answer must not hold back deliveries to every chat
+        self.unbound_bucket = TokenBucket(global_rate or Config.API_GLOBAL_RATE,
+                                          global_rate or Config.API_GLOBAL_RATE)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._heap: List = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        
+        # Counters
+        self.calls = 0
+        self.flood_waits = 0
+        self.throttled_seconds = 0.0
+        self.queued_seconds = 0.0
+    
+    async def stop(self):
+        """Stop the dispatcher"""
+        if self._dispatcher_task:
+            self._dispatcher_task.cancel()
+            await asyncio.gather(self._dispatcher_task, return_exceptions=True)
+            self._dispatcher_task = None
+    
+    async def call(self, chat_id: Optional[int], func: Callable[..., Awaitable], *args,
+                   priority: int = INTERACTIVE, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` within the budgets of ``chat_id``"""
+        for attempt in range(Config.API_FLOOD_RETRIES + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                self.calls += 1
+                return await func(*args, **kwargs)
+            except FloodWait as e:
+                self.flood_waits += 1
+                self.throttled_seconds += e.value
+                self._bucket(chat_id).block(e.value)
+                if priority == PROGRESS or attempt == Config.API_FLOOD_RETRIES:
+                    raise
+                print(f"⏳ FloodWait of {e.value}s for chat {chat_id}, retrying")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Calls made and time lost to throttling"""
+        return {
+            'calls': self.calls,
+            'queued': sum(1 for entry in self._heap if not entry[3].done()),
+            'flood_waits': self.flood_waits,
+            'throttled_seconds': self.throttled_seconds,
+            'queued_seconds': self.queued_seconds
+        }
+    
+    # Shorthands for the calls the bot makes
+    async def answer(self, callback_query, *args, **kwargs):
+        """Answer a callback query (not bound to a chat's budget)"""
+        return await self.call(None, callback_query.answer, *args, **kwargs)
+    
+    async def edit(self, callback_query, *args, **kwargs):
+        """Edit the message a callback button belongs to"""
+        return await self.call(callback_query.message.chat.id, callback_query.edit_message_text,
+                               *args, **kwargs)
+    
+    async def reply(self, message, *args, **kwargs):
+        """Reply to a message with text"""
+        return await self.call(message.chat.id, message.reply_text, *args, **kwargs)
+    
+    async def send_message(self, chat_id: int, *args, priority: int = DELIVERY, **kwargs):
+        return await self.call(chat_id, self.client.send_message, chat_id, *args,
+                               priority=priority, **kwargs)
+    
+    async def edit_message_text(self, chat_id: int, message_id: int, *args,
+                                priority: int = INTERACTIVE, **kwargs):
+        return await self.call(chat_id, self.client.edit_message_text, chat_id, message_id, *args,
+                               priority=priority, **kwargs)
+    
+    async def send_video(self, chat_id: int, *args, priority: int = DELIVERY, **kwargs):
+        return await self.call(chat_id, self.client.send_video, chat_id, *args,
+                               priority=priority, **kwargs)
+    
+    async def copy_message(self, chat_id: int, *args, priority: int = DELIVERY, **kwargs):
+        return await self.call(chat_id, self.client.copy_message, chat_id, *args,
+                               priority=priority, **kwargs)
+    
+    def _bucket(self, chat_id: Optional[int]) -> TokenBucket:
+        """Budget of one chat, or the shared one of calls without a chat"""
+        if chat_id is None:
+            return self.unbound_bucket
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, Config.API_CHAT_BURST)
+        return bucket
+    
+    async def _acquire(self, chat_id: Optional[int], priority: int):
+        """Wait until the dispatcher lets this call go out"""
+        if self._dispatcher_task is None:
+            self._dispatcher_task = asyncio.create_task(self._dispatcher(), name="api-dispatcher")
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._sequence), chat_id, future))
+        self._wakeup.set()
+        
+        queued_at = time.monotonic()
+        try:
+            await future
+        finally:
+            self.queued_seconds += time.monotonic() - queued_at
+    
+    async def _dispatcher(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._heap:
+                wait = self._release_next()
+                if wait is None:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+    
+    def _release_next(self) -> Optional[float]:
+        """Release the most urgent call that fits its budgets, or return how long to wait"""
+        now = time.monotonic()
+        # Callers that gave up (cancelled) are dropped
+        self._heap = [entry for entry in self._heap if not entry[3].done()]
+        heapq.heapify(self._heap)
+        
+        wait = None
+        global_delay = self.global_bucket.delay(now)
+        for entry in sorted(self._heap):
+            priority, _, chat_id, future = entry
+            delay = max(global_delay, self._bucket(chat_id).delay(now))
+            if delay <= 0:
+                self.global_bucket.take(now)
+                self._bucket(chat_id).take(now)
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                future.set_result(None)
+                return None
+            wait = delay if wait is None else min(wait, delay)
+        return wait
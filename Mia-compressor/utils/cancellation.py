@@ -0,0 +1,122 @@
+# utils/cancellation.py
+import asyncio
+import os
+import shutil
+from contextvars import ContextVar
+from typing import Optional, Set
+from bot.config import Config
+
+class JobHandle:
+    """What a running job owns: its ffmpeg processes and partial files"""
+    
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.processes: Set[asyncio.subprocess.Process] = set()
+        self.paths: Set[str] = set()
+        self.cancelled = False
+        # (-priority, queued_at, task_id), set by the scheduler to order stage slots
+        self.order = (0, 0.0, task_id)
+
+# Handle of the job the current coroutine belongs to, set by the scheduler
+current_job: ContextVar[Optional[JobHandle]] = ContextVar('current_job', default=None)
+
+def track_process(process: asyncio.subprocess.Process):
+    """Register a subprocess with the running job so cancelling stops it"""
+    handle = current_job.get()
+    if handle is not None:
+        handle.processes.add(process)
+
+def untrack_process(process: asyncio.subprocess.Process):
+    handle = current_job.get()
+    if handle is not None:
+        handle.processes.discard(process)
+
+def track_paths(*paths: str):
+    """Register files (or directories) to delete if the running job is cancelled"""
+    handle = current_job.get()
+    if handle is not None:
+        handle.paths.update(path for path in paths if path)
+
+async def stop_process(process: asyncio.subprocess.Process, grace: float = None):
+    """SIGTERM a process, then SIGKILL it if it has not exited after ``grace`` seconds"""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), grace if grace is not None else Config.CANCEL_GRACE)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+    except ProcessLookupError:
+        pass
+
+class CancellationRegistry:
+    """Cancels queued and running jobs on request.
+    
+    A running job is stopped by cancelling its task, which terminates its
+    ffmpeg processes, aborts the transfers it is awaiting and releases its
+    pipeline slot; its partial files are deleted afterwards.
+    Waiting and attached jobs are simply dropped from the queue. Requests
+    of the same user attached to a cancelled job (a double tap) are
+    cancelled with it instead of being queued on their own.
+    """
+    
+    def __init__(self, scheduler, db):
+        self.scheduler = scheduler
+        self.db = db
+        self.cancelled = 0
+    
+    async def cancel(self, task_id: str) -> bool:
+        """Cancel one job, returning False if it is not queued or running"""
+        await self._cancel_own_followers(task_id)
+        handle = self.scheduler.handles.get(task_id)
+        job = self.scheduler.running.get(task_id)
+        if job is None or handle is None:
+            if not await self.scheduler.withdraw(task_id):
+                return False
+            await self.db.update_compression_task(task_id, {'status': 'cancelled'})
+            self.cancelled += 1
+            return True
+        
+        # Cancel first so the runner does not report the killed ffmpeg as a failure;
+        # run_ffmpeg stops its process on the way out
+        handle.cancelled = True
+        job.cancel()
+        await asyncio.wait({job})
+        await asyncio.gather(*(stop_process(process) for process in list(handle.processes)))
+        
+        for path in handle.paths | {f"{path}.parts" for path in handle.paths}:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        
+        await self.db.update_compression_task(task_id, {'status': 'cancelled'})
+        self.cancelled += 1
+        print(f"🚫 Job {task_id} cancelled")
+        return True
+    
+    async def _cancel_own_followers(self, task_id: str):
+        task = await self.db.get_task(task_id) or {}
+        for follower in self.scheduler.followers_of(task_id):
+            follower_task = await self.db.get_task(follower) or {}
+            if follower_task.get('user_id') != task.get('user_id'):
+                continue
+            if await self.scheduler.withdraw(follower):
+                await self.db.update_compression_task(follower, {'status': 'cancelled'})
+                self.cancelled += 1
+    
+    async def cancel_all(self, user_id: int) -> int:
+        """Cancel every queued, attached or running job of a user"""
+        tasks = await self.db.get_user_queue(user_id)
+        # Followers first, so cancelling a leader doesn't queue them again
+        order = {'attached': 0, 'queued': 1, 'processing': 2}
+        active = sorted(
+            (task_id for task_id, task in tasks.items() if task.get('status') in order),
+            key=lambda task_id: order[tasks[task_id]['status']]
+        )
+        cancelled = 0
+        for task_id in active:
+            if await self.cancel(task_id):
+                cancelled += 1
+        return cancelled
@@ -7,15 +7,22 @@ from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import MessageNotModified
 from bot.config import Config
-from bot.database import Database
-from utils.compressor import VideoCompressor
-from utils.helpers import format_bytes, format_duration, get_progress_bar
+from bot.context import get_context
+from utils.pipeline import fetch_and_compress
+from utils.helpers import format_bytes, format_duration, create_progress_bar, describe_encode_path
+from utils.result_cache import settings_hash
+from utils.cancellation import track_paths
 
 class CompressionHandler:
-    def __init__(self):
-        self.db = Database()
-        self.compressor = VideoCompressor()
+    def __init__(self, context):
+        self.context = context
+        self.db = context.db
+        self.compressor = context.compressor
+        self.scheduler = context.scheduler
+        self.progress = context.progress
+        self.api = context.api
         self.active_compressions = {}
+        self.scheduler.register('compress_status', self.process_task)
     
     async def handle_compression_request(self, callback_query: CallbackQuery, data: str):
         """Handle compression requests"""
@@ -24,20 +31,18 @@ class CompressionHandler:
             message_id = int(message_id)
             
             # Get the original message
-            original_message = None
-            async for message in callback_query.message.chat.iter_history():
-                if message.id == message_id:
-                    original_message = message
-                    break
+            original_message = await self.context.messages.resolve(
+                self.context.client, callback_query.message.chat.id, message_id
+            )
             
             if not original_message:
-                await callback_query.answer("❌ Original message not found")
+                await self.api.answer(callback_query, "❌ Original message not found")
                 return
             
             # Get video file
             video_file = original_message.video or original_message.document
             if not video_file:
-                await callback_query.answer("❌ No video file found")
+                await self.api.answer(callback_query, "❌ No video file found")
                 return
             
             if action == "compress_quick":
@@ -46,7 +51,7 @@ class CompressionHandler:
                 await self._show_custom_options(callback_query, original_message, video_file)
             
         except Exception as e:
-            await callback_query.answer(f"❌ Error: {str(e)}")
+            await self.api.answer(callback_query, f"❌ Error: {str(e)}")
     
     async def _start_quick_compression(self, callback_query: CallbackQuery, 
                                      original_message: Message, video_file):
@@ -101,12 +106,27 @@ class CompressionHandler:
 Configure your compression settings:
 """
         
-        await callback_query.edit_message_text(text, reply_markup=keyboard_markup)
+        await self.api.edit(callback_query, text, reply_markup=keyboard_markup)
     
     async def _start_compression(self, callback_query: CallbackQuery, 
                                original_message: Message, video_file, settings):
         """Start the compression process"""
         try:
+            # Same file with the same settings was compressed before
+            cached = await self.context.results.get(video_file.file_unique_id, settings)
+            if cached and await self.context.results.send(
+                self.api, callback_query.message.chat.id, cached,
+                caption=f"✅ **Compression Complete!**\n\n"
+                        f"**Compressed Size:** `{format_bytes(cached['compressed_size'])}`\n"
+                        f"**Size Reduction:** `{format_bytes(cached['size_reduction'])} "
+                        f"({cached['compression_ratio']:.1f}%)`"
+            ):
+                await self.api.edit(
+                    callback_query,
+                    "⚡ **Already Compressed!**\n\nSent the earlier result for these settings."
+                )
+                return
+            
             # Create task in database
             task_data = {
                 'created_at': datetime.now().isoformat(),
@@ -125,7 +145,7 @@ Configure your compression settings:
 **Size:** `{format_bytes(task_data['file_size'])}`
 **Status:** Downloading...
 
-{get_progress_bar(0)}
+{create_progress_bar(0)}
 """
             
             keyboard = [[{"text": "❌ Cancel", "callback_data": f"cancel_{task_id}"}]]
@@ -134,25 +154,44 @@ Configure your compression settings:
                  for btn in row] for row in keyboard
             ])
             
-            status_message = await callback_query.edit_message_text(
+            status_message = await self.api.edit(
+                callback_query,
                 processing_text, reply_markup=keyboard_markup
             )
             
-            # Start compression in background
-            asyncio.create_task(
-                self._process_compression(callback_query.message.chat.id, 
-                                        status_message.id, original_message, 
-                                        video_file, settings, task_id)
+            # Queue for the encode workers with everything needed to rebuild the job
+            await self.db.update_compression_task(task_id, {
+                'chat_id': callback_query.message.chat.id,
+                'message_id': original_message.id,
+                'status_message_id': status_message.id
+            })
+            await self.scheduler.submit(
+                task_id, 'compress_status', self.scheduler.priority_for(task_data['file_size']),
+                key=f"{video_file.file_unique_id}:{settings_hash(settings)}"
             )
             
+            # An identical job is already running, this message mirrors it
+            leader = self.scheduler.leader_of(task_id)
+            if leader:
+                self.progress.link(task_id, leader)
+                await self.api.answer(callback_query, "🔗 Already compressing this video, sharing its progress")
+            
         except Exception as e:
-            await callback_query.answer(f"❌ Error starting compression: {str(e)}")
+            await self.api.answer(callback_query, f"❌ Error starting compression: {str(e)}")
+    
+    async def process_task(self, task_id: str, task: dict):
+        """Scheduler runner: fetch the source message again and compress it"""
+        client = self.context.client
+        original_message = await client.get_messages(task['chat_id'], task['message_id'])
+        video_file = original_message.video or original_message.document
+        await self._process_compression(task['chat_id'], task['status_message_id'], 
+                                        original_message, video_file, task['settings'], task_id)
     
     async def _process_compression(self, chat_id: int, status_msg_id: int,
                                  original_message: Message, video_file, 
                                  settings: dict, task_id: str):
         """Process video compression"""
-        client = original_message._client
+        client = self.context.client
         
         try:
             # Update status to processing
@@ -168,36 +207,41 @@ Configure your compression settings:
                                     f"{task_id}_{video_file.file_name or 'video.mp4'}")
             output_path = os.path.join(Config.COMPRESSED_PATH, 
                                      f"compressed_{task_id}_{video_file.file_name or 'video.mp4'}")
+            track_paths(input_path, output_path)
             
-            # Download with progress
-            await original_message.download(
-                input_path,
-                progress=lambda current, total: asyncio.create_task(
-                    self._download_progress(client, chat_id, status_msg_id, 
-                                          current, total, task_id)
-                )
-            )
-            
-            # Start compression
-            await self._update_status(client, chat_id, status_msg_id, 
-                                    "🔄 Compressing video...", 0, task_id)
+            async def on_encode(streaming):
+                status = "🔄 Compressing while downloading..." if streaming else "🔄 Compressing video..."
+                await self._update_status(client, chat_id, status_msg_id, status, 0, task_id)
             
             # Progress callback for compression
-            async def progress_callback(task_id, progress):
+            async def progress_callback(progress, stats):
+                status = f"🔄 Compressing video... ({stats['speed']:.2f}x, {stats['fps']:.0f} fps)"
                 await self._update_status(client, chat_id, status_msg_id, 
-                                        "🔄 Compressing video...", progress, task_id)
-                await self.db.update_queue_status(task_id, 'processing', progress)
-            
-            # Compress video
-            result = await self.compressor.compress_video(
-                input_path, output_path, settings, task_id, progress_callback
+                                        status, int(progress), task_id)
+            
+            # Download with progress, then compress video
+            result = await fetch_and_compress(
+                client, task_id, await self.db.get_task(task_id) or {}, original_message,
+                input_path, output_path, settings,
+                download_progress=lambda current, total: self._download_progress(
+                    client, chat_id, status_msg_id, current, total, task_id
+                ),
+                progress_callback=progress_callback,
+                on_encode=on_encode
             )
             
+            if result.get('killed'):
+                for task in [task_id] + self.scheduler.followers_of(task_id):
+                    await self.db.update_compression_task(
+                        task, {'kill_reason': result['killed'], 'fallback': result.get('fallback')}
+                    )
+            
             if result['success']:
                 # Generate thumbnail if enabled
                 thumbnail_path = None
                 if settings.get('thumbnail', True):
                     thumbnail_path = os.path.join(Config.THUMBNAIL_PATH, f"thumb_{task_id}.jpg")
+                    track_paths(thumbnail_path)
                     await self.compressor.generate_thumbnail(output_path, thumbnail_path)
                 
                 # Upload compressed video
@@ -221,20 +265,29 @@ Configure your compression settings:
 • Preset: `{settings['preset']}`
 • Resolution: `{settings.get('resolution', 'keep')}`
 • Audio Bitrate: `{settings.get('audio_bitrate', 'original')}`
+• Path: `{describe_encode_path(result['streams'], result.get('fallback'))}`
 """
                 
                 # Send compressed video
-                sent_message = await client.send_video(
-                    chat_id=Config.DUMP_ID,
-                    video=output_path,
-                    caption=caption,
-                    thumb=thumbnail_path,
-                    supports_streaming=True,
-                    progress=lambda current, total: asyncio.create_task(
-                        self._upload_progress(client, chat_id, status_msg_id, 
-                                            current, total, task_id)
+                async with self.scheduler.stage('upload'):
+                    sent = await self.context.delivery.deliver(
+                        client,
+                        output_path,
+                        [Config.DUMP_ID],
+                        caption=caption,
+                        thumb=thumbnail_path,
+                        info=await self.compressor.get_video_info(output_path),
+                        file_name=file_name,
+                        progress=lambda current, total: self._upload_progress(
+                            client, chat_id, status_msg_id, current, total, task_id
+                        )
                     )
-                )
+                sent_message = sent[Config.DUMP_ID]
+                await self.db.update_compression_task(task_id, {'output_file_id': sent_message.video.file_id})
+                # A fallback result is not what these settings ask for
+                if not result.get('fallback'):
+                    await self.context.results.put(video_file.file_unique_id, settings, result,
+                                                   sent_message.video.file_id)
                 
                 # Update user stats
                 await self.db.increment_user_stats(
@@ -259,36 +312,31 @@ Configure your compression settings:
 Your compressed video is ready!
 """
                 
-                await client.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=status_msg_id,
-                    text=completion_text,
-                    reply_markup=keyboard_markup
-                )
+                await self._edit_status(client, task_id, chat_id, status_msg_id,
+                                        completion_text, keyboard_markup)
                 
-                await self.db.update_queue_status(task_id, 'completed', 100)
+                await self._set_status(task_id, 'completed', 100)
                 
             else:
                 # Compression failed
                 error_text = f"""
 ❌ **Compression Failed**
 
-**Error:** `{result.get('error', 'Unknown error')}`
+**Error:** `{(result.get('error') or 'Unknown error')[-500:]}`
 
 The video could not be compressed. Please try again with different settings or contact support.
 """
                 
-                await client.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=status_msg_id,
-                    text=error_text
-                )
+                await self._edit_status(client, task_id, chat_id, status_msg_id, error_text)
                 
-                await self.db.update_queue_status(task_id, 'failed')
+                await self._set_status(task_id, 'failed')
+                self.compressor.segment_encoder.discard(output_path)
             
             # Cleanup files
             self._cleanup_files([input_path, output_path, thumbnail_path])
-            await self.db.remove_from_queue(task_id)
+            for task in [task_id] + self.scheduler.followers_of(task_id):
+                await self.db.remove_from_queue(task)
+            await self.db.flush()
             
         except Exception as e:
             # Handle any errors during processing
@@ -301,15 +349,11 @@ An error occurred during processing. Please try again.
 """
             
             try:
-                await client.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=status_msg_id,
-                    text=error_text
-                )
+                await self._edit_status(client, task_id, chat_id, status_msg_id, error_text)
             except:
                 pass
             
-            await self.db.update_queue_status(task_id, 'failed')
+            await self._set_status(task_id, 'failed')
             
             # Cleanup files
             try:
@@ -318,6 +362,9 @@ An error occurred during processing. Please try again.
                 self._cleanup_files([input_path, output_path])
             except:
                 pass
+        finally:
+            # Also when the job is cancelled
+            self.progress.remove(task_id)
     
     async def _download_progress(self, client, chat_id: int, status_msg_id: int, 
                                current: int, total: int, task_id: str):
@@ -348,8 +395,9 @@ An error occurred during processing. Please try again.
     async def _update_status(self, client, chat_id: int, status_msg_id: int, 
                            status: str, progress: int, task_id: str):
         """Update compression status message"""
+        self.progress.update(task_id, progress, status)
         try:
-            task_data = await self.db.queue_data.get(task_id, {})
+            task_data = await self.db.get_task(task_id) or {}
             file_name = task_data.get('file_name', 'video.mp4')
             file_size = task_data.get('file_size', 0)
             
@@ -360,27 +408,42 @@ An error occurred during processing. Please try again.
 **Size:** `{format_bytes(file_size)}`
 **Status:** {status}
 
-{get_progress_bar(progress)} {progress}%
+{create_progress_bar(progress)}
 """
             
-            keyboard = [[{"text": "❌ Cancel", "callback_data": f"cancel_{task_id}"}]]
-            keyboard_markup = InlineKeyboardMarkup([
-                [InlineKeyboardButton(btn["text"], callback_data=btn["callback_data"]) 
-                 for btn in row] for row in keyboard
-            ])
-            
-            await client.edit_message_text(
-                chat_id=chat_id,
-                message_id=status_msg_id,
-                text=status_text,
-                reply_markup=keyboard_markup
-            )
+            for target_id, target_chat_id, target_msg_id in await self._status_targets(
+                    task_id, chat_id, status_msg_id):
+                keyboard = [[{"text": "❌ Cancel", "callback_data": f"cancel_{target_id}"}]]
+                keyboard_markup = InlineKeyboardMarkup([
+                    [InlineKeyboardButton(btn["text"], callback_data=btn["callback_data"]) 
+                     for btn in row] for row in keyboard
+                ])
+                
+                self.context.status.post(target_chat_id, target_msg_id, status_text, keyboard_markup)
             
-        except MessageNotModified:
-            pass
         except Exception as e:
             print(f"Error updating status: {e}")
     
+    async def _status_targets(self, task_id: str, chat_id: int, status_msg_id: int) -> list:
+        """(task id, chat id, status message id) of a task and the requests coalesced into it"""
+        targets = [(task_id, chat_id, status_msg_id)]
+        for follower in self.scheduler.followers_of(task_id):
+            task = await self.db.get_task(follower) or {}
+            if task.get('status_message_id'):
+                targets.append((follower, task['chat_id'], task['status_message_id']))
+        return targets
+    
+    async def _edit_status(self, client, task_id: str, chat_id: int, status_msg_id: int,
+                           text: str, reply_markup=None):
+        """Show the same final text on every status message of a task"""
+        for _, target_chat_id, target_msg_id in await self._status_targets(task_id, chat_id, status_msg_id):
+            await self.context.status.send(target_chat_id, target_msg_id, text, reply_markup)
+    
+    async def _set_status(self, task_id: str, status: str, progress: int = 0):
+        """Record the outcome of a task and of the requests coalesced into it"""
+        for task in [task_id] + self.scheduler.followers_of(task_id):
+            await self.db.update_queue_status(task, status, progress)
+    
     def _cleanup_files(self, file_paths: list):
         """Clean up temporary files"""
         for file_path in file_paths:
@@ -399,7 +462,7 @@ async def toggle_thumbnail_setting(callback_query: CallbackQuery, db):
     new_setting = not current_setting
     
     await db.update_user_settings(callback_query.from_user.id, {'thumbnail': new_setting})
-    await callback_query.answer(f"Thumbnail {'enabled' if new_setting else 'disabled'}")
+    await get_context().api.answer(callback_query, f"Thumbnail {'enabled' if new_setting else 'disabled'}")
 
 async def toggle_audio_setting(callback_query: CallbackQuery, db):
     """Toggle remove audio setting"""
@@ -408,7 +471,7 @@ async def toggle_audio_setting(callback_query: CallbackQuery, db):
     new_setting = not current_setting
     
     await db.update_user_settings(callback_query.from_user.id, {'remove_audio': new_setting})
-    await callback_query.answer(f"Remove audio {'enabled' if new_setting else 'disabled'}")
+    await get_context().api.answer(callback_query, f"Remove audio {'enabled' if new_setting else 'disabled'}")
 
 async def show_video_info(callback_query: CallbackQuery, data: str):
     """Show detailed video information"""
@@ -416,32 +479,35 @@ async def show_video_info(callback_query: CallbackQuery, data: str):
         message_id = int(data.split('_')[-1])
         
         # Get the original message
-        original_message = None
-        async for message in callback_query.message.chat.iter_history():
-            if message.id == message_id:
-                original_message = message
-                break
+        client = get_context().client
+        original_message = await get_context().messages.resolve(
+            client, callback_query.message.chat.id, message_id
+        )
         
         if not original_message:
-            await callback_query.answer("❌ Original message not found")
+            await get_context().api.answer(callback_query, "❌ Original message not found")
             return
         
         # Get video file
         video_file = original_message.video or original_message.document
         if not video_file:
-            await callback_query.answer("❌ No video file found")
+            await get_context().api.answer(callback_query, "❌ No video file found")
             return
         
-        # Download a small portion to analyze
+        # Cached probe results make repeat lookups free
+        probe = get_context().probe
+        info = probe.get_cached(video_file.file_unique_id)
         temp_path = f"/tmp/temp_analysis_{message_id}.mp4"
         
         try:
-            # Download just a small part for analysis
-            await original_message.download(temp_path, file_size=min(video_file.file_size, 10*1024*1024))
-            
-            # Get detailed info
-            compressor = VideoCompressor()
-            info = await compressor.get_video_info(temp_path)
+            if not info:
+                # Download just a small part for analysis (10 x 1 MB chunks)
+                with open(temp_path, 'wb') as f:
+                    async for chunk in client.stream_media(original_message, limit=10):
+                        f.write(chunk)
+                
+                # Get detailed info
+                info = await probe.probe(temp_path, video_file.file_unique_id, partial=True)
             
             if info:
                 video_info_text = f"""
@@ -451,23 +517,23 @@ async def show_video_info(callback_query: CallbackQuery, data: str):
 • Name: `{video_file.file_name or 'video.mp4'}`
 • Size: `{format_bytes(video_file.file_size)}`
 • Duration: `{format_duration(int(info.get('duration', 0)))}`
-• Format: `{info.get('format', 'Unknown')}`
+• Format: `{info.get('format_name', 'Unknown')}`
 • Bitrate: `{info.get('bitrate', 0)} bps`
 
 **🎬 Video Stream:**
-• Codec: `{info.get('video', {}).get('codec', 'Unknown')}`
-• Resolution: `{info.get('video', {}).get('width', 0)}x{info.get('video', {}).get('height', 0)}`
-• FPS: `{info.get('video', {}).get('fps', 0):.2f}`
-• Video Bitrate: `{info.get('video', {}).get('bitrate', 0)} bps`
+• Codec: `{info.get('video_codec', 'Unknown')}`
+• Resolution: `{info.get('width', 0)}x{info.get('height', 0)}`
+• FPS: `{info.get('fps', 0):.2f}`
+• Video Bitrate: `{info.get('video_bitrate', 0)} bps`
 
 **🔊 Audio Stream:**
 """
                 
-                if info.get('audio'):
-                    audio_info_text = f"""• Codec: `{info['audio'].get('codec', 'Unknown')}`
-• Bitrate: `{info['audio'].get('bitrate', 0)} bps`
-• Sample Rate: `{info['audio'].get('sample_rate', 0)} Hz`
-• Channels: `{info['audio'].get('channels', 0)}`"""
+                if info.get('audio_codec'):
+                    audio_info_text = f"""• Codec: `{info.get('audio_codec', 'Unknown')}`
+• Bitrate: `{info.get('audio_bitrate', 0)} bps`
+• Sample Rate: `{info.get('sample_rate', 0)} Hz`
+• Channels: `{info.get('channels', 0)}`"""
                 else:
                     audio_info_text = "• No audio stream found"
                 
@@ -491,10 +557,7 @@ async def show_video_info(callback_query: CallbackQuery, data: str):
             [InlineKeyboardButton("🔙 Back", callback_data="start")]
         ])
         
-        await callback_query.edit_message_text(video_info_text, reply_markup=keyboard)
+        await get_context().api.edit(callback_query, video_info_text, reply_markup=keyboard)
         
     except Exception as e:
-        await callback_query.answer(f"❌ Error: {str(e)}")
-
-# Initialize compression handler
-compression_handler = CompressionHandler()
\ No newline at end of file
+        await get_context().api.answer(callback_query, f"❌ Error: {str(e)}")
@@ -1,187 +1,496 @@
 # utils/compressor.py
 import asyncio
+import inspect
 import os
-import re
-import subprocess
-from typing import Dict, Optional, Callable
+import time
+from typing import AsyncIterator, Dict, Optional, Callable, Tuple
+import aiofiles
 from bot.config import Config
+from utils.ffmpeg_progress import ProgressParser, StderrRingBuffer
+from utils.probe import ProbeService, parse_video_info
+from utils.cancellation import stop_process, track_process, untrack_process
+from utils.segment_encoder import SegmentEncoder
+from utils.watchdog import EncodeWatchdog, current_watchdog
 
 class VideoCompressor:
-    def __init__(self):
+    def __init__(self, probe: Optional[ProbeService] = None):
         self.ffmpeg_path = "ffmpeg"
+        self.probe = probe or ProbeService()
+        self.segment_encoder = SegmentEncoder(self)
     
     async def compress_video(
         self, 
         input_path: str, 
         output_path: str, 
         settings: Dict, 
-        progress_callback: Optional[Callable] = None
-    ) -> bool:
-        """Compress video with given settings"""
+        progress_callback: Optional[Callable] = None,
+        file_unique_id: Optional[str] = None,
+        source: Optional[AsyncIterator[bytes]] = None,
+        duration_hint: float = 0.0
+    ) -> Dict:
+        """Compress video with given settings.
+        
+        With ``source`` the input is still downloading: ffmpeg reads the
+        chunks from stdin while they are also written to ``input_path``,
+        which only needs to hold the first chunk for probing at this point.
+        
+        An encode that hangs is killed by an ``EncodeWatchdog``; the reason
+        ends up in the result's ``killed`` and the encode is retried once
+        with the ``Config.ENCODE_FALLBACK`` settings.
+        """
+        start_time = time.time()
+        async with EncodeWatchdog() as watchdog:
+            result = await self._compress(input_path, output_path, settings, progress_callback,
+                                          file_unique_id, source, duration_hint, start_time)
+        # Only a compression that failed because the watchdog killed it is retried
+        if watchdog.reason is None or result['success']:
+            return result
+        
+        result['killed'] = watchdog.reason
+        # Appended so the reason survives when the error is cut to its tail
+        result['error'] = f"{result['error'] or ''}\nKilled by watchdog: {watchdog.reason}"
+        fallback = self.fallback_settings(settings)
+        # A streamed input is incomplete on disk, so there is nothing to retry from
+        if fallback is None or source is not None:
+            return result
+        
+        print(f"Retrying with the {Config.ENCODE_FALLBACK} fallback")
+        async with EncodeWatchdog() as watchdog:
+            retry = await self._compress(input_path, output_path, fallback, progress_callback,
+                                         file_unique_id, None, duration_hint, start_time)
+        retry['killed'] = result['killed']
+        retry['fallback'] = Config.ENCODE_FALLBACK
+        if watchdog.reason is not None:
+            retry['error'] = f"Killed by watchdog: {result['killed']}; fallback {watchdog.reason}"
+        elif not retry['success']:
+            retry['error'] = f"{retry['error']}\nFallback after watchdog kill ({result['killed']}) failed"
+        return retry
+    
+    def fallback_settings(self, settings: Dict) -> Optional[Dict]:
+        """Settings for the retry after a watchdog kill, None if there is none"""
+        if Config.ENCODE_FALLBACK == 'copy':
+            return dict(settings, copy_only=True)
+        if Config.ENCODE_FALLBACK == 'preset' and settings.get('preset') != Config.FALLBACK_PRESET:
+            return dict(settings, preset=Config.FALLBACK_PRESET)
+        return None
+    
+    async def _compress(self, input_path: str, output_path: str, settings: Dict,
+                        progress_callback: Optional[Callable], file_unique_id: Optional[str],
+                        source: Optional[AsyncIterator[bytes]], duration_hint: float,
+                        start_time: float) -> Dict:
+        """Run one compression attempt and summarize it"""
+        streams = {'video': 'encode', 'audio': 'encode'}
         try:
-            # Build FFmpeg command
-            cmd = await self._build_ffmpeg_command(input_path, output_path, settings)
-            
-            print(f"FFmpeg command: {' '.join(cmd)}")
+            if source is not None:
+                info = await self.probe.probe(input_path, file_unique_id, partial=True)
+                duration = info.get('duration') or duration_hint
+            else:
+                # Get video duration for progress calculation
+                duration = await self._get_video_duration(input_path, file_unique_id)
+                info = await self.probe.probe(input_path, file_unique_id)
+            streams = self.plan_streams(info, settings)
             
-            # Get video duration for progress calculation
-            duration = await self._get_video_duration(input_path)
+            cuts = []
+            if source is None and streams['video'] == 'encode' and self._should_segment(settings, duration):
+                keyframes = await self.probe.get_keyframes(input_path, file_unique_id)
+                cuts = self.segment_encoder.plan(duration, keyframes, info.get('start_time', 0.0))
             
-            # Start compression process
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            if source is not None:
+                error = await self._encode_single(
+                    input_path, output_path, settings, duration, progress_callback, streams, source
+                )
+            elif streams['video'] == 'two-pass':
+                error = await self._encode_target_size(
+                    input_path, output_path, settings, duration, info, streams, progress_callback
+                )
+            elif cuts:
+                error = await self.segment_encoder.encode(
+                    input_path, output_path, settings, duration, cuts, 
+                    audio=streams['audio'], progress_callback=progress_callback
+                )
+            else:
+                error = await self._encode_single(
+                    input_path, output_path, settings, duration, progress_callback, streams
+                )
             
-            # Monitor progress
+            if error is None:
+                print(f"Compression completed successfully (video: {streams['video']}, audio: {streams['audio']})")
+            else:
+                print(f"Compression failed: {error[-2000:]}")
+            return self._build_result(input_path, output_path, start_time, error, streams)
+        
+        except Exception as e:
+            print(f"Compression error: {e}")
+            return self._build_result(input_path, output_path, start_time, str(e), streams)
+    
+    def plan_streams(self, info: Dict, settings: Dict) -> Dict[str, str]:
+        """Decide per stream whether to stream-copy or re-encode.
+        
+        Video is copied when it is already H.264 within the requested
+        bitrate and resolution; audio when it is already AAC within the
+        requested bitrate. Audio is 'none' when removed or absent, and video
+        is 'two-pass' when a target file size is set. With ``copy_only``
+        every stream is copied as is.
+        """
+        streams = {'video': 'encode', 'audio': 'encode'}
+        
+        if settings.get('remove_audio', False) or (info and 'audio_codec' not in info):
+            streams['audio'] = 'none'
+        
+        # Remux fallback after a hung encode
+        if settings.get('copy_only'):
+            streams['video'] = 'copy'
+            if streams['audio'] == 'encode':
+                streams['audio'] = 'copy'
+            return streams
+        
+        if settings.get('target_size'):
+            streams['video'] = 'two-pass'
+        
+        if not info or not settings.get('stream_copy', Config.STREAM_COPY):
+            return streams
+        
+        if (streams['video'] == 'encode'
+                and info.get('video_codec') == 'h264'
+                and info.get('pix_fmt') in ('', 'yuv420p', 'yuvj420p')
+                and self._fits_resolution(info, settings.get('resolution', 'keep'))
+                and self._fits_bitrate(self._source_video_bitrate(info), settings.get('video_bitrate', '2000k'))):
+            streams['video'] = 'copy'
+        
+        if (streams['audio'] == 'encode'
+                and info.get('audio_codec') == 'aac'
+                and self._fits_bitrate(info.get('audio_bitrate', 0), settings.get('audio_bitrate', '128k'))):
+            streams['audio'] = 'copy'
+        
+        return streams
+    
+    @staticmethod
+    def _fits_resolution(info: Dict, resolution: str) -> bool:
+        """Check if the source is no larger than the requested resolution"""
+        if resolution == 'keep':
+            return True
+        target = Config.RESOLUTION_PRESETS.get(resolution, '')
+        width, _, height = target.partition('x')
+        if not height:
+            return False
+        return 0 < info.get('width', 0) <= int(width) and 0 < info.get('height', 0) <= int(height)
+    
+    @staticmethod
+    def _fits_bitrate(source_bps: int, target: str) -> bool:
+        """Check a known source bitrate (bit/s) against a setting like '2000k'"""
+        return 0 < source_bps <= _parse_bitrate(target)
+    
+    @staticmethod
+    def _source_video_bitrate(info: Dict) -> int:
+        """Video bitrate, estimated from the container when the stream has none (MKV)"""
+        if info.get('video_bitrate'):
+            return info['video_bitrate']
+        return max(info.get('bitrate', 0) - info.get('audio_bitrate', 0), 0)
+    
+    async def _encode_single(self, input_path: str, output_path: str, settings: Dict,
+                             duration: float, progress_callback: Optional[Callable],
+                             streams: Optional[Dict] = None,
+                             source: Optional[AsyncIterator[bytes]] = None) -> Optional[str]:
+        """Encode the whole file with one ffmpeg process, returning an error or None"""
+        # Build FFmpeg command
+        cmd = await self._build_ffmpeg_command(
+            "pipe:0" if source is not None else input_path, output_path, settings, streams
+        )
+        
+        print(f"FFmpeg command: {' '.join(cmd)}")
+        
+        async def on_event(event):
             if progress_callback and duration > 0:
-                await self._monitor_progress(process, duration, progress_callback)
+                progress = (event['out_time'] / duration) * 100
+                await self.notify_progress(progress_callback, min(progress, 99), event)
+        
+        stdin = self._tee(source, input_path) if source is not None else None
+        returncode, stderr = await self.run_ffmpeg(cmd, on_event, stdin)
+        if returncode != 0:
+            return stderr or "ffmpeg failed"
+        return None
+    
+    def can_stream(self, settings: Dict) -> bool:
+        """Check if a job may encode while downloading (needs a single-pass encode)"""
+        return Config.STREAM_INGEST and not settings.get('target_size')
+    
+    @staticmethod
+    async def _tee(source: AsyncIterator[bytes], path: str) -> AsyncIterator[bytes]:
+        """Pass chunks through while keeping a copy of the whole input on disk"""
+        async with aiofiles.open(path, 'wb') as f:
+            async for chunk in source:
+                await f.write(chunk)
+                yield chunk
+    
+    async def _encode_target_size(self, input_path: str, output_path: str, settings: Dict,
+                                  duration: float, info: Dict, streams: Dict,
+                                  progress_callback: Optional[Callable]) -> Optional[str]:
+        """Two-pass encode sized to settings['target_size'] (MB), retrying on overshoot"""
+        target_bytes = int(settings['target_size']) * 1024 * 1024
+        if duration <= 0:
+            return "Cannot size the output: unknown duration"
+        
+        if streams['audio'] == 'copy':
+            audio_bps = info.get('audio_bitrate', 0)
+        elif streams['audio'] == 'encode':
+            audio_bps = _parse_bitrate(settings.get('audio_bitrate', '128k'))
+        else:
+            audio_bps = 0
+        
+        # Leave room for the container so the first attempt usually fits
+        budget_bps = target_bytes * 8 * (1 - Config.TARGET_SIZE_OVERHEAD) / duration
+        video_bps = int(budget_bps - audio_bps)
+        if video_bps < Config.TARGET_SIZE_MIN_VIDEO_BITRATE:
+            return (f"Target size of {settings['target_size']} MB is too small for a "
+                    f"{int(duration)}s video")
+        
+        passlog = os.path.join(os.path.dirname(output_path) or '.', f".2pass_{os.path.basename(output_path)}")
+        first_pass_weight = 0.3
+        
+        def scaled(offset: float, weight: float):
+            async def on_event(event):
+                if progress_callback:
+                    progress = offset + min(event['out_time'] / duration, 1.0) * weight * 100
+                    await self.notify_progress(progress_callback, min(progress, 99), event)
+            return on_event
+        
+        try:
+            # First pass only gathers rate-control statistics
+            cmd = [self.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1", "-i", input_path]
+            cmd.extend(self.video_args(dict(
+                settings, preset=Config.FIRST_PASS_PRESET, video_bitrate=f"{video_bps // 1000}k"
+            )))
+            cmd.extend(["-pass", "1", "-passlogfile", passlog, "-an", "-f", "null", "-y", os.devnull])
             
-            # Wait for completion
-            stdout, stderr = await process.communicate()
+            print(f"Two-pass target {settings['target_size']} MB: video {video_bps // 1000}k")
+            returncode, stderr = await self.run_ffmpeg(cmd, scaled(0, first_pass_weight))
+            if returncode != 0:
+                return stderr or "First pass failed"
             
-            if process.returncode == 0:
-                print("Compression completed successfully")
-                return True
-            else:
-                print(f"Compression failed: {stderr.decode()}")
-                return False
+            for attempt in range(Config.TARGET_SIZE_RETRIES + 1):
+                cmd = [self.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1", "-i", input_path]
+                cmd.extend(self.video_args(dict(settings, video_bitrate=f"{video_bps // 1000}k")))
+                cmd.extend(["-pass", "2", "-passlogfile", passlog])
+                cmd.extend(["-c:a", "copy"] if streams['audio'] == 'copy' else self.audio_args(settings))
+                cmd.extend(["-movflags", "+faststart", "-y", output_path])
                 
-        except Exception as e:
-            print(f"Compression error: {e}")
+                returncode, stderr = await self.run_ffmpeg(
+                    cmd, scaled(first_pass_weight * 100, 1 - first_pass_weight)
+                )
+                if returncode != 0:
+                    return stderr or "Second pass failed"
+                
+                size = os.path.getsize(output_path)
+                if size <= target_bytes:
+                    return None
+                if attempt == Config.TARGET_SIZE_RETRIES:
+                    break
+                
+                # Overshoot: scale the video bitrate by the miss, with a little headroom
+                video_bps = int(video_bps * target_bytes / size * 0.97)
+                print(f"Output {size} bytes exceeds target by {size - target_bytes}, retrying at {video_bps // 1000}k")
+                if video_bps < Config.TARGET_SIZE_MIN_VIDEO_BITRATE:
+                    break
+            
+            return f"Could not fit the video into {settings['target_size']} MB"
+        finally:
+            for name in os.listdir(os.path.dirname(passlog)):
+                if name.startswith(os.path.basename(passlog)):
+                    os.remove(os.path.join(os.path.dirname(passlog), name))
+    
+    def _should_segment(self, settings: Dict, duration: float) -> bool:
+        """Use the chunked encoder for long inputs on multi-core hosts, and for
+        very long ones anywhere so an interrupted encode resumes from its segments"""
+        if settings.get('checkpoint', Config.CHECKPOINT_ENCODE) and duration >= Config.CHECKPOINT_MIN_DURATION:
+            return True
+        if not settings.get('parallel', Config.PARALLEL_ENCODE):
             return False
+        if self.segment_encoder.workers < 2:
+            return False
+        return duration >= Config.SEGMENT_MIN_DURATION * 2
+    
+    def _build_result(self, input_path: str, output_path: str, start_time: float, 
+                      error: Optional[str] = None, streams: Optional[Dict] = None) -> Dict:
+        """Summarize a finished compression"""
+        original_size = os.path.getsize(input_path) if os.path.exists(input_path) else 0
+        compressed_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        size_reduction = original_size - compressed_size
+        
+        return {
+            'success': error is None,
+            'error': error,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'size_reduction': size_reduction,
+            'compression_ratio': size_reduction / original_size * 100 if original_size else 0.0,
+            'compression_time': time.time() - start_time,
+            'streams': streams or {'video': 'encode', 'audio': 'encode'}
+        }
     
-    async def _build_ffmpeg_command(self, input_path: str, output_path: str, settings: Dict) -> list:
+    async def _build_ffmpeg_command(self, input_path: str, output_path: str, settings: Dict,
+                                    streams: Optional[Dict] = None) -> list:
         """Build FFmpeg command based on settings"""
-        cmd = [self.ffmpeg_path, "-i", input_path]
+        streams = streams or {}
+        cmd = [self.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1", "-i", input_path]
+        
+        if streams.get('video') == 'copy':
+            cmd.extend(["-c:v", "copy"])
+        else:
+            cmd.extend(self.video_args(settings))
+        
+        if streams.get('audio') == 'copy':
+            cmd.extend(["-c:a", "copy"])
+        else:
+            cmd.extend(self.audio_args(settings))
         
+        # Output settings
+        cmd.extend(["-movflags", "+faststart"])  # Enable streaming
+        cmd.extend(["-y"])  # Overwrite output file
+        cmd.append(output_path)
+        
+        return cmd
+    
+    def video_args(self, settings: Dict) -> list:
+        """FFmpeg video encoder arguments for the given settings"""
         # Video codec
-        cmd.extend(["-c:v", "libx264"])
+        args = ["-c:v", "libx264"]
         
         # Compression preset
         preset = settings.get('preset', 'medium')
-        cmd.extend(["-preset", preset])
+        args.extend(["-preset", preset])
         
         # Video bitrate
         video_bitrate = settings.get('video_bitrate', '2000k')
-        cmd.extend(["-b:v", video_bitrate])
+        args.extend(["-b:v", video_bitrate])
         
         # Resolution
         resolution = settings.get('resolution', 'keep')
         if resolution != 'keep':
             if resolution == '720p':
-                cmd.extend(["-vf", "scale=1280:720"])
+                args.extend(["-vf", "scale=1280:720"])
             elif resolution == '480p':
-                cmd.extend(["-vf", "scale=854:480"])
+                args.extend(["-vf", "scale=854:480"])
             elif resolution == '360p':
-                cmd.extend(["-vf", "scale=640:360"])
+                args.extend(["-vf", "scale=640:360"])
         
-        # Audio settings
+        return args
+    
+    def audio_args(self, settings: Dict) -> list:
+        """FFmpeg audio encoder arguments for the given settings"""
         if settings.get('remove_audio', False):
-            cmd.extend(["-an"])  # Remove audio
-        else:
-            cmd.extend(["-c:a", "aac"])
-            audio_bitrate = settings.get('audio_bitrate', '128k')
-            cmd.extend(["-b:a", audio_bitrate])
-        
-        # Output settings
-        cmd.extend(["-movflags", "+faststart"])  # Enable streaming
-        cmd.extend(["-y"])  # Overwrite output file
-        cmd.append(output_path)
+            return ["-an"]  # Remove audio
         
-        return cmd
+        audio_bitrate = settings.get('audio_bitrate', '128k')
+        return ["-c:a", "aac", "-b:a", audio_bitrate]
     
-    async def _get_video_duration(self, input_path: str) -> float:
+    async def _get_video_duration(self, input_path: str, file_unique_id: Optional[str] = None) -> float:
         """Get video duration in seconds"""
         try:
-            cmd = [
-                "ffprobe", "-v", "quiet", "-show_entries", 
-                "format=duration", "-of", "csv=p=0", input_path
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, _ = await process.communicate()
-            
-            if process.returncode == 0:
-                duration_str = stdout.decode().strip()
-                return float(duration_str)
-            
+            return await self.probe.get_duration(input_path, file_unique_id)
         except Exception as e:
             print(f"Error getting duration: {e}")
         
         return 0.0
     
-    async def _monitor_progress(self, process, total_duration: float, progress_callback: Callable):
-        """Monitor FFmpeg progress"""
+    async def run_ffmpeg(self, cmd: list, on_event: Optional[Callable] = None,
+                         stdin: Optional[AsyncIterator[bytes]] = None) -> Tuple[int, str]:
+        """Run an ffmpeg command that writes -progress to stdout.
+        
+        ``stdin`` chunks are piped into the process (for ``-i pipe:0``).
+        Returns the exit code and the tail of stderr.
+        """
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        track_process(process)
+        watchdog = current_watchdog.get()
+        if watchdog is not None:
+            watchdog.register(process)
+        
+        # Progress arrives on stdout, stderr is only kept for error reporting
+        stderr_tail = StderrRingBuffer(Config.FFMPEG_STDERR_TAIL_KB * 1024)
+        jobs = [
+            self._monitor_progress(process, on_event),
+            self._drain_stderr(process, stderr_tail)
+        ]
+        if stdin is not None:
+            jobs.append(self._feed_stdin(process, stdin))
         try:
-            while process.returncode is None:
-                try:
-                    # Check if process is still running
-                    if process.stderr.at_eof():
-                        break
-                    
-                    # Read stderr line
-                    line = await asyncio.wait_for(
-                        process.stderr.readline(), 
-                        timeout=1.0
-                    )
-                    
-                    if not line:
-                        continue
-                    
-                    line = line.decode().strip()
-                    
-                    # Parse time from FFmpeg output
-                    time_match = re.search(r'time=(\d+):(\d+):(\d+\.\d+)', line)
-                    if time_match:
-                        hours = int(time_match.group(1))
-                        minutes = int(time_match.group(2))
-                        seconds = float(time_match.group(3))
-                        
-                        current_time = hours * 3600 + minutes * 60 + seconds
-                        progress = (current_time / total_duration) * 100
-                        
-                        # Call progress callback
-                        await progress_callback(min(progress, 99))
-                        
-                except asyncio.TimeoutError:
-                    continue
-                except Exception as e:
-                    print(f"Progress monitoring error: {e}")
+            await asyncio.gather(*jobs)
+            
+            # Wait for completion
+            await process.wait()
+        except BaseException:
+            # Cancelled, or the input stream broke: don't leave ffmpeg behind
+            await stop_process(process)
+            raise
+        finally:
+            untrack_process(process)
+            if watchdog is not None:
+                watchdog.unregister(process)
+        
+        return process.returncode, stderr_tail.getvalue()
+    
+    @staticmethod
+    async def notify_progress(progress_callback: Callable, progress: float, event: Dict):
+        """Call progress callback (plain functions or coroutines)"""
+        result = progress_callback(progress, event)
+        if inspect.isawaitable(result):
+            await result
+    
+    async def _monitor_progress(self, process, on_event: Optional[Callable]):
+        """Parse FFmpeg's -progress stream from stdout"""
+        parser = ProgressParser()
+        watchdog = current_watchdog.get()
+        try:
+            while True:
+                chunk = await process.stdout.read(4096)
+                if not chunk:
                     break
-                    
+                
+                for event in parser.feed(chunk):
+                    if watchdog is not None:
+                        watchdog.observe(process, event)
+                    if on_event:
+                        await on_event(event)
+        
         except Exception as e:
             print(f"Progress monitoring error: {e}")
+            # Keep draining so ffmpeg never blocks on a full pipe
+            while await process.stdout.read(4096):
+                pass
+    
+    async def _feed_stdin(self, process, source: AsyncIterator[bytes]):
+        """Write input chunks to ffmpeg, closing stdin at the end of the stream"""
+        watchdog = current_watchdog.get()
+        try:
+            async for chunk in source:
+                # A slow download is not a hung encode
+                if watchdog is not None:
+                    watchdog.touch()
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg stopped reading; its exit code and stderr tell why
+            pass
+        finally:
+            process.stdin.close()
+    
+    async def _drain_stderr(self, process, buffer: StderrRingBuffer):
+        """Read stderr into a bounded ring buffer"""
+        while True:
+            chunk = await process.stderr.read(4096)
+            if not chunk:
+                break
+            buffer.write(chunk)
     
-    async def get_video_info(self, file_path: str) -> Dict:
+    async def get_video_info(self, file_path: str, file_unique_id: Optional[str] = None) -> Dict:
         """Get detailed video information"""
         try:
-            cmd = [
-                "ffprobe", "-v", "quiet", "-print_format", "json",
-                "-show_format", "-show_streams", file_path
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode == 0:
-                import json
-                info = json.loads(stdout.decode())
-                return self._parse_video_info(info)
-            else:
-                print(f"FFprobe error: {stderr.decode()}")
-                
+            return await self.probe.probe(file_path, file_unique_id)
         except Exception as e:
             print(f"Error getting video info: {e}")
         
@@ -189,37 +498,7 @@ class VideoCompressor:
     
     def _parse_video_info(self, ffprobe_output: Dict) -> Dict:
         """Parse FFprobe output into readable format"""
-        info = {}
-        
-        try:
-            # Format information
-            format_info = ffprobe_output.get('format', {})
-            info['duration'] = float(format_info.get('duration', 0))
-            info['size'] = int(format_info.get('size', 0))
-            info['bitrate'] = int(format_info.get('bit_rate', 0))
-            info['format_name'] = format_info.get('format_name', 'Unknown')
-            
-            # Stream information
-            streams = ffprobe_output.get('streams', [])
-            
-            for stream in streams:
-                if stream.get('codec_type') == 'video':
-                    info['width'] = stream.get('width', 0)
-                    info['height'] = stream.get('height', 0)
-                    info['fps'] = eval(stream.get('r_frame_rate', '0/1'))
-                    info['video_codec'] = stream.get('codec_name', 'Unknown')
-                    info['video_bitrate'] = int(stream.get('bit_rate', 0))
-                    
-                elif stream.get('codec_type') == 'audio':
-                    info['audio_codec'] = stream.get('codec_name', 'Unknown')
-                    info['audio_bitrate'] = int(stream.get('bit_rate', 0))
-                    info['sample_rate'] = int(stream.get('sample_rate', 0))
-                    info['channels'] = stream.get('channels', 0)
-            
-        except Exception as e:
-            print(f"Error parsing video info: {e}")
-        
-        return info
+        return parse_video_info(ffprobe_output)
     
     async def generate_thumbnail(self, input_path: str, output_path: str, time_offset: str = "00:00:01") -> bool:
         """Generate thumbnail from video"""
@@ -239,7 +518,16 @@ class VideoCompressor:
             await process.communicate()
             
             return process.returncode == 0
-            
+        
         except Exception as e:
             print(f"Thumbnail generation error: {e}")
             return False
+
+def _parse_bitrate(value: str) -> int:
+    """Turn an ffmpeg bitrate like '2000k' or '2M' into bit/s"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    try:
+        return int(float(value.rstrip('km')) * multiplier)
+    except ValueError:
+        return 0
@@ -0,0 +1,88 @@
+# utils/delivery.py
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from pyrogram.errors import RPCError
+from bot.config import Config
+from utils.uploader import send_video_file
+
+class DeliveryService:
+    """Sends a compressed output to several chats while uploading it once.
+    
+    The first destination receives the upload and every other destination
+    gets a ``copy_message`` of it, which reuses the file Telegram already
+    stores. The resulting file_id is recorded in the database (keyed by the
+    output's fingerprint), so delivering the same file again sends it by
+    file_id instead of uploading it. Those records are an LRU of
+    ``Config.UPLOAD_CACHE_SIZE`` entries mirrored into the database.
+    """
+    
+    NAMESPACE = 'uploads'
+    
+    def __init__(self, db, probe, api, max_entries: int = None):
+        self.db = db
+        self.probe = probe
+        self.api = api
+        self.max_entries = max_entries or Config.UPLOAD_CACHE_SIZE
+        self._cache: OrderedDict = OrderedDict()
+    
+    async def load(self):
+        """Warm the LRU from the database, dropping entries past its size"""
+        entries = await self.db.get_cache_entries(self.NAMESPACE)
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('cached_at', 0)):
+            self._cache[key] = entry
+        while len(self._cache) > self.max_entries:
+            await self.db.delete_cache(self.NAMESPACE, self._cache.popitem(last=False)[0])
+    
+    async def deliver(self, client, path: str, destinations: List, caption: str = "",
+                      captions: Optional[Dict] = None, thumb: Optional[str] = None,
+                      info: Optional[Dict] = None, file_name: Optional[str] = None,
+                      progress: Optional[Callable] = None) -> Dict:
+        """Send ``path`` to every destination, returning the sent message per chat.
+        
+        ``captions`` overrides the caption for single destinations. Only the
+        first destination is required; failed copies are logged and skipped.
+        """
+        captions = captions or {}
+        first, others = destinations[0], destinations[1:]
+        key = await self.probe.fingerprint(path)
+        entry = self._cache.get(key)
+        
+        message = None
+        if entry:
+            try:
+                message = await self.api.send_video(first, entry['file_id'],
+                                                    caption=captions.get(first, caption))
+            except RPCError as e:
+                print(f"Cached file_id for {path} was rejected ({e}), uploading again")
+        if message is None:
+            message = await send_video_file(
+                client, first, path, caption=captions.get(first, caption),
+                thumb=thumb, info=info, file_name=file_name, progress=progress, api=self.api
+            )
+            if message is None:
+                raise RuntimeError(f"Telegram returned no message for the upload of {path} to {first}")
+        
+        sent = {first: message}
+        for chat_id in others:
+            try:
+                sent[chat_id] = await self.api.copy_message(
+                    chat_id, message.chat.id, message.id, caption=captions.get(chat_id, caption)
+                )
+            except Exception as e:
+                print(f"Copy to {chat_id} failed: {e}")
+        
+        await self._store(key, {
+            'file_id': message.video.file_id,
+            'file_unique_id': message.video.file_unique_id,
+            'messages': {str(chat_id): sent_message.id for chat_id, sent_message in sent.items()},
+            'cached_at': time.time()
+        })
+        return sent
+    
+    async def _store(self, key: str, entry: Dict):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        await self.db.set_cache(self.NAMESPACE, key, entry)
+        while len(self._cache) > self.max_entries:
+            await self.db.delete_cache(self.NAMESPACE, self._cache.popitem(last=False)[0])
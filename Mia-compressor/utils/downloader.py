@@ -0,0 +1,182 @@
+# utils/downloader.py
+import asyncio
+import inspect
+import json
+import os
+from typing import AsyncIterator, Callable, Optional
+import aiofiles
+from bot.config import Config
+
+# stream_media always serves 1 MiB chunks
+CHUNK_SIZE = 1024 * 1024
+
+class TelegramSource:
+    """Byte ranges of a Telegram file, fetched with ``stream_media``"""
+    
+    def __init__(self, client, message):
+        self.client = client
+        self.message = message
+        media = message.video or message.document
+        self.size = media.file_size
+    
+    def stream(self, offset: int, limit: int) -> AsyncIterator[bytes]:
+        """Yield ``limit`` chunks starting at chunk ``offset``"""
+        return self.client.stream_media(self.message, offset=offset, limit=limit)
+
+class LocalFileSource:
+    """Stand-in for ``TelegramSource`` that serves a local file.
+    
+    ``delay`` simulates per-chunk latency and ``fail_at`` makes the chunk
+    with that index raise once, to exercise retries and resume.
+    """
+    
+    def __init__(self, path: str, delay: float = 0.0, fail_at: Optional[int] = None):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.delay = delay
+        self.fail_at = fail_at
+    
+    async def stream(self, offset: int, limit: int) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.path, 'rb') as f:
+            await f.seek(offset * CHUNK_SIZE)
+            for index in range(offset, offset + limit):
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if index == self.fail_at:
+                    self.fail_at = None
+                    raise ConnectionError(f"Simulated failure at chunk {index}")
+                chunk = await f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+class ParallelDownloader:
+    """Downloads a file as parallel byte-range parts with resume.
+    
+    The target is preallocated as a sparse file and every part is written
+    at its own offset. A bitmap of finished parts is kept next to it
+    (``<path>.parts``), so an interrupted download only fetches the parts
+    that are still missing when it is started again.
+    """
+    
+    def __init__(self, source, path: str, part_chunks: int = None, connections: int = None):
+        self.source = source
+        self.path = path
+        self.state_path = f"{path}.parts"
+        self.part_size = (part_chunks or Config.DOWNLOAD_PART_CHUNKS) * CHUNK_SIZE
+        self.connections = connections or Config.DOWNLOAD_CONNECTIONS
+        self.parts = max(1, -(-source.size // self.part_size))
+        self.done = bytearray((self.parts + 7) // 8)
+        self.received = 0
+        self._state_lock = asyncio.Lock()
+        self._writes = set()
+    
+    async def download(self, progress: Optional[Callable] = None) -> str:
+        """Fetch every missing part and return the path"""
+        self._load_state()
+        self._preallocate()
+        
+        missing = [part for part in range(self.parts) if not self._is_done(part)]
+        self.received = sum(self._part_length(part) for part in range(self.parts) if self._is_done(part))
+        if len(missing) < self.parts:
+            print(f"Resuming download of {self.path}: {len(missing)} of {self.parts} parts left")
+        
+        queue = asyncio.Queue()
+        for part in missing:
+            queue.put_nowait(part)
+        
+        fd = os.open(self.path, os.O_WRONLY)
+        try:
+            workers = [
+                asyncio.create_task(self._worker(queue, fd, progress))
+                for _ in range(min(self.connections, len(missing)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+        finally:
+            # A cancelled worker's pwrite still runs in its thread; the fd must outlive it
+            if self._writes:
+                await asyncio.wait(self._writes)
+            os.close(fd)
+        
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.path
+    
+    async def _worker(self, queue: asyncio.Queue, fd: int, progress: Optional[Callable]):
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            part = queue.get_nowait()
+            for attempt in range(Config.DOWNLOAD_PART_RETRIES + 1):
+                written = 0
+                try:
+                    position = part * self.part_size
+                    async for chunk in self.source.stream(part * self.part_size // CHUNK_SIZE,
+                                                          self.part_size // CHUNK_SIZE):
+                        write = loop.run_in_executor(None, os.pwrite, fd, chunk, position)
+                        self._writes.add(write)
+                        write.add_done_callback(self._writes.discard)
+                        await asyncio.shield(write)
+                        position += len(chunk)
+                        written += len(chunk)
+                        self.received += len(chunk)
+                        if progress:
+                            result = progress(self.received, self.source.size)
+                            if inspect.isawaitable(result):
+                                await result
+                    if written < self._part_length(part):
+                        raise ConnectionError(f"Part {part} ended after {written} bytes")
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.received -= written
+                    if attempt == Config.DOWNLOAD_PART_RETRIES:
+                        raise
+                    print(f"Download part {part} failed ({e}), retrying")
+                    await asyncio.sleep(2 ** attempt)
+            
+            self._mark_done(part)
+            # Saves of several workers would race on the same temporary file
+            async with self._state_lock:
+                await loop.run_in_executor(None, self._save_state, bytes(self.done))
+    
+    def _part_length(self, part: int) -> int:
+        return min(self.part_size, self.source.size - part * self.part_size)
+    
+    def _is_done(self, part: int) -> bool:
+        return bool(self.done[part // 8] & (1 << (part % 8)))
+    
+    def _mark_done(self, part: int):
+        self.done[part // 8] |= 1 << (part % 8)
+    
+    def _preallocate(self):
+        """Create the sparse target file (kept as is when resuming)"""
+        if not os.path.exists(self.path):
+            with open(self.path, 'wb') as f:
+                f.truncate(self.source.size)
+        elif os.path.getsize(self.path) != self.source.size:
+            os.truncate(self.path, self.source.size)
+    
+    def _load_state(self):
+        """Pick up the bitmap of an earlier attempt if it matches this file"""
+        if not (os.path.exists(self.state_path) and os.path.exists(self.path)):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('size') == self.source.size and state.get('part_size') == self.part_size:
+            self.done = bytearray.fromhex(state['done'])
+    
+    def _save_state(self, done: bytes):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'size': self.source.size, 'part_size': self.part_size, 'done': done.hex()}, f)
+        os.replace(tmp_path, self.state_path)
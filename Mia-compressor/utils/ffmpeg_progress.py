@@ -0,0 +1,80 @@
+# utils/ffmpeg_progress.py
+from typing import Dict, List, Optional
+
+class ProgressParser:
+    """Incremental parser for ffmpeg's ``-progress`` key=value stream.
+    
+    ffmpeg writes one ``key=value`` per line and closes every report with a
+    ``progress=continue`` (or ``progress=end``) line. ``feed`` accepts raw
+    chunks of any size and returns the reports completed by that chunk.
+    """
+    
+    def __init__(self):
+        self._buffer = b''
+        self._fields: Dict[str, str] = {}
+    
+    def feed(self, data: bytes) -> List[Dict]:
+        """Consume a chunk of the stream and return finished progress events"""
+        events = []
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b'\n')
+        
+        for raw in lines:
+            line = raw.decode(errors='replace').strip()
+            key, sep, value = line.partition('=')
+            if not sep:
+                continue
+            self._fields[key.strip()] = value.strip()
+            if key == 'progress':
+                events.append(self._build_event(self._fields))
+                self._fields = {}
+        
+        return events
+    
+    @staticmethod
+    def _build_event(fields: Dict[str, str]) -> Dict:
+        """Turn one raw report into typed values"""
+        return {
+            'out_time': _parse_out_time(fields),
+            'fps': _to_float(fields.get('fps')),
+            'speed': _to_float(fields.get('speed', '').rstrip('x')),
+            'bitrate': _to_float(fields.get('bitrate', '').replace('kbits/s', '')),  # kbit/s
+            'total_size': int(_to_float(fields.get('total_size'))),
+            'frame': int(_to_float(fields.get('frame'))),
+            'finished': fields.get('progress') == 'end'
+        }
+
+class StderrRingBuffer:
+    """Keeps only the last ``max_bytes`` of a stream for error reporting"""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data = bytearray()
+    
+    def write(self, chunk: bytes):
+        self._data += chunk
+        overflow = len(self._data) - self.max_bytes
+        if overflow > 0:
+            del self._data[:overflow]
+    
+    def getvalue(self) -> str:
+        return self._data.decode(errors='replace')
+
+def _to_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _parse_out_time(fields: Dict[str, str]) -> float:
+    """Output position in seconds (out_time_ms is in microseconds too)"""
+    for key in ('out_time_us', 'out_time_ms'):
+        if key in fields:
+            return max(_to_float(fields[key]), 0.0) / 1_000_000
+    
+    out_time = fields.get('out_time', '')
+    try:
+        hours, minutes, seconds = out_time.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return 0.0
@@ -200,3 +200,20 @@ def get_audio_codec_info(codec_name: str) -> str:
     }
     
     return codec_info.get(codec_name.lower(), codec_name.upper())
+
+def describe_encode_path(streams: dict, fallback: str = None) -> str:
+    """Describe which streams were copied and which were re-encoded"""
+    if fallback:
+        return f"{describe_encode_path(streams)} (⏱️ {fallback} fallback after a hung encode)"
+    video = streams.get('video', 'encode')
+    audio = streams.get('audio', 'encode')
+    
+    if video == 'two-pass':
+        return "🎯 Two-pass to target size"
+    if video == 'copy' and audio != 'encode':
+        return "⚡ Remux (stream copy, no re-encode)"
+    if video == 'copy':
+        return "⚡ Video copied, audio re-encoded"
+    if audio == 'copy':
+        return "🎞️ Video re-encoded, audio copied"
+    return "🎞️ Re-encoded"
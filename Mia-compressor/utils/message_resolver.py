@@ -0,0 +1,47 @@
+# utils/message_resolver.py
+from collections import OrderedDict
+from typing import Optional, Tuple
+from pyrogram.types import Message
+from bot.config import Config
+
+class MessageResolver:
+    """Finds the message a callback button refers to in constant time.
+    
+    Video and document messages are remembered when they arrive, so the
+    buttons attached to them resolve from an LRU without any API call;
+    anything else is fetched directly with ``get_messages``.
+    """
+    
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or Config.MESSAGE_CACHE_SIZE
+        self._cache: "OrderedDict[Tuple[int, int], Message]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def remember(self, message: Message):
+        """Keep a received message for later lookups"""
+        key = (message.chat.id, message.id)
+        self._cache[key] = message
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+    
+    async def resolve(self, client, chat_id: int, message_id: int) -> Optional[Message]:
+        """Get a message from the cache or with one ``get_messages`` call"""
+        key = (chat_id, message_id)
+        message = self._cache.get(key)
+        if message is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return message
+        
+        self.misses += 1
+        message = await client.get_messages(chat_id, message_id)
+        if not message or message.empty:
+            return None
+        self.remember(message)
+        return message
+    
+    def forget(self, chat_id: int, message_id: int):
+        """Drop a message, e.g. once it was deleted"""
+        self._cache.pop((chat_id, message_id), None)
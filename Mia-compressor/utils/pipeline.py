@@ -0,0 +1,79 @@
+# utils/pipeline.py
+import os
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, Optional
+from bot.context import get_context
+from utils.stream_ingest import StreamIngest
+from utils.downloader import ParallelDownloader, TelegramSource
+
+async def fetch_and_compress(client, task_id: str, task: Dict, message, input_path: str,
+                             output_path: str, settings: Dict,
+                             download_progress: Optional[Callable] = None,
+                             progress_callback: Optional[Callable] = None,
+                             on_encode: Optional[Callable[[bool], Awaitable[None]]] = None) -> Dict:
+    """Download and compress the video of ``message``, returning the compression result.
+    
+    After a crash, stages whose files are still intact (as recorded by the
+    checkpoints of ``task``) are skipped. Streamable containers are encoded
+    while they download; others are fetched with the parallel downloader
+    first, as are streamed ones whose transfer keeps failing (the encode
+    then starts over). ``on_encode(streaming)`` is awaited once the encode
+    holds its stage slots.
+    """
+    context = get_context()
+    scheduler = context.scheduler
+    compressor = context.compressor
+    checkpoints = context.checkpoints
+    video_file = message.video or message.document
+    
+    checkpoint = await checkpoints.validate(task, input_path, output_path)
+    if checkpoint:
+        print(f"♻️ Resuming job {task_id} after its {checkpoint['stage']} stage")
+    if checkpoint.get('stage') == 'encoded':
+        return checkpoint['result']
+    
+    async def download():
+        await ParallelDownloader(TelegramSource(client, message), input_path).download(
+            progress=download_progress
+        )
+        await checkpoints.save(task_id, 'downloaded', input_path)
+    
+    async def encode(streaming: bool) -> Dict:
+        async with AsyncExitStack() as stages:
+            await stages.enter_async_context(scheduler.stage('encode'))
+            if streaming:
+                # The download goes on inside the encode, so it only takes a slot once that starts
+                await stages.enter_async_context(scheduler.stage('download'))
+            if on_encode:
+                await on_encode(streaming)
+            
+            return await compressor.compress_video(
+                input_path, output_path, settings, progress_callback,
+                file_unique_id=video_file.file_unique_id,
+                source=ingest.chunks() if streaming else None,
+                duration_hint=getattr(video_file, 'duration', 0) or 0
+            )
+    
+    ingest = StreamIngest(client, message)
+    streaming = False
+    if not checkpoint:
+        async with scheduler.stage('download'):
+            # A half-finished parallel download resumes instead of streaming again
+            if compressor.can_stream(settings) and not os.path.exists(f"{input_path}.parts"):
+                streaming = await ingest.probe_header(input_path)
+            if not streaming:
+                await download()
+    
+    result = await encode(streaming)
+    if streaming and not result['success'] and ingest.error is not None:
+        # The stream broke off for good: fetch the file with the resumable downloader instead
+        print(f"Streaming job {task_id} failed ({ingest.error}), downloading it first")
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        async with scheduler.stage('download'):
+            await download()
+        result = await encode(False)
+    
+    if result['success']:
+        await checkpoints.save(task_id, 'encoded', input_path, output_path, result)
+    return result
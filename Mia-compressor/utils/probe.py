@@ -0,0 +1,238 @@
+# utils/probe.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from bot.config import Config
+from utils.cancellation import stop_process, track_process, untrack_process
+from utils.watchdog import current_watchdog
+
+class ProbeService:
+    """Runs ffprobe at most once per input and caches the parsed result.
+    
+    Entries are keyed by Telegram's ``file_unique_id`` when known, otherwise
+    by a fingerprint of the local file (size, mtime and a hash of its head
+    and tail). The cache is an LRU mirrored into the database so it survives
+    restarts.
+    """
+    
+    NAMESPACE = 'probe'
+    
+    def __init__(self, db=None, max_entries: int = None):
+        self.db = db
+        self.max_entries = max_entries or Config.PROBE_CACHE_SIZE
+        self._cache: OrderedDict = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    async def load(self):
+        """Warm the LRU from the database"""
+        if not self.db:
+            return
+        entries = await self.db.get_cache_entries(self.NAMESPACE)
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('cached_at', 0)):
+            self._cache[key] = entry
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+    
+    def get_cached(self, file_unique_id: str) -> Optional[Dict]:
+        """Get cached info for a Telegram file without probing"""
+        entry = self._cache.get(f"fid:{file_unique_id}")
+        return entry['info'] if entry else None
+    
+    async def probe(self, path: str, file_unique_id: Optional[str] = None,
+                    partial: bool = False) -> Dict:
+        """Get parsed stream info for a file, probing only on a cache miss.
+        
+        ``partial`` marks a probe of a truncated download; such entries are
+        good enough for display but are re-probed once the full file exists.
+        """
+        entry = await self._entry(path, file_unique_id, partial)
+        return entry['info'] if entry else {}
+    
+    async def get_duration(self, path: str, file_unique_id: Optional[str] = None) -> float:
+        """Get media duration in seconds"""
+        info = await self.probe(path, file_unique_id)
+        return float(info.get('duration', 0.0))
+    
+    async def get_keyframes(self, path: str, file_unique_id: Optional[str] = None) -> List[float]:
+        """Get keyframe timestamps of the first video stream"""
+        entry = await self._entry(path, file_unique_id, False)
+        if entry is None:
+            return []
+        if 'keyframes' not in entry:
+            entry['keyframes'] = await self._run_keyframe_probe(path)
+            await self._store(entry['key'], entry)
+        return entry['keyframes']
+    
+    async def fingerprint(self, path: str) -> str:
+        """Identify a local file by size, mtime and a hash of its head and tail"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _fingerprint, path)
+    
+    async def _entry(self, path: str, file_unique_id: Optional[str], partial: bool) -> Optional[Dict]:
+        key = f"fid:{file_unique_id}" if file_unique_id else f"fp:{await self.fingerprint(path)}"
+        
+        entry = self._cache.get(key)
+        if entry and (partial or not entry.get('partial')):
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry
+        
+        # Concurrent requests for the same input share one ffprobe run
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The job that ran the probe was cancelled, not this one: probe again
+                if not pending.cancelled():
+                    raise
+                return await self._entry(path, file_unique_id, partial)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            self.misses += 1
+            info = await self._run_probe(path)
+            entry = None
+            if info:
+                entry = {'key': key, 'info': info, 'partial': partial, 'cached_at': time.time()}
+                await self._store(key, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_result(None)
+            print(f"Error probing {path}: {e}")
+            return None
+        finally:
+            # Cancelled: release the waiters instead of leaving them hanging
+            if not future.done():
+                future.cancel()
+            del self._pending[key]
+    
+    async def _store(self, key: str, entry: Dict):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        evicted = []
+        while len(self._cache) > self.max_entries:
+            evicted.append(self._cache.popitem(last=False)[0])
+        
+        if self.db:
+            await self.db.set_cache(self.NAMESPACE, key, entry)
+            for old_key in evicted:
+                await self.db.delete_cache(self.NAMESPACE, old_key)
+    
+    async def _run_probe(self, path: str) -> Dict:
+        """Run one full ffprobe and parse its output"""
+        cmd = [
+            "ffprobe", "-v", "quiet", "-print_format", "json",
+            "-show_format", "-show_streams", path
+        ]
+        
+        returncode, stdout, stderr = await _communicate(cmd)
+        
+        if returncode != 0:
+            print(f"FFprobe error: {stderr.decode(errors='replace')}")
+            return {}
+        
+        return parse_video_info(json.loads(stdout.decode()))
+    
+    async def _run_keyframe_probe(self, path: str) -> List[float]:
+        """List keyframe timestamps from packet flags (demux only, no decoding)"""
+        cmd = [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path
+        ]
+        
+        _, stdout, _ = await _communicate(cmd)
+        
+        keyframes = []
+        for line in stdout.decode(errors='replace').splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags:
+                try:
+                    keyframes.append(float(pts_time))
+                except ValueError:
+                    continue
+        return sorted(keyframes)
+
+async def _communicate(cmd: list) -> Tuple[int, bytes, bytes]:
+    """Run ffprobe so that cancelling the job or the encode watchdog can stop it"""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    track_process(process)
+    watchdog = current_watchdog.get()
+    if watchdog is not None:
+        watchdog.register(process)
+    try:
+        stdout, stderr = await process.communicate()
+    except BaseException:
+        await stop_process(process)
+        raise
+    finally:
+        untrack_process(process)
+        if watchdog is not None:
+            watchdog.unregister(process)
+    return process.returncode, stdout, stderr
+
+def parse_video_info(ffprobe_output: Dict) -> Dict:
+    """Parse FFprobe output into readable format"""
+    info = {}
+    
+    try:
+        # Format information
+        format_info = ffprobe_output.get('format', {})
+        info['duration'] = float(format_info.get('duration', 0))
+        info['size'] = int(format_info.get('size', 0))
+        info['bitrate'] = int(format_info.get('bit_rate', 0))
+        info['format_name'] = format_info.get('format_name', 'Unknown')
+        info['start_time'] = float(format_info.get('start_time', 0))
+        
+        # Stream information (first stream of each kind)
+        streams = ffprobe_output.get('streams', [])
+        
+        for stream in streams:
+            if stream.get('codec_type') == 'video' and 'video_codec' not in info:
+                info['width'] = stream.get('width', 0)
+                info['height'] = stream.get('height', 0)
+                info['fps'] = _parse_rate(stream.get('r_frame_rate', '0/1'))
+                info['video_codec'] = stream.get('codec_name', 'Unknown')
+                info['video_bitrate'] = int(stream.get('bit_rate', 0))
+                info['pix_fmt'] = stream.get('pix_fmt', '')
+            
+            elif stream.get('codec_type') == 'audio' and 'audio_codec' not in info:
+                info['audio_codec'] = stream.get('codec_name', 'Unknown')
+                info['audio_bitrate'] = int(stream.get('bit_rate', 0))
+                info['sample_rate'] = int(stream.get('sample_rate', 0))
+                info['channels'] = stream.get('channels', 0)
+    
+    except Exception as e:
+        print(f"Error parsing video info: {e}")
+    
+    return info
+
+def _parse_rate(rate: str) -> float:
+    """Turn an ffprobe rational like '30000/1001' into a float"""
+    try:
+        numerator, _, denominator = rate.partition('/')
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def _fingerprint(path: str, sample_size: int = 64 * 1024) -> str:
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(stat.st_size - sample_size, sample_size))
+            digest.update(f.read(sample_size))
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{digest.hexdigest()}"
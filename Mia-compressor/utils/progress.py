@@ -0,0 +1,56 @@
+# utils/progress.py
+import time
+from typing import Dict, Optional
+
+class TaskProgress:
+    """Latest in-memory progress of one task"""
+    __slots__ = ('stage', 'progress', 'updated_at')
+    
+    def __init__(self, stage: str = 'queued', progress: float = 0.0):
+        self.stage = stage
+        self.progress = progress
+        self.updated_at = time.monotonic()
+
+class ProgressRegistry:
+    """Volatile per-task progress that is never written to disk.
+    
+    Progress ticks are worthless after a crash, so they live here while the
+    database only records lifecycle transitions.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[str, TaskProgress] = {}
+        self._links: Dict[str, str] = {}
+    
+    def update(self, task_id: str, progress: float, stage: Optional[str] = None):
+        """Record the latest progress (0-100) of a task"""
+        record = self._tasks.get(task_id)
+        if record is None:
+            record = self._tasks[task_id] = TaskProgress()
+        record.progress = progress
+        if stage is not None:
+            record.stage = stage
+        record.updated_at = time.monotonic()
+    
+    def link(self, task_id: str, leader_id: str):
+        """Report the progress of ``leader_id`` for a task coalesced into it"""
+        self._links[task_id] = leader_id
+    
+    def get(self, task_id: str) -> Optional[TaskProgress]:
+        """Get the progress record of a task"""
+        return self._tasks.get(self._links.get(task_id, task_id))
+    
+    def get_progress(self, task_id: str, default: float = 0) -> float:
+        """Get the latest progress percentage of a task"""
+        record = self.get(task_id)
+        return record.progress if record else default
+    
+    def remove(self, task_id: str):
+        """Forget a finished task"""
+        self._tasks.pop(task_id, None)
+        self._links.pop(task_id, None)
+        for linked in [linked for linked, leader in self._links.items() if leader == task_id]:
+            del self._links[linked]
+    
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,54 @@
+# utils/recovery.py
+import os
+import time
+from typing import Dict, Optional
+
+class CheckpointStore:
+    """Records how far a job got, so a rerun after a crash skips finished stages.
+    
+    A checkpoint is stored on the task when its input is fully downloaded
+    (``downloaded``) and when its output is encoded (``encoded``, together
+    with the compression result). Each one carries the fingerprints (size,
+    mtime and a hash of head and tail) of the files it vouches for, and is
+    only trusted again while those files still match.
+    """
+    
+    def __init__(self, db, probe):
+        self.db = db
+        self.probe = probe
+        self.resumed = 0
+    
+    async def save(self, task_id: str, stage: str, input_path: str,
+                   output_path: Optional[str] = None, result: Optional[Dict] = None):
+        """Record that ``stage`` finished, flushed before the next stage starts"""
+        checkpoint = {
+            'stage': stage,
+            'input': await self.probe.fingerprint(input_path),
+            'saved_at': time.time()
+        }
+        if output_path:
+            checkpoint['output'] = await self.probe.fingerprint(output_path)
+            checkpoint['result'] = result
+        await self.db.update_compression_task(task_id, {'checkpoint': checkpoint})
+        await self.db.flush()
+    
+    async def validate(self, task: Dict, input_path: str, output_path: str) -> Dict:
+        """The furthest checkpoint of ``task`` whose files are still intact ({} if none)"""
+        checkpoint = task.get('checkpoint') or {}
+        if not checkpoint:
+            return {}
+        
+        if checkpoint['stage'] == 'encoded' and await self._matches(output_path, checkpoint.get('output')):
+            self.resumed += 1
+            return checkpoint
+        
+        # An unfinished parallel download has its own resume state
+        if os.path.exists(f"{input_path}.parts"):
+            return {}
+        if await self._matches(input_path, checkpoint.get('input')):
+            self.resumed += 1
+            return {'stage': 'downloaded', 'input': checkpoint['input']}
+        return {}
+    
+    async def _matches(self, path: str, fingerprint: Optional[str]) -> bool:
+        return bool(fingerprint) and os.path.exists(path) and await self.probe.fingerprint(path) == fingerprint
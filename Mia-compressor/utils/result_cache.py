@@ -0,0 +1,134 @@
+# utils/result_cache.py
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from pyrogram.errors import (
+    FileIdInvalid, FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid, MediaEmpty, MediaInvalid
+)
+from bot.config import Config
+
+# Settings that change the encoded output, with the encoder's defaults
+OUTPUT_SETTINGS = {
+    'preset': 'medium',
+    'resolution': 'keep',
+    'video_bitrate': '2000k',
+    'audio_bitrate': '128k',
+    'remove_audio': False,
+    'target_size': 0,
+    'stream_copy': Config.STREAM_COPY
+}
+
+# Errors meaning Telegram can no longer send a stored file_id
+STALE_FILE_ERRORS = (FileIdInvalid, FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid,
+                     MediaEmpty, MediaInvalid)
+
+def settings_hash(settings: Dict) -> str:
+    """Hash of the output-relevant settings, so equivalent settings share a key"""
+    normalized = {key: settings.get(key, default) for key, default in OUTPUT_SETTINGS.items()}
+    if normalized['remove_audio']:
+        normalized['audio_bitrate'] = None
+    if normalized['target_size']:
+        normalized['video_bitrate'] = None
+    encoded = json.dumps(normalized, sort_keys=True).encode()
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+class ResultCache:
+    """Remembers delivered outputs per source file and output settings.
+    
+    Entries are keyed by the source's ``file_unique_id`` plus
+    ``settings_hash`` and hold the delivered file_id with the sizes and
+    timings of the original run. The cache is an LRU with a TTL, mirrored
+    into the database so it survives restarts.
+    """
+    
+    NAMESPACE = 'results'
+    
+    def __init__(self, db=None, max_entries: int = None, ttl: int = None):
+        self.db = db
+        self.max_entries = max_entries or Config.RESULT_CACHE_SIZE
+        self.ttl = ttl or Config.RESULT_CACHE_TTL
+        self._cache: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    async def load(self):
+        """Warm the LRU from the database, dropping expired entries"""
+        if not self.db:
+            return
+        entries = await self.db.get_cache_entries(self.NAMESPACE)
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('cached_at', 0)):
+            if self._expired(entry):
+                await self.db.delete_cache(self.NAMESPACE, key)
+            else:
+                self._cache[key] = entry
+        while len(self._cache) > self.max_entries:
+            await self._evict(next(iter(self._cache)))
+    
+    async def get(self, file_unique_id: str, settings: Dict) -> Optional[Dict]:
+        """Get the earlier result for this source and settings, if still fresh"""
+        key = f"{file_unique_id}:{settings_hash(settings)}"
+        entry = self._cache.get(key)
+        if entry and self._expired(entry):
+            await self._evict(key)
+            entry = None
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    async def put(self, file_unique_id: str, settings: Dict, result: Dict, file_id: str):
+        """Record a delivered result"""
+        key = f"{file_unique_id}:{settings_hash(settings)}"
+        entry = {
+            'file_id': file_id,
+            'original_size': result['original_size'],
+            'compressed_size': result['compressed_size'],
+            'size_reduction': result['size_reduction'],
+            'compression_ratio': result['compression_ratio'],
+            'compression_time': result['compression_time'],
+            'streams': result.get('streams', {}),
+            'cached_at': time.time()
+        }
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        if self.db:
+            await self.db.set_cache(self.NAMESPACE, key, entry)
+        while len(self._cache) > self.max_entries:
+            await self._evict(next(iter(self._cache)))
+    
+    async def send(self, api, chat_id, entry: Dict, caption: str = ""):
+        """Send a cached result by file_id; None (and the entry dropped) if the file is gone.
+        
+        Other errors, such as a FloodWait the gateway gave up on, say nothing
+        about the entry and are raised.
+        """
+        try:
+            return await api.send_video(chat_id, entry['file_id'], caption=caption)
+        except STALE_FILE_ERRORS as e:
+            print(f"Cached result {entry['file_id']} was rejected ({e}), compressing again")
+            await self.discard(entry['file_id'])
+            return None
+    
+    async def discard(self, file_id: str):
+        """Forget every entry delivered as ``file_id`` (e.g. when Telegram rejects it)"""
+        for key in [key for key, entry in self._cache.items() if entry['file_id'] == file_id]:
+            await self._evict(key)
+    
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache (0.0 - 1.0)"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry.get('cached_at', 0) > self.ttl
+    
+    async def _evict(self, key: str):
+        self._cache.pop(key, None)
+        if self.db:
+            await self.db.delete_cache(self.NAMESPACE, key)
@@ -0,0 +1,399 @@
+# utils/scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Coroutine, Dict, List, Optional, Set, Tuple
+from bot.config import Config
+from utils.cancellation import JobHandle, current_job
+
+Runner = Callable[[str, Dict], Awaitable[None]]
+
+class StagePool:
+    """Bounded pool of slots for one pipeline stage, with usage counters.
+    
+    A freed slot goes to the waiting job that comes first in run order
+    (priority, then queue time), not to the one that asked first.
+    """
+    
+    # Run order of callers that are not a scheduled job: after every job
+    UNORDERED = (0, float('inf'), '')
+    
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._free = size
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._active_since = []
+        self.started_at = time.monotonic()
+        
+        # Counters
+        self.processed = 0
+        self.busy_seconds = 0.0
+    
+    @property
+    def active(self) -> int:
+        return len(self._active_since)
+    
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter[2].done())
+    
+    def position(self, task_id: str) -> int:
+        """1-based place of a job waiting for a slot, 0 if it doesn't wait"""
+        for waiter in self._waiters:
+            if waiter[0][2] == task_id and not waiter[2].done():
+                return sum(1 for other in self._waiters
+                           if other[:2] < waiter[:2] and not other[2].done()) + 1
+        return 0
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot of this stage for the duration of the block"""
+        handle = current_job.get()
+        await self._acquire(handle.order if handle else self.UNORDERED)
+        
+        since = time.monotonic()
+        self._active_since.append(since)
+        try:
+            yield
+        finally:
+            self._active_since.remove(since)
+            self.busy_seconds += time.monotonic() - since
+            self.processed += 1
+            self._release()
+    
+    async def _acquire(self, order: Tuple[int, float, str]):
+        if self._free and not self.waiting:
+            self._free -= 1
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (order, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over: pass it on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+    
+    def _release(self):
+        """Hand the slot to the first waiter in run order, or free it"""
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            # Waiters that were cancelled are skipped lazily
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+    
+    def utilization(self) -> float:
+        """Share of slot time spent busy since start (0.0 - 1.0)"""
+        now = time.monotonic()
+        busy = self.busy_seconds + sum(now - since for since in self._active_since)
+        elapsed = now - self.started_at
+        return busy / (self.size * elapsed) if elapsed > 0 else 0.0
+
+class TaskScheduler:
+    """Runs queued compression jobs as a download -> encode -> upload pipeline.
+    
+    Jobs live in the database queue with a ``kind`` (which registered runner
+    executes them), a ``priority`` (higher runs first) and a ``queued_at``
+    stamp (FIFO among equal priorities), so the waiting order survives a
+    restart and ``start()`` can pick the queue up again.
+    
+    Runners hold a slot of one stage at a time (``async with
+    scheduler.stage('encode')``), so while one job encodes the next one can
+    already download and the previous one upload. Every stage has its own
+    pool size; the number of jobs in flight is the sum of them, and jobs
+    waiting for a slot get it in run order as well.
+    
+    Jobs submitted with a ``key`` are coalesced: while a job with the same
+    kind and key is queued or running, a new one is stored as ``attached``
+    to it instead of running again, and the runner of the leading job
+    reports progress and results to ``followers_of(task_id)`` as well.
+    """
+    
+    def __init__(self, db, workers: int = None):
+        self.db = db
+        self.stages = {
+            'download': StagePool('download', Config.DOWNLOAD_WORKERS),
+            'encode': StagePool('encode', Config.MAX_CONCURRENT_JOBS),
+            'upload': StagePool('upload', Config.UPLOAD_WORKERS)
+        }
+        self.workers = workers or sum(pool.size for pool in self.stages.values())
+        self.runners: Dict[str, Runner] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self.handles: Dict[str, JobHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self._heap = []
+        self._waiting: Dict[str, Tuple[int, float, str]] = {}
+        self._flights: Dict[str, str] = {}
+        self._leaders: Dict[str, str] = {}
+        self.followers: Dict[str, List[str]] = {}
+        self._wakeup = asyncio.Condition()
+        self._workers = []
+        
+        # Counters
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+    
+    def register(self, kind: str, runner: Runner):
+        """Register the coroutine function that runs jobs of ``kind``"""
+        self.runners[kind] = runner
+    
+    async def recover(self) -> int:
+        """Put jobs that were running when the last run died back in the queue.
+        
+        They keep their ``queued_at`` stamp, so they run before anything
+        queued after them. A job that was interrupted more than
+        ``Config.RECOVERY_MAX_ATTEMPTS`` times (e.g. it crashes the host) is
+        marked failed instead. Returns the number of re-queued jobs.
+        """
+        recovered = 0
+        for task_id, task in (await self.db.get_tasks('processing')).items():
+            if task.get('kind') not in self.runners:
+                continue
+            attempts = task.get('recoveries', 0) + 1
+            if attempts > Config.RECOVERY_MAX_ATTEMPTS:
+                await self.db.update_compression_task(task_id, {
+                    'status': 'failed',
+                    'kill_reason': f"interrupted {attempts - 1} times"
+                })
+                continue
+            await self.db.update_compression_task(task_id, {'status': 'queued', 'recoveries': attempts})
+            recovered += 1
+        return recovered
+    
+    async def start(self):
+        """Start the workers and re-queue jobs left waiting by the last run"""
+        for task_id, task in (await self.db.get_tasks('queued')).items():
+            if task.get('kind') in self.runners:
+                await self._push(task_id, task.get('priority', 0), task.get('queued_at', 0.0))
+                if task.get('dedup_key'):
+                    self._flights[task['dedup_key']] = task_id
+        
+        for task_id, task in (await self.db.get_tasks('attached')).items():
+            leader = task.get('leader')
+            if task_id in self._leaders:
+                continue
+            if leader in self._waiting:
+                self._attach(task_id, leader)
+            elif task.get('kind') in self.runners:
+                # The job it was waiting for is gone, run it on its own (or with its twins)
+                await self.submit(task_id, task['kind'], task.get('priority', 0), self._key_of(task))
+        
+        for index in range(self.workers):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"job-worker-{index}"))
+        
+        print(f"⚙️ Scheduler started ({self.workers} workers, {len(self._waiting)} jobs waiting)")
+    
+    async def submit(self, task_id: str, kind: str, priority: int = 0, key: Optional[str] = None) -> int:
+        """Queue a job already stored in the database and return its position.
+        
+        If an identical job (same ``kind`` and ``key``) is queued or running,
+        the new one is attached to it instead and the position of that job
+        is returned (0 once it runs).
+        """
+        dedup_key = f"{kind}:{key}" if key else None
+        leader = self._flights.get(dedup_key) if dedup_key else None
+        if leader is not None:
+            await self.db.update_compression_task(task_id, {
+                'status': 'attached',
+                'kind': kind,
+                'priority': priority,
+                'leader': leader,
+                'dedup_key': dedup_key
+            })
+            self._attach(task_id, leader)
+            self.coalesced += 1
+            print(f"🔗 Job {task_id} attached to identical job {leader}")
+            return self.position(leader)
+        
+        queued_at = time.time()
+        await self.db.update_compression_task(task_id, {
+            'status': 'queued',
+            'kind': kind,
+            'priority': priority,
+            'queued_at': queued_at,
+            'dedup_key': dedup_key
+        })
+        if dedup_key:
+            self._flights[dedup_key] = task_id
+        await self._push(task_id, priority, queued_at)
+        return self.position(task_id)
+    
+    def leader_of(self, task_id: str) -> Optional[str]:
+        """The job an attached job waits for, None if it runs on its own"""
+        return self._leaders.get(task_id)
+    
+    def followers_of(self, task_id: str) -> List[str]:
+        """Jobs attached to ``task_id`` that share its progress and result"""
+        return list(self.followers.get(task_id, []))
+    
+    def stage(self, name: str):
+        """Context manager holding a slot of a pipeline stage"""
+        return self.stages[name].slot()
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth, running jobs and utilization per stage"""
+        stats = {'queue': {'waiting': len(self._waiting), 'running': len(self.running),
+                           'coalesced': self.coalesced}}
+        for name, pool in self.stages.items():
+            stats[name] = {
+                'waiting': pool.waiting,
+                'active': pool.active,
+                'size': pool.size,
+                'processed': pool.processed,
+                'utilization': pool.utilization()
+            }
+        return stats
+    
+    def discard(self, task_id: str) -> bool:
+        """Drop a waiting job from the queue"""
+        leader = self._leaders.pop(task_id, None)
+        if leader is not None:
+            self.followers[leader].remove(task_id)
+            return True
+        for key in [key for key, flight in self._flights.items() if flight == task_id]:
+            del self._flights[key]
+        return self._waiting.pop(task_id, None) is not None
+    
+    async def withdraw(self, task_id: str) -> bool:
+        """Drop a waiting or attached job; jobs attached to it are queued on their own"""
+        task = await self.db.get_task(task_id) or {}
+        if not self.discard(task_id):
+            return False
+        await self._land(task_id, task, True)
+        return True
+    
+    def position(self, task_id: str) -> int:
+        """1-based place of a waiting job in run order, 0 if not waiting.
+        
+        A started job waiting for a stage slot reports its place in that
+        stage; started jobs still waiting to download are ahead of every
+        job in the queue.
+        """
+        entry = self._waiting.get(task_id)
+        if entry is None:
+            waiting = self.waiting_for(task_id)
+            return waiting[1] if waiting else 0
+        ahead = sum(1 for other in self._waiting.values() if other < entry)
+        return ahead + self.stages['download'].waiting + 1
+    
+    def waiting_for(self, task_id: str) -> Optional[Tuple[str, int]]:
+        """Stage a started job waits for a slot of and its place there, None if it doesn't wait"""
+        for name, pool in self.stages.items():
+            place = pool.position(task_id)
+            if place:
+                return name, place
+        return None
+    
+    @staticmethod
+    def priority_for(file_size: int) -> int:
+        """Small files get priority so they don't wait behind long encodes"""
+        return 1 if file_size and file_size <= Config.PRIORITY_FILE_SIZE else 0
+    
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """Run a coroutine in the background and keep a reference to it"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+    
+    async def shutdown(self):
+        """Stop the workers and cancel running jobs (they stay queued in the database)"""
+        interrupted = list(self.running)
+        for task in self._workers + list(self.running.values()) + list(self.tasks):
+            task.cancel()
+        pending = self._workers + list(self.running.values()) + list(self.tasks)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        
+        # A clean stop is not a crash, so it doesn't count against RECOVERY_MAX_ATTEMPTS
+        for task_id in interrupted:
+            await self.db.update_compression_task(task_id, {'status': 'queued'})
+    
+    def _attach(self, task_id: str, leader: str):
+        self._leaders[task_id] = leader
+        self.followers.setdefault(leader, []).append(task_id)
+    
+    async def _land(self, task_id: str, task: Dict, cancelled: bool):
+        """End the flight of a finished job; followers of a cancelled job run on their own"""
+        if self._flights.get(task.get('dedup_key')) == task_id:
+            del self._flights[task['dedup_key']]
+        followers = self.followers.pop(task_id, [])
+        for follower in followers:
+            self._leaders.pop(follower, None)
+        
+        if cancelled and followers:
+            for follower in followers:
+                await self.submit(follower, task['kind'], task.get('priority', 0), self._key_of(task))
+    
+    @staticmethod
+    def _key_of(task: Dict) -> Optional[str]:
+        """The ``key`` a task was submitted with"""
+        return task['dedup_key'].split(':', 1)[1] if task.get('dedup_key') else None
+    
+    async def _push(self, task_id: str, priority: int, queued_at: float):
+        entry = (-priority, queued_at, task_id)
+        async with self._wakeup:
+            self._waiting[task_id] = entry
+            heapq.heappush(self._heap, entry)
+            self._wakeup.notify()
+    
+    async def _next(self) -> Tuple[int, float, str]:
+        """Wait for and take the highest-priority waiting job"""
+        async with self._wakeup:
+            while True:
+                await self._wakeup.wait_for(lambda: self._heap)
+                entry = heapq.heappop(self._heap)
+                # Entries of discarded or re-submitted jobs are skipped lazily
+                if self._waiting.get(entry[2]) == entry:
+                    del self._waiting[entry[2]]
+                    return entry
+    
+    @staticmethod
+    async def _run(handle: JobHandle, runner: Runner, task: Dict):
+        # Subprocesses and files the runner registers end up on this handle
+        current_job.set(handle)
+        await runner(handle.task_id, task)
+    
+    async def _worker(self):
+        while True:
+            order = await self._next()
+            task_id = order[2]
+            task = await self.db.get_task(task_id)
+            if task is None or task.get('status') != 'queued':
+                continue
+            
+            runner = self.runners.get(task.get('kind'))
+            if runner is None:
+                print(f"No runner registered for job {task_id} ({task.get('kind')})")
+                continue
+            
+            handle = self.handles[task_id] = JobHandle(task_id)
+            handle.order = order
+            job = asyncio.create_task(self._run(handle, runner, task), name=f"job-{task_id}")
+            self.running[task_id] = job
+            try:
+                # wait() rather than await so cancelling the job leaves the worker alive
+                await asyncio.wait({job})
+            finally:
+                self.running.pop(task_id, None)
+                self.handles.pop(task_id, None)
+            await self._land(task_id, task, job.cancelled())
+            
+            if job.cancelled():
+                continue
+            if job.exception():
+                self.failed += 1
+                print(f"Job {task_id} crashed: {job.exception()}")
+                await self.db.update_queue_status(task_id, 'failed')
+            else:
+                self.completed += 1
@@ -0,0 +1,270 @@
+# utils/segment_encoder.py
+import asyncio
+import json
+import os
+import shutil
+from typing import Callable, Dict, List, Optional
+from bot.config import Config
+from utils.cancellation import track_paths
+
+class SegmentEncoder:
+    """Encodes one video as keyframe-aligned segments on several ffmpeg processes.
+    
+    The video stream is split losslessly at keyframes, every piece is
+    encoded with the regular video settings in a bounded pool, audio is
+    encoded once on the side, and the results are joined with the concat
+    demuxer without re-encoding.
+    
+    Finished segments are recorded in a manifest inside the work directory,
+    which is kept when the encode fails or is interrupted. Encoding the same input
+    with the same settings again only encodes the segments that are still
+    missing, so a restart loses at most the segments that were in flight.
+    """
+    
+    MANIFEST = "manifest.json"
+    
+    def __init__(self, compressor, workers: int = None):
+        self.compressor = compressor
+        self.workers = workers or Config.ENCODE_WORKERS or os.cpu_count() or 1
+        self.reused = 0
+    
+    def plan(self, duration: float, keyframes: List[float], start_time: float = 0.0) -> List[float]:
+        """Pick cut points (seconds from the start) at keyframes.
+        
+        Aims for two segments per worker so a slow segment does not leave
+        the other workers idle, but never cuts shorter than
+        ``Config.SEGMENT_MIN_DURATION`` and, so an interruption costs little,
+        not longer than ``Config.SEGMENT_MAX_DURATION``. An empty list means
+        "don't split".
+        """
+        target = max(duration / (self.workers * 2), Config.SEGMENT_MIN_DURATION)
+        target = min(target, max(Config.SEGMENT_MAX_DURATION, Config.SEGMENT_MIN_DURATION))
+        cuts = []
+        last = 0.0
+        for keyframe in keyframes:
+            position = keyframe - start_time
+            if position - last >= target and duration - position >= Config.SEGMENT_MIN_DURATION:
+                cuts.append(round(position, 3))
+                last = position
+        return cuts
+    
+    async def encode(self, input_path: str, output_path: str, settings: Dict, duration: float,
+                     cuts: List[float], audio: str = 'encode',
+                     progress_callback: Optional[Callable] = None) -> Optional[str]:
+        """Encode ``input_path`` in parallel segments, returning an error or None"""
+        work_dir = self.work_dir(output_path)
+        # Cancelling the job drops the checkpoints with it
+        track_paths(work_dir)
+        
+        encode_audio = audio != 'none' and not settings.get('remove_audio', False)
+        identity = {
+            'input': await self.compressor.probe.fingerprint(input_path),
+            'cuts': cuts,
+            'video': self.compressor.video_args(settings),
+            'audio': (['copy'] if audio == 'copy' else self.compressor.audio_args(settings))
+                     if encode_audio else None
+        }
+        manifest = self._load_manifest(work_dir, identity)
+        
+        # Only a successful run clears the work directory, a failed or interrupted one resumes from it
+        error = await self._encode(input_path, output_path, settings, duration, cuts, audio,
+                                   encode_audio, work_dir, manifest, progress_callback)
+        if error is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return error
+    
+    @staticmethod
+    def work_dir(output_path: str) -> str:
+        """Directory holding the pieces, segments and manifest of an encode"""
+        return os.path.join(os.path.dirname(output_path) or '.', f".segments_{os.path.basename(output_path)}")
+    
+    def discard(self, output_path: str):
+        """Drop what a failed encode kept for resuming, once the job gives up on it"""
+        shutil.rmtree(self.work_dir(output_path), ignore_errors=True)
+    
+    async def _encode(self, input_path: str, output_path: str, settings: Dict, duration: float,
+                      cuts: List[float], audio: str, encode_audio: bool, work_dir: str,
+                      manifest: Dict, progress_callback: Optional[Callable]) -> Optional[str]:
+        count = len(cuts) + 1
+        pieces = [os.path.join(work_dir, "piece_%03d.mkv" % index) for index in range(count)]
+        pending = [index for index in range(count) if str(index) not in manifest['segments']]
+        if pending and len(pending) < count:
+            self.reused += count - len(pending)
+            print(f"Resuming segmented encode: {len(pending)} of {count} segments left")
+        
+        if any(not os.path.exists(pieces[index]) for index in pending):
+            print(f"Splitting into {count} segments for {self.workers} workers")
+            error = await self._split(input_path, work_dir, cuts, count)
+            if error:
+                return error
+        
+        audio_path = os.path.join(work_dir, "audio.m4a")
+        jobs = [self._encode_pieces(pieces, pending, settings, duration, cuts, work_dir, manifest,
+                                    progress_callback)]
+        if encode_audio and not manifest['audio']:
+            jobs.append(self._encode_audio(input_path, audio_path, settings, work_dir, manifest,
+                                           copy=audio == 'copy'))
+        errors = [error for error in await asyncio.gather(*jobs) if error]
+        if errors:
+            return errors[0]
+        
+        segments = [self._segment_path(piece) for piece in pieces]
+        return await self._concat(segments, audio_path if encode_audio else None,
+                                  output_path, work_dir)
+    
+    async def _split(self, input_path: str, work_dir: str, cuts: List[float], count: int) -> Optional[str]:
+        """Cut the video stream at keyframes without re-encoding"""
+        cmd = [
+            self.compressor.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1",
+            "-i", input_path, "-map", "0:v:0", "-c", "copy",
+            "-f", "segment", "-segment_times", ",".join(str(cut) for cut in cuts),
+            "-reset_timestamps", "1", "-y",
+            os.path.join(work_dir, "piece_%03d.mkv")
+        ]
+        returncode, stderr = await self.compressor.run_ffmpeg(cmd)
+        pieces = [name for name in os.listdir(work_dir) if name.startswith("piece_")]
+        if returncode != 0 or len(pieces) != count:
+            return stderr or "Splitting failed"
+        return None
+    
+    async def _encode_pieces(self, pieces: List[str], pending: List[int], settings: Dict,
+                             duration: float, cuts: List[float], work_dir: str, manifest: Dict,
+                             progress_callback: Optional[Callable]) -> Optional[str]:
+        """Encode the pending pieces with at most ``self.workers`` ffmpeg processes"""
+        semaphore = asyncio.Semaphore(self.workers)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        bounds = [0.0] + cuts + [duration]
+        # Segments finished by an earlier run count as done for progress
+        latest: Dict[int, Dict] = {
+            index: {'out_time': bounds[index + 1] - bounds[index], 'fps': 0.0, 'speed': 0.0,
+                    'bitrate': 0.0, 'total_size': manifest['segments'][str(index)], 'frame': 0,
+                    'finished': True}
+            for index in range(len(pieces)) if index not in pending
+        }
+        errors = []
+        
+        async def report():
+            if not progress_callback or duration <= 0:
+                return
+            active = [event for event in latest.values() if not event['finished']]
+            event = {
+                'out_time': sum(event['out_time'] for event in latest.values()),
+                'fps': sum(event['fps'] for event in active),
+                'speed': sum(event['speed'] for event in active),
+                'bitrate': sum(event['bitrate'] for event in active),
+                'total_size': sum(event['total_size'] for event in latest.values()),
+                'frame': sum(event['frame'] for event in latest.values()),
+                'finished': False
+            }
+            progress = (event['out_time'] / duration) * 100
+            await self.compressor.notify_progress(progress_callback, min(progress, 99), event)
+        
+        async def encode_piece(index: int):
+            async with semaphore:
+                if errors:
+                    return
+                
+                async def on_event(event):
+                    latest[index] = event
+                    await report()
+                
+                piece = pieces[index]
+                segment = self._segment_path(piece)
+                cmd = [
+                    self.compressor.ffmpeg_path, "-hide_banner", "-nostats",
+                    "-progress", "pipe:1", "-i", piece, "-threads", str(threads)
+                ]
+                cmd.extend(self.compressor.video_args(settings))
+                cmd.extend(["-an", "-y", segment])
+                
+                returncode, stderr = await self.compressor.run_ffmpeg(cmd, on_event)
+                if returncode != 0:
+                    errors.append(stderr or f"Encoding {os.path.basename(piece)} failed")
+                    return
+                
+                # Checkpoint: the segment is complete and its piece no longer needed
+                manifest['segments'][str(index)] = os.path.getsize(segment)
+                self._save_manifest(work_dir, manifest)
+                os.remove(piece)
+        
+        await asyncio.gather(*(encode_piece(index) for index in pending))
+        return errors[0] if errors else None
+    
+    async def _encode_audio(self, input_path: str, audio_path: str, settings: Dict, work_dir: str,
+                            manifest: Dict, copy: bool = False) -> Optional[str]:
+        """Encode (or copy) the audio track once for the whole file"""
+        cmd = [self.compressor.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1",
+               "-i", input_path, "-vn"]
+        cmd.extend(["-c:a", "copy"] if copy else self.compressor.audio_args(settings))
+        cmd.extend(["-y", audio_path])
+        
+        returncode, stderr = await self.compressor.run_ffmpeg(cmd)
+        if returncode != 0:
+            return stderr or "Audio encoding failed"
+        manifest['audio'] = os.path.getsize(audio_path)
+        self._save_manifest(work_dir, manifest)
+        return None
+    
+    async def _concat(self, segments: List[str], audio_path: Optional[str],
+                      output_path: str, work_dir: str) -> Optional[str]:
+        """Join encoded segments (and audio) with the concat demuxer"""
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, 'w') as f:
+            for segment in segments:
+                escaped = os.path.abspath(segment).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        
+        cmd = [
+            self.compressor.ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1",
+            "-f", "concat", "-safe", "0", "-i", list_path
+        ]
+        if audio_path:
+            cmd.extend(["-i", audio_path, "-map", "0:v", "-map", "1:a"])
+        cmd.extend(["-c", "copy", "-movflags", "+faststart", "-y", output_path])
+        
+        returncode, stderr = await self.compressor.run_ffmpeg(cmd)
+        if returncode != 0:
+            return stderr or "Joining segments failed"
+        return None
+    
+    def _load_manifest(self, work_dir: str, identity: Dict) -> Dict:
+        """Pick up the manifest of an interrupted run of the same encode, or start afresh.
+        
+        Segments whose file is gone or does not have the recorded size are
+        encoded again.
+        """
+        try:
+            with open(os.path.join(work_dir, self.MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        
+        if manifest is None or manifest.get('identity') != identity:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            os.makedirs(work_dir)
+            manifest = {'identity': identity, 'segments': {}, 'audio': None}
+            self._save_manifest(work_dir, manifest)
+            return manifest
+        
+        for index, size in list(manifest['segments'].items()):
+            segment = self._segment_path(os.path.join(work_dir, "piece_%03d.mkv" % int(index)))
+            if not os.path.exists(segment) or os.path.getsize(segment) != size:
+                del manifest['segments'][index]
+        audio_path = os.path.join(work_dir, "audio.m4a")
+        if manifest['audio'] and (not os.path.exists(audio_path)
+                                  or os.path.getsize(audio_path) != manifest['audio']):
+            manifest['audio'] = None
+        return manifest
+    
+    def _save_manifest(self, work_dir: str, manifest: Dict):
+        path = os.path.join(work_dir, self.MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _segment_path(piece: str) -> str:
+        """Encoded output for a split piece (piece_001.mkv -> seg_001.mp4)"""
+        directory, name = os.path.split(piece)
+        return os.path.join(directory, "seg_" + name[len("piece_"):].rsplit(".", 1)[0] + ".mp4")
@@ -0,0 +1,117 @@
+# utils/status_reporter.py
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from pyrogram.errors import FloodWait, MessageNotModified
+from bot.config import Config
+from utils.api_gateway import DELIVERY, PROGRESS
+
+SlotKey = Tuple[int, int]
+
+class StatusReporter:
+    """Edits status messages at a bounded rate from one background flusher.
+    
+    ``post`` only stores the newest text for a message (latest value wins)
+    and never waits on Telegram, so progress callbacks can fire on every
+    chunk. The flusher edits each message at most once per
+    ``Config.STATUS_EDIT_INTERVAL`` per chat and skips texts that did not
+    change, so pending work is bounded by the number of status messages.
+    """
+    
+    def __init__(self, api, interval: float = None):
+        self.api = api
+        self.interval = interval if interval is not None else Config.STATUS_EDIT_INTERVAL
+        self._slots: Dict[SlotKey, Tuple[str, object]] = {}
+        self._sent: Dict[SlotKey, str] = {}
+        self._next_edit: Dict[int, float] = {}
+        self._dirty = asyncio.Event()
+        # Keeps a final edit from racing a progress edit already in flight
+        self._editing = asyncio.Lock()
+        self._flusher_task: Optional[asyncio.Task] = None
+        
+        # Counters
+        self.edits = 0
+        self.superseded = 0
+        self.unchanged = 0
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._flusher_task is None:
+            self._flusher_task = asyncio.create_task(self._flusher(), name="status-flusher")
+    
+    async def stop(self):
+        """Stop the flusher, dropping edits that were not sent yet"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+            await asyncio.gather(self._flusher_task, return_exceptions=True)
+            self._flusher_task = None
+        self._slots.clear()
+    
+    def post(self, chat_id: int, message_id: int, text: str, reply_markup=None):
+        """Queue a progress text for a message, replacing any pending one"""
+        key = (chat_id, message_id)
+        if key in self._slots:
+            self.superseded += 1
+        self._slots[key] = (text, reply_markup)
+        self._dirty.set()
+    
+    async def send(self, chat_id: int, message_id: int, text: str, reply_markup=None):
+        """Edit a message right away (final results), discarding pending progress"""
+        key = (chat_id, message_id)
+        self._slots.pop(key, None)
+        async with self._editing:
+            self._sent.pop(key, None)
+            try:
+                await self.api.edit_message_text(
+                    chat_id, message_id, text, reply_markup=reply_markup, priority=DELIVERY
+                )
+                self.edits += 1
+            except MessageNotModified:
+                pass
+            finally:
+                self._next_edit[chat_id] = time.monotonic() + self.interval
+    
+    async def _flusher(self):
+        while True:
+            await self._dirty.wait()
+            now = time.monotonic()
+            wait = None
+            for key in list(self._slots):
+                ready_at = self._next_edit.get(key[0], 0.0)
+                if ready_at > now:
+                    wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                    continue
+                
+                async with self._editing:
+                    # A final edit may have taken the slot meanwhile
+                    if key not in self._slots:
+                        continue
+                    text, reply_markup = self._slots.pop(key)
+                    if self._sent.get(key) == text:
+                        self.unchanged += 1
+                        continue
+                    await self._edit(key, text, reply_markup)
+                now = time.monotonic()
+            
+            if not self._slots:
+                self._dirty.clear()
+            elif wait is not None:
+                await asyncio.sleep(wait)
+    
+    async def _edit(self, key: SlotKey, text: str, reply_markup):
+        chat_id, message_id = key
+        self._next_edit[chat_id] = time.monotonic() + self.interval
+        try:
+            await self.api.edit_message_text(
+                chat_id, message_id, text, reply_markup=reply_markup, priority=PROGRESS
+            )
+            self._sent[key] = text
+            self.edits += 1
+        except MessageNotModified:
+            self._sent[key] = text
+        except FloodWait as e:
+            # Back off this chat and retry the newest text afterwards
+            self._next_edit[chat_id] = time.monotonic() + e.value
+            self._slots.setdefault(key, (text, reply_markup))
+        except Exception as e:
+            print(f"Error updating status: {e}")
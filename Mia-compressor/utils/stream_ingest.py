@@ -0,0 +1,97 @@
+# utils/stream_ingest.py
+import asyncio
+import os
+import struct
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from bot.config import Config
+
+# Containers ffmpeg can decode front to back from a pipe
+STREAMABLE_CONTAINERS = ('mpegts', 'matroska', 'mp4-faststart')
+
+def detect_container(head: bytes) -> str:
+    """Identify the container from the first bytes of a file.
+    
+    MP4 is only reported as ``mp4-faststart`` when its ``moov`` box comes
+    before the media data (faststart and fragmented files); otherwise ffmpeg
+    would have to seek to the end before decoding a single frame.
+    """
+    if len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        return 'mpegts'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'matroska'
+    if head[4:8] not in (b'ftyp', b'styp'):
+        return 'unknown'
+    
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack('>I4s', head[offset:offset + 8])
+        if box_type in (b'moov', b'moof'):
+            return 'mp4-faststart'
+        if box_type == b'mdat':
+            return 'mp4'
+        if size == 1:
+            if offset + 16 > len(head):
+                break
+            size = struct.unpack('>Q', head[offset + 8:offset + 16])[0]
+        if size < 8:
+            break
+        offset += size
+    
+    return 'unknown'
+
+class StreamIngest:
+    """Feeds a Telegram file to ffmpeg while it is still downloading.
+    
+    ``probe_header`` fetches the first chunk and decides whether the
+    container can be decoded from a pipe; ``chunks`` then yields the whole
+    file (starting with that chunk) for ``VideoCompressor.compress_video``.
+    
+    A transfer that breaks off is resumed at the chunk it stopped at, up to
+    ``Config.DOWNLOAD_PART_RETRIES`` times. Past that the error is kept in
+    ``error`` so the caller can fall back to ``ParallelDownloader``.
+    """
+    
+    def __init__(self, client, message):
+        self.client = client
+        self.message = message
+        self.head = b''
+        self.container = 'unknown'
+        self.error: Optional[Exception] = None
+    
+    async def probe_header(self, path: str) -> bool:
+        """Fetch the first chunk into ``path`` and check if it can be streamed"""
+        try:
+            async for chunk in self.client.stream_media(self.message, limit=1):
+                self.head = chunk
+            
+            # Lets ffprobe read the stream layout before the rest arrives
+            async with aiofiles.open(path, 'wb') as f:
+                await f.write(self.head)
+        except Exception as e:
+            print(f"Fetching the header of {path} failed ({e}), not streaming")
+            self.error = e
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+        
+        self.container = detect_container(self.head)
+        return self.container in STREAMABLE_CONTAINERS
+    
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Yield the complete file, reusing the already fetched first chunk"""
+        yield self.head
+        offset = 1
+        for attempt in range(Config.DOWNLOAD_PART_RETRIES + 1):
+            try:
+                async for chunk in self.client.stream_media(self.message, offset=offset):
+                    offset += 1
+                    yield chunk
+                return
+            except Exception as e:
+                if attempt == Config.DOWNLOAD_PART_RETRIES:
+                    self.error = e
+                    raise
+                print(f"Streaming chunk {offset} failed ({e}), retrying")
+                await asyncio.sleep(2 ** attempt)
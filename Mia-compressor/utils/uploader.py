@@ -0,0 +1,235 @@
+# utils/uploader.py
+import asyncio
+import hashlib
+import inspect
+import os
+import time
+from functools import partial
+from typing import Callable, Dict, Optional
+from pyrogram import raw, types, utils
+from pyrogram.errors import FilePartMissing
+from pyrogram.session import Session
+from bot.config import Config
+from utils.api_gateway import DELIVERY
+
+# Telegram accepts parts of up to 512 KiB; files above 10 MiB are "big"
+PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+class TelegramTransport:
+    """Saves file parts over a dedicated media session, like ``save_file``"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.session = None
+    
+    async def start(self):
+        self.session = Session(
+            self.client,
+            await self.client.storage.dc_id(),
+            await self.client.storage.auth_key(),
+            await self.client.storage.test_mode(),
+            is_media=True
+        )
+        await self.session.start()
+    
+    async def stop(self):
+        if self.session:
+            await self.session.stop()
+            self.session = None
+    
+    async def save_part(self, file_id: int, part: int, total_parts: int, data: bytes, big: bool):
+        if big:
+            query = raw.functions.upload.SaveBigFilePart(
+                file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+            )
+        else:
+            query = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data)
+        
+        if not await self.session.invoke(query):
+            raise ConnectionError(f"Part {part} was not saved")
+    
+    def input_file(self, file_id: int, total_parts: int, name: str, md5: Optional[str]):
+        if md5 is None:
+            return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+        return raw.types.InputFile(id=file_id, parts=total_parts, name=name, md5_checksum=md5)
+
+class LocalTransport:
+    """Stand-in for ``TelegramTransport`` that keeps the parts in memory.
+    
+    ``delay`` simulates per-part latency and ``fail_at`` makes the part
+    with that index fail once, to exercise retries.
+    """
+    
+    def __init__(self, delay: float = 0.0, fail_at: Optional[int] = None):
+        self.delay = delay
+        self.fail_at = fail_at
+        self.parts: Dict[int, Dict[int, bytes]] = {}
+    
+    async def start(self):
+        pass
+    
+    async def stop(self):
+        pass
+    
+    async def save_part(self, file_id: int, part: int, total_parts: int, data: bytes, big: bool):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if part == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError(f"Simulated failure at part {part}")
+        self.parts.setdefault(file_id, {})[part] = data
+    
+    def input_file(self, file_id: int, total_parts: int, name: str, md5: Optional[str]) -> Dict:
+        return {'id': file_id, 'parts': total_parts, 'name': name, 'md5': md5}
+    
+    def assemble(self, file_id: int) -> bytes:
+        """Join the received parts back into the file"""
+        parts = self.parts.get(file_id, {})
+        return b''.join(parts[part] for part in sorted(parts))
+
+class ParallelUploader:
+    """Uploads a file as concurrent parts with per-part retries.
+    
+    Up to ``window`` parts are in flight at once, each read straight from
+    its offset in the file. The transport must be started by the caller and
+    kept open until the file was sent, so parts Telegram reports missing can
+    be sent again with ``send_part``.
+    """
+    
+    def __init__(self, transport, path: str, window: int = None):
+        self.transport = transport
+        self.path = path
+        self.window = window or Config.UPLOAD_WINDOW
+        self.size = os.path.getsize(path)
+        self.total_parts = max(1, -(-self.size // PART_SIZE))
+        self.big = self.size > BIG_FILE_SIZE
+        self.file_id = int.from_bytes(os.urandom(8), 'big', signed=True)
+        self.sent = 0
+        self.elapsed = 0.0
+    
+    @property
+    def throughput(self) -> float:
+        """Bytes per second of the last upload"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+    
+    async def upload(self, progress: Optional[Callable] = None):
+        """Send every part and return the transport's input file"""
+        loop = asyncio.get_running_loop()
+        md5 = None if self.big else await loop.run_in_executor(None, self._md5)
+        
+        queue = asyncio.Queue()
+        for part in range(self.total_parts):
+            queue.put_nowait(part)
+        
+        self.sent = 0
+        started = time.monotonic()
+        workers = [
+            asyncio.create_task(self._worker(queue, progress))
+            for _ in range(min(self.window, self.total_parts))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        self.elapsed = time.monotonic() - started
+        
+        print(f"📤 Uploaded {os.path.basename(self.path)}: {self.total_parts} parts in "
+              f"{self.elapsed:.1f}s ({self.throughput / (1024 * 1024):.2f} MB/s, window {self.window})")
+        return self.transport.input_file(self.file_id, self.total_parts,
+                                         os.path.basename(self.path), md5)
+    
+    async def send_part(self, part: int) -> int:
+        """Read and send one part, retrying it before giving up"""
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._read_part, part)
+        for attempt in range(Config.UPLOAD_PART_RETRIES + 1):
+            try:
+                await self.transport.save_part(self.file_id, part, self.total_parts, data, self.big)
+                return len(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == Config.UPLOAD_PART_RETRIES:
+                    raise
+                print(f"Upload part {part} failed ({e}), retrying")
+                await asyncio.sleep(2 ** attempt)
+    
+    async def _worker(self, queue: asyncio.Queue, progress: Optional[Callable]):
+        while not queue.empty():
+            part = queue.get_nowait()
+            length = await self.send_part(part)
+            self.sent += length
+            if progress:
+                result = progress(self.sent, self.size)
+                if inspect.isawaitable(result):
+                    await result
+    
+    def _read_part(self, part: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            return os.pread(f.fileno(), PART_SIZE, part * PART_SIZE)
+    
+    def _md5(self) -> str:
+        digest = hashlib.md5()
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(PART_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+async def send_video_file(client, chat_id, path: str, caption: str = "", thumb: Optional[str] = None,
+                          info: Optional[Dict] = None, file_name: Optional[str] = None,
+                          progress: Optional[Callable] = None, api=None) -> Optional[types.Message]:
+    """Upload ``path`` with ``ParallelUploader`` and send it as a streamable video.
+    
+    Does what ``client.send_video`` does after its own (sequential) upload.
+    ``info`` is the probed stream info used for duration and dimensions;
+    with ``api`` (an ``ApiGateway``) the final send goes through its budgets.
+    """
+    info = info or {}
+    transport = TelegramTransport(client)
+    await transport.start()
+    try:
+        uploader = ParallelUploader(transport, path)
+        media = raw.types.InputMediaUploadedDocument(
+            mime_type="video/mp4",
+            file=await uploader.upload(progress),
+            thumb=await client.save_file(thumb) if thumb and os.path.exists(thumb) else None,
+            attributes=[
+                raw.types.DocumentAttributeVideo(
+                    supports_streaming=True,
+                    duration=int(info.get('duration', 0)),
+                    w=info.get('width', 0),
+                    h=info.get('height', 0)
+                ),
+                raw.types.DocumentAttributeFilename(file_name=file_name or os.path.basename(path))
+            ]
+        )
+        
+        while True:
+            try:
+                send = partial(api.call, chat_id, client.invoke, priority=DELIVERY) if api else client.invoke
+                r = await send(
+                    raw.functions.messages.SendMedia(
+                        peer=await client.resolve_peer(chat_id),
+                        media=media,
+                        random_id=client.rnd_id(),
+                        **await utils.parse_text_entities(client, caption, None, None)
+                    )
+                )
+            except FilePartMissing as e:
+                await uploader.send_part(e.value)
+                continue
+            
+            for update in r.updates:
+                if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                    return await types.Message._parse(
+                        client, update.message,
+                        {user.id: user for user in r.users},
+                        {chat.id: chat for chat in r.chats}
+                    )
+            return None
+    finally:
+        await transport.stop()
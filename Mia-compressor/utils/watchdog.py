@@ -0,0 +1,95 @@
+# utils/watchdog.py
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+from bot.config import Config
+from utils.cancellation import stop_process
+
+class EncodeWatchdog:
+    """Kills the ffmpeg and ffprobe processes of one compression that hangs.
+    
+    Every process started while the watchdog is active registers with it
+    and feeds it its progress reports. The running processes are stopped
+    once the compression runs longer than ``Config.COMPRESSION_TIMEOUT`` or
+    no process moved its output position for ``Config.ENCODE_STALL_TIMEOUT``
+    seconds; ``reason`` is only set when a process was actually stopped.
+    """
+    
+    def __init__(self, timeout: float = None, stall_timeout: float = None):
+        self.timeout = timeout or Config.COMPRESSION_TIMEOUT
+        self.stall_timeout = stall_timeout or Config.ENCODE_STALL_TIMEOUT
+        self.processes: Set[asyncio.subprocess.Process] = set()
+        self.reason: Optional[str] = None
+        self.speed = 0.0
+        self._positions: Dict[int, tuple] = {}
+        self._started = 0.0
+        self._last_progress = 0.0
+        self._token = None
+        self._monitor_task: Optional[asyncio.Task] = None
+    
+    async def __aenter__(self):
+        self._started = self._last_progress = time.monotonic()
+        self._token = current_watchdog.set(self)
+        self._monitor_task = asyncio.create_task(self._monitor(), name="encode-watchdog")
+        return self
+    
+    async def __aexit__(self, *exc):
+        self._monitor_task.cancel()
+        await asyncio.gather(self._monitor_task, return_exceptions=True)
+        current_watchdog.reset(self._token)
+    
+    @property
+    def velocity(self) -> float:
+        """Seconds of output written per second of wall time so far"""
+        elapsed = time.monotonic() - self._started
+        return sum(position[0] for position in self._positions.values()) / elapsed if elapsed else 0.0
+    
+    def register(self, process: asyncio.subprocess.Process):
+        self.processes.add(process)
+        self.touch()
+    
+    def unregister(self, process: asyncio.subprocess.Process):
+        self.processes.discard(process)
+    
+    def touch(self):
+        """Note activity that is not an ffmpeg report (e.g. input still arriving)"""
+        self._last_progress = time.monotonic()
+    
+    def observe(self, process: asyncio.subprocess.Process, event: Dict):
+        """Count a progress report if it moved the process's output forward"""
+        position = (event['out_time'], event['total_size'])
+        previous = self._positions.get(id(process), (0.0, 0))
+        if position[0] > previous[0] or position[1] > previous[1]:
+            self._positions[id(process)] = position
+            self._last_progress = time.monotonic()
+        if event['speed']:
+            self.speed = event['speed']
+    
+    def check(self) -> Optional[str]:
+        """Why the encode should be stopped now, or None"""
+        now = time.monotonic()
+        if now - self._started > self.timeout:
+            return f"timed out after {int(now - self._started)}s (limit {int(self.timeout)}s)"
+        if now - self._last_progress > self.stall_timeout:
+            return (f"stalled: no progress for {int(now - self._last_progress)}s "
+                    f"(velocity {self.velocity:.2f}x, last speed {self.speed:.2f}x)")
+        return None
+    
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(min(self.stall_timeout, self.timeout) / 4)
+            reason = self.check()
+            processes = list(self.processes)
+            # Between ffmpeg runs there is nothing to stop; a new run counts as progress
+            if reason is None or not processes:
+                continue
+            
+            self.reason = reason
+            print(f"⏱️ Encode watchdog: {reason}, stopping ffmpeg")
+            await asyncio.gather(*(stop_process(process) for process in processes))
+            # Keep watching whatever the compression runs next
+            self.touch()
+
+# Watchdog of the compression the current coroutine belongs to
+current_watchdog: ContextVar[Optional[EncodeWatchdog]] = ContextVar('current_watchdog', default=None)
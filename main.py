@@ -111,43 +111,12 @@ Working = False
 print("\r🔧 Creating bot files...")
 
 # Create main.py
+# VideoCompressorBot in __main__.py builds the app context every plugin takes its components from
 main_py_content = """
-import asyncio
-import logging
-from pyrogram import Client
-from bot.config import Config
-from bot.database import Database
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
-class CompressorBot:
-    def __init__(self):
-        self.app = Client(
-            "VideoCompressorBot",
-            api_id=Config.API_ID,
-            api_hash=Config.API_HASH,
-            bot_token=Config.BOT_TOKEN,
-            plugins=dict(root="plugins")
-        )
-        self.db = Database()
-    
-    async def start(self):
-        await self.app.start()
-        await self.db.connect()
-        print("🤖 Video Compressor Bot Started Successfully!")
-        
-    async def stop(self):
-        await self.app.stop()
-        await self.db.disconnect()
+import runpy
 
 if __name__ == "__main__":
-    bot = CompressorBot()
-    asyncio.get_event_loop().run_until_complete(bot.start())
-    asyncio.get_event_loop().run_forever()
+    runpy.run_path("__main__.py", run_name="__main__")
 """
 
 with open('/content/Video-Compressor-Bot/main.py', 'w') as f: